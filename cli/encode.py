@@ -27,6 +27,9 @@ import sys
 from mediatools import log
 from mediatools import videofile as vf
 import mediatools.utilities as util
+import mediatools.mediafile as media
+import mediatools.options as opt
+import mediatools.scheduler as scheduler
 import utilities.file as fil
 
 
@@ -34,6 +37,7 @@ def set_and_parse_cli_args() -> dict:
     util.init("encode")
     parser = util.get_common_args("encode", "ffmpeg front-end encoder")
     parser = vf.add_video_args(parser)
+    scheduler.add_jobs_arg(parser)
     return util.parse_media_args(parser)
 
 
@@ -41,7 +45,7 @@ def get_expanded_file_list(file_list: list[str]) -> list[str]:
     expanded_list: list[str] = []
     for file in file_list:
         if os.path.isdir(file):
-            expanded_list += fil.dir_list(file, recurse=False)
+            expanded_list += fil.dir_list(file, recurse=True)
         else:
             expanded_list.append(file)
     return expanded_list
@@ -61,6 +65,7 @@ def build_file_name(file: str, postfix: str, ext: str = "mp4") -> str:
 
 def main() -> None:
     kwargs = set_and_parse_cli_args()
+    nb_jobs = kwargs.pop("jobs", None)
     files_to_encode = get_expanded_file_list(kwargs.pop("inputfiles"))
     files_to_encode = [f for f in files_to_encode if fil.is_media_file(f)]
     log.logger.info("Filtered files (%d)", len(files_to_encode))
@@ -77,10 +82,17 @@ def main() -> None:
         postfix = "encoded"
     else:
         postfix = postfix[1:]
-    for ifile in files_to_encode:
+
+    def encode(ifile: str, threads: int | None) -> str:
         ofile = build_file_name(ifile, postfix)
-        vf.VideoFile(ifile).encode(target_file=ofile, profile=None, **kwargs)
-        vf.set_creation_date(ofile, vf.get_creation_date(ifile))
+        creation_date = vf.get_creation_date(ifile)
+        encode_kwargs = {**kwargs, **util.remove_nones({opt.Option.THREADS: threads})}
+        vf.VideoFile(ifile).encode(target_file=ofile, profile=None, creation_date=creation_date, **encode_kwargs)
+        vf.set_creation_date(ofile, creation_date, after_encode=True)
+        return ofile
+
+    durations = {mf.filename: mf.get_duration() or 0.0 for mf in media.probe_many(files_to_encode, profile="duration-only")}
+    scheduler.Scheduler(nb_jobs).run([scheduler.Job(f, encode, duration=durations.get(os.path.abspath(f), 0.0)) for f in files_to_encode])
     sys.exit(0)
 
 
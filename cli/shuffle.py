@@ -41,7 +41,7 @@ def main():
     files_to_shuffle = []
     for file in kwargs["inputfiles"]:
         if os.path.isdir(file):
-            files_to_shuffle += fil.dir_list(file, recurse=False)
+            files_to_shuffle += fil.dir_list(file, recurse=True)
         else:
             files_to_shuffle.append(file)
 
@@ -79,7 +79,7 @@ def main():
     if directory is None:
         print(f"Usage: {fil.basename(me)} [-g <debug_level>] <directory>")
         sys.exit(1)
-    for symlink in fil.dir_list(directory, recurse=False):
+    for symlink in fil.dir_list(directory, recurse=True):
         if not fil.is_link(symlink):
             __check_file_name(symlink)
             continue
@@ -25,8 +25,8 @@ import os
 import sys
 import csv
 import concurrent.futures
-from mediatools import utilities as util, log, audiofile as audio
-from utilities import file as fil
+from mediatools import utilities as util, log, audiofile as audio, probe_cache
+from utilities import file as fil, manifest
 
 
 def get_csv_values(file: str) -> list[str] | None:
@@ -47,19 +47,25 @@ def main() -> None:
         arg = sys.argv.pop(0)
         if arg == "-g":
             util.set_debug_level(sys.argv.pop(0))
+        elif arg == "--no-probe-cache":
+            probe_cache.set_enabled(False)
         elif os.path.isdir(arg):
             directory = arg
     if directory is None:
-        print(f"Usage: {fil.basename(me)} [-g <debug_level>] <directory>")
+        print(f"Usage: {fil.basename(me)} [-g <debug_level>] [--no-probe-cache] <directory>")
         sys.exit(1)
-    filelist = fil.dir_list(directory, recurse=True)
-    nb_files = len(filelist)
+    # Only directories changed since the previous listing are listed again
+    with manifest.Manifest(manifest.manifest_file(directory, "audio-list"), file_type=fil.FileType.AUDIO_FILE) as mf:
+        log.logger.info("Changes since previous listing: %s", str(mf.scan(directory)))
+        mf.commit()
+        filelist = mf.files(directory)
     cur_file = 0
     with open("music.csv", "w", newline="", encoding="utf-8") as fh:
         csv_writer = csv.writer(fh, dialect="excel", quoting=csv.QUOTE_MINIMAL)
         print(audio.csv_headers())
         with concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="GetMetadata") as executor:
-            futures = [executor.submit(get_csv_values, file) for file in fil.dir_list(directory, recurse=True)]
+            futures = [executor.submit(get_csv_values, file) for file in filelist]
+            nb_files = len(futures)
             for future in concurrent.futures.as_completed(futures):
                 data = future.result(timeout=10)
                 log.logger.debug("Got data %s", data)
@@ -62,6 +62,7 @@ except ImportError:
 from mediatools import log
 import mediatools.utilities as util
 import utilities.file as fil
+import utilities.manifest as manifest
 
 
 # ---------------------------------------------------------------------------
@@ -902,6 +903,23 @@ def _process_directory(dirpath: str, dry_run: bool) -> None:
         _process_file(filepath, dir_artist, dir_album, dir_year, dir_date, dir_genre, mb_tracks, cover_bytes, dry_run)
 
 
+def _process_changed_directories(root: str, dry_run: bool) -> None:
+    """Processes directories of a tree where audio files were added or modified since the previous run"""
+    with manifest.Manifest(manifest.manifest_file(root, "audio-normalize"), file_type=fil.FileType.AUDIO_FILE) as mf:
+        changed_dirs = sorted({os.path.dirname(f) for f in mf.scan(root).changed()})
+        log.logger.info("Processing %d changed directories under %s", len(changed_dirs), root)
+        for dirpath in changed_dirs:
+            log.logger.info("=== Processing directory: %s ===", dirpath)
+            try:
+                _process_directory(dirpath, dry_run)
+            except Exception as e:
+                log.logger.error("Error processing %s: %s", dirpath, str(e))
+        if not dry_run:
+            # Record files as modified by the processing, so that they are not processed again next time
+            mf.refresh(changed_dirs)
+            mf.commit()
+
+
 # ---------------------------------------------------------------------------
 # Main entry point
 # ---------------------------------------------------------------------------
@@ -912,6 +930,9 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Normalize audio metadata, cover art, and filenames")
     parser.add_argument("-f", "--files", nargs="+", help="Files and/or directories to process (default: E:\\Musique)")
     parser.add_argument("--dry-run", action="store_true", help="Parse and log actions without modifying anything")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Only process directories with audio files added or modified since the previous incremental run"
+    )
     parser.add_argument("-g", "--debug", required=False, type=int, help="Debug level")
     args = parser.parse_args()
 
@@ -940,6 +961,9 @@ def main() -> None:
         if not os.path.isdir(root):
             log.logger.error("Directory not found: %s", root)
             continue
+        if args.incremental:
+            _process_changed_directories(root, dry_run)
+            continue
         subdirs = sorted([os.path.join(root, d) for d in os.listdir(root) if os.path.isdir(os.path.join(root, d))])
         root_audio = [os.path.join(root, f) for f in os.listdir(root) if fil.is_audio_file(f)]
         if subdirs:
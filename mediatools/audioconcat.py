@@ -30,8 +30,11 @@ def main():
     parser.add_argument("-i", "--inputfiles", nargs="+", help="List of audio files to concatenate", required=True)
     parser.add_argument("-o", "--outputfile", help="Output file to generate", required=True)
     parser.add_argument("-g", "--debug", required=False, type=int, help="Debug level")
+    parser.add_argument(
+        "--reencode", required=False, default=False, action="store_true", help="Re-encode even if files can be concatenated without re-encoding"
+    )
     kwargs = util.parse_media_args(parser)
-    output = audio.concat(kwargs["outputfile"], kwargs["inputfiles"])
+    output = audio.concat(kwargs["outputfile"], kwargs["inputfiles"], reencode=kwargs.get("reencode", False))
     util.generated_file(output)
 
 
@@ -25,18 +25,23 @@ import re
 import os
 import shutil
 import unicodedata
-from datetime import datetime
 import json
+import itertools
+import subprocess
+import concurrent.futures
+import ffmpeg
 from mp3_tagger import MP3File
 import music_tag
 from mediatools import log
 import mediatools.exceptions as ex
 import utilities.file as fil
+import utilities.manifest as manifest
 import mediatools.mediafile as media
 import mediatools.imagefile as image
 import mediatools.utilities as util
 import mediatools.options as opt
 import mediatools.media_config as conf
+import mediatools.hash_index as hash_index
 
 _CSV_KEYS: tuple[str, ...] = (
     "filename",
@@ -52,6 +57,12 @@ _CSV_KEYS: tuple[str, ...] = (
     "has_album_art",
 )
 
+# Audio stream parameters that must be identical in all files to concatenate them without re-encoding
+CONCAT_KEYS: tuple[str, ...] = ("codec_name", "profile", "sample_rate", "channels", "channel_layout")
+
+# Hash algorithm of decoded audio, "pcm:<seconds>" only hashes the first seconds
+PCM_HASH: str = "pcm"
+
 # Matches a trailing bitrate/codec postfix in a file name, eg " (128kbit_AAC)" or "[320kbps MP3]"
 _ENCODING_POSTFIX_RE = re.compile(r"\s*[\(\[][^()\[\]]*\d+\s*k(?:bit|bps|b)?[^()\[\]]*[\)\]]\s*$", re.IGNORECASE)
 
@@ -89,8 +100,15 @@ def build_target_file(source_file: str, profile: str | None) -> str:
     return f"{cleaned_base}.{profile}.{extension}"
 
 
+def is_pcm_algo(algo: str) -> bool:
+    """Returns whether a hash algorithm (pcm or pcm:<seconds>) hashes the decoded audio"""
+    return algo == PCM_HASH or algo.startswith(f"{PCM_HASH}:")
+
+
 class AudioFile(media.MediaFile):
     # This class is the abstraction of an audio file (eg MP3)
+    PROBE_PROFILE: str = "audio-tags"
+
     def __init__(self, filename: str) -> None:
         if not fil.is_audio_file(filename):
             raise ex.FileTypeError(file=filename, expected_type="audio")
@@ -140,15 +158,45 @@ class AudioFile(media.MediaFile):
         return self.specs
 
     def hash(self, algo: str = "audio", force: bool = False) -> str | None:
+        """Returns the hash of the file
+
+        :param algo: "audio" for a hash of the tags and audio specs, "pcm" for a hash of the decoded audio,
+            "pcm:<seconds>" for a hash of the first seconds of decoded audio, or any of fil.HASH_ALGORITHMS
+        """
+        if is_pcm_algo(algo):
+            return self.pcm_hash(algo=algo, force=force)
         if algo != "audio":
             return super().hash(algo=algo, force=force)
-        if self._hash is None or force:
+        if self._hash is None or self.algo != algo or force:
             self.get_specs()
             self.get_tags()
             self._hash = "{}-{}-{}-{}-{}-{}-{}".format(self.artist, self.title, self.album, self.year, self.track, self.duration, self.acodec)
+            self.algo = algo
             log.logger.debug("Audio Hash(%s) = %s", self.filename, self._hash)
         return self._hash
 
+    def pcm_hash(self, algo: str = PCM_HASH, force: bool = False) -> str | None:
+        """Returns the MD5 of the decoded first audio stream, that does not change when the file is retagged,
+        or None if the audio can't be decoded"""
+        if self._hash is not None and self.algo == algo and not force:
+            return self._hash
+        _, _, duration = algo.partition(":")
+        cmd = [util.get_ffmpeg(), "-v", "error", "-nostdin", "-i", self.filename]
+        if duration:
+            cmd += ["-t", duration]
+        cmd += ["-map", "0:a:0", "-f", "streamhash", "-hash", "md5", "-"]
+        log.logger.debug("Running %s", " ".join(cmd))
+        result = subprocess.run(cmd, capture_output=True, check=False)
+        # Output is like 0,a,MD5=0e0c456ccd5b8a685bf6f721b9570818
+        output = result.stdout.decode("utf-8").strip()
+        if result.returncode != 0 or "=" not in output:
+            log.logger.error("Can't hash decoded audio of %s: %s", self.filename, result.stderr.decode("utf-8", errors="replace").strip())
+            return None
+        self._hash = output.split("=")[-1]
+        self.algo = algo
+        log.logger.debug("PCM Hash(%s) = %s", self.filename, self._hash)
+        return self._hash
+
     def get_tags_by_version(self, version: int | None = None) -> dict:
         """Returns all file MP3 tags"""
         if self.extension().lower() != "mp3":
@@ -311,7 +359,7 @@ class AudioFile(media.MediaFile):
 
 def album_art(*file_list: str, scale: str | None = None) -> bool:
     log.logger.debug("Album art(%s)", str(file_list))
-    album_cover = fil.file_list(*file_list, file_type=fil.FileType.IMAGE_FILE)
+    album_cover = fil.file_list(*file_list, file_type=fil.FileType.IMAGE_FILE, recurse=True)
     if len(album_cover) != 1:
         log.logger.critical("Zero or too many image files in selection")
         return False
@@ -322,7 +370,7 @@ def album_art(*file_list: str, scale: str | None = None) -> bool:
     else:
         cover_file = album_cover[0]
 
-    for f in [AudioFile(f) for f in fil.file_list(*file_list, file_type=fil.FileType.AUDIO_FILE)]:
+    for f in [AudioFile(f) for f in fil.file_list(*file_list, file_type=fil.FileType.AUDIO_FILE, recurse=True)]:
         f.encode_album_art(cover_file)
 
     if scale is not None:
@@ -330,71 +378,86 @@ def album_art(*file_list: str, scale: str | None = None) -> bool:
     return True
 
 
-def get_hash_list(filelist: list[str], algo: str = "audio", old_hash: dict | None = None) -> dict:
+def get_hash_list(filelist: list[str], algo: str = "audio", old_hash: dict | None = None, index: hash_index.HashIndex | None = None) -> dict:
+    """Returns the list of files per hash, files are hashed concurrently
+
+    :param algo: "audio", "pcm", "pcm:<seconds>" or any of fil.HASH_ALGORITHMS
+    :param index: Hash index to read hashes of unchanged files from, and to store new hashes in
+    """
     log.logger.info("Getting audio hashes of %d files", len(filelist))
-    hashes: dict = {}
-    i = 0
-    if algo != "audio":
+    if algo != "audio" and not is_pcm_algo(algo):
         return fil.get_hash_list(filelist, algo)
+    file_hashes, stats = {}, {}
+    if index is not None:
+        for f in filelist:
+            try:
+                stats[f] = os.stat(f)
+            except OSError:
+                continue
+            file_hashes[f] = index.get(f, stats[f], algo)
+    todo = [f for f in dict.fromkeys(filelist) if file_hashes.get(f, None) is None]
+    log.logger.info("%d hashes found in index, computing %d hashes", len(filelist) - len(todo), len(todo))
+    workers = int(conf.get_property(fil.HASH_WORKERS_KEY) or fil.DEFAULT_HASH_WORKERS)
+    i = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="AudioHash") as executor:
+        for f, h in zip(todo, executor.map(__audio_hash, todo, itertools.repeat(algo))):
+            file_hashes[f] = h
+            if index is not None and h is not None and f in stats:
+                index.put(f, stats[f], h, algo)
+            i += 1
+            if (i % 100) == 0:
+                log.logger.info("%d audio hashes computed", i)
+    hashes: dict = {}
     for f in filelist:
-        try:
-            obj = AudioFile(f)
-            obj.get_specs()
-            h = obj.hash(algo)
-        except ex.FileTypeError:
+        h = file_hashes.get(f, None)
+        if h is None:
             continue
         if h in hashes:
             hashes[h].append(f)
         else:
             hashes[h] = [f]
-        i += 1
-        if (i % 100) == 0:
-            log.logger.info("%d audio hashes computed", i)
     return hashes
 
 
-def update_hash_list(master_dir: str, hash_file_name: str | None = None) -> dict:
+def __audio_hash(file: str, algo: str = "audio") -> str | None:
+    try:
+        return AudioFile(file).hash(algo)
+    except ex.FileTypeError:
+        return None
+    except (ffmpeg.Error, subprocess.CalledProcessError, OSError) as e:
+        log.logger.warning("Can't hash %s, skipped: %s", file, str(e))
+        return None
+
+
+def update_hash_list(master_dir: str, index_file: str | None = None, algo: str = "audio") -> hash_index.HashIndex:
+    """Updates the audio hash index of a directory, only hashing new or modified files, and returns the index
+
+    Only directories that changed since the previous update are listed, files of other directories
+    are only checked for in place modifications (eg retagging).
+    The legacy <master_dir>.json hash list, if any, is imported when the index is created
+    """
     log.logger.info("Updating file hash")
-    filelist = fil.dir_list(master_dir, recurse=True)
-    if hash_file_name is None:
-        hash_file_name = f"{master_dir}.json"
-    _hash = read_hash_list(hash_file_name)
-    log.logger.info("Getting audio hashes of %d files", len(filelist))
-    last_date = datetime.strptime(_hash["datetime"], "%Y-%m-%d %H:%M:%S")
-    hashes = _hash["hashes"]
-    files = _hash.get("files", {})
-    log.logger.info("Already %d files in hash", len(files))
-    i, j, k = 0, 0, 0
-    _hash["datetime"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    for f in filelist:
-        try:
-            file_o = AudioFile(f)
-            if file_o.filename not in files or datetime(*(file_o.modification_date())[:6]) > last_date:
-                log.logger.debug("File %s already in hash", f)
-                file_o.probe()
-                file_o.get_specs()
-                h = file_o.hash("audio")
-                files[f] = h
-                if h in hashes:
-                    hashes[h].append(f)
-                else:
-                    hashes[h] = [f]
-                k += 1
-            else:
-                log.logger.debug("File %s already in hash", f)
-            j += 1
-        except ex.FileTypeError:
-            pass
-        i += 1
-        if (i % 100) == 0:
-            log.logger.info("%d files / %d audio hashes computed / %d updated", i, j, k)
-    log.logger.info("%d files / %d audio hashes computed / %d updated", i, j, k)
-    _hash["root_directory"] = master_dir
-    _hash["hashes"] = hashes
-    _hash["files"] = files
-    with open(hash_file_name, "w", encoding="utf-8") as fh:
-        print(json.dumps(_hash, indent=2, sort_keys=False, separators=(",", ": ")), file=fh)
-    return hashes
+    if index_file is None:
+        index_file = hash_index.index_file(master_dir)
+    is_new = not os.path.exists(index_file)
+    index = hash_index.HashIndex(index_file)
+    json_file = f"{master_dir}.json"
+    if is_new and os.path.isfile(json_file):
+        index.import_json(json_file)
+    log.logger.info("Already %d files in hash", len(index))
+    manifest_file = manifest.manifest_file(master_dir, f"hashes-{algo.replace(':', '-')}")
+    full_sync = not os.path.exists(manifest_file) or index.count(algo) == 0
+    with manifest.Manifest(manifest_file, file_type=fil.FileType.AUDIO_FILE) as mf:
+        changes = mf.scan(master_dir, verify_files=True)
+        if full_sync:
+            # The manifest scan already listed the whole tree
+            files = mf.files(master_dir)
+            removed = sorted(set(index.files(master_dir)).difference(files))
+            index.apply(files, removed, lambda f: __audio_hash(f, algo), algo=algo)
+        else:
+            index.apply(changes.changed(), changes.removed, lambda f: __audio_hash(f, algo), algo=algo)
+        mf.commit()
+    return index
 
 
 def save_hash_list(h_file: str, hash_data: dict) -> None:
@@ -419,12 +482,33 @@ def csv_headers() -> list[str]:
     return arr
 
 
-def concat(target_file: str, file_list: list[str]) -> str:
-    """Concatenates several audio files - they must share the same codec and sample rate"""
+def concat_compatible(file_list: list[str]) -> bool:
+    """Returns whether audio files can be concatenated without re-encoding, ie if their audio streams
+    have the same codec, sample rate and channel layout"""
+    signatures = set()
+    nb_files = 0
+    for f in media.probe_many(file_list, profile=media.FULL_PROBE):
+        nb_files += 1
+        signatures.add(tuple(tuple(s.get(k, None) for k in CONCAT_KEYS) for s in f.specs["streams"] if s["codec_type"] == "audio"))
+        if len(signatures) > 1:
+            log.logger.info("%s audio differs from other files, files can't be concatenated without re-encoding", f.filename)
+            return False
+    return nb_files == len(file_list)
+
+
+def concat(target_file: str, file_list: list[str], reencode: bool = False) -> str:
+    """Concatenates several audio files - they must share the same codec and sample rate
+    Files are concatenated without re-encoding, with the tags and cover of the first file, when their audio is compatible,
+    unless reencode is True"""
     import filters.filter as filters
 
     file_list = sorted(file_list, key=lambda f: os.path.basename(f).lower())
     log.logger.info("%s = %s", target_file, " + ".join(file_list))
+    if not reencode and concat_compatible(file_list):
+        duration = sum(f.duration or 0.0 for f in media.probe_many(file_list))
+        # The first file is also an input to copy its tags and cover
+        params = f'-i "{file_list[0]}" -map 0:a -map 1:v? -map_metadata 1 -c copy -disposition:v:0 attached_pic'
+        return media.concat_demuxer(target_file, file_list, params=params, duration=duration)
     count = len(file_list)
     inputs = filters.inputs_str(file_list)
     cmplx = "".join(f"[{i}:a]" for i in range(count))
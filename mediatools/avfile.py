@@ -39,9 +39,26 @@ def __patch_args(file_type: str, **kwargs) -> dict:
     return kwargs
 
 
+def __cut_range(file_object: audio.AudioFile | video.VideoFile, target_file: str, smart: bool = False, **kwargs) -> str:
+    if smart and isinstance(file_object, video.VideoFile):
+        # Open ended ranges start at the beginning or stop at the end of the file
+        start = kwargs.get("start", None) or 0
+        stop = kwargs.get("stop", None) or file_object.duration
+        return file_object.smart_cut(target_file, start, stop)
+    return file_object.encode(target_file=target_file, **kwargs)
+
+
 def cut(
-    file: str, output: str | None = None, start: float | str | None = None, stop: float | str | None = None, timeranges: str | None = None, **kwargs
+    file: str,
+    output: str | None = None,
+    start: float | str | None = None,
+    stop: float | str | None = None,
+    timeranges: str | None = None,
+    smart: bool = False,
+    **kwargs,
 ) -> str | None:
+    """Cuts time ranges of a video or audio file without re-encoding, at key frames for video,
+    or frame accurately re-encoding only the partial GOPs at the cut boundaries when smart is True"""
     t = fil.get_type(file)
     if t not in (fil.FileType.VIDEO_FILE, fil.FileType.AUDIO_FILE):
         raise ex.FileTypeError(file, "video or audio")
@@ -59,7 +76,7 @@ def cut(
         for r in timeranges.split(","):
             kwargs["start"], kwargs["stop"] = r.split("-", maxsplit=2)
             outputfile = util.automatic_output_file_name(outfile=output, infile=file, postfix=f"cut{i}")
-            outputfile = file_object.encode(target_file=outputfile, **kwargs)
+            outputfile = __cut_range(file_object, outputfile, smart, **kwargs)
             util.generated_file(outputfile)
             i += 1
     else:
@@ -68,6 +85,6 @@ def cut(
         if stop is None:
             stop = file_object.duration
         outputfile = util.automatic_output_file_name(outfile=output, infile=file, postfix="cut")
-        outputfile = file_object.encode(target_file=outputfile, start=start, stop=stop, **kwargs)
+        outputfile = __cut_range(file_object, outputfile, smart, start=start, stop=stop, **kwargs)
         util.generated_file(outputfile)
     return output
@@ -0,0 +1,209 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""Registry of the capabilities of the ffmpeg binary (version, filters, encoders, hardware acceleration),
+persisted on disk and keyed by the binary path, size and mtime, so that ffmpeg is only queried once per binary"""
+
+from __future__ import annotations
+
+import os
+import json
+import shutil
+import threading
+import subprocess
+from mediatools import log
+
+CACHE_FILE_NAME: str = "ffmpeg_capabilities.json"
+# Encoder and hardware acceleration method the hardware acceleration test encode needs
+HW_ACCEL_ENCODER: str = "h264_nvenc"
+HW_ACCEL_METHOD: str = "cuda"
+
+_LOCK = threading.RLock()
+_CAPABILITIES: dict[str, dict] = {}
+_CACHE_FILE: str | None = None
+
+
+def set_cache_file(filename: str | None) -> None:
+    """Sets the file where capabilities are persisted, None reverts to the default location"""
+    global _CACHE_FILE
+    with _LOCK:
+        _CAPABILITIES.clear()
+        _CACHE_FILE = filename
+
+
+def cache_file() -> str:
+    """Returns the file where capabilities are persisted"""
+    import mediatools.media_config as conf
+
+    if _CACHE_FILE is not None:
+        return _CACHE_FILE
+    return os.path.join(conf.get_cache_dir(), CACHE_FILE_NAME)
+
+
+def ffmpeg_path() -> str | None:
+    """Returns the absolute path of the ffmpeg binary, None if not found"""
+    import mediatools.utilities as util
+
+    return shutil.which(util.get_ffmpeg())
+
+
+def __binary_key(path: str) -> str | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{path}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def __run(path: str, option: str) -> list[str]:
+    try:
+        result = subprocess.run([path, "-hide_banner", option], capture_output=True, encoding="utf-8", errors="replace", check=False)
+    except OSError as e:
+        log.logger.warning("Can't run %s %s: %s", path, option, str(e))
+        return []
+    return result.stdout.splitlines()
+
+
+def parse_list(lines: list[str]) -> list[str]:
+    """Returns the names listed by ffmpeg -filters or -encoders, the 2nd word of lines after the legend"""
+    names, legend = [], True
+    for line in lines:
+        words = line.split()
+        if legend:
+            # The encoders legend ends with a ------ line, the filters legend with the "|" source or sink line
+            legend = not (words[:1] == ["------"] or words[:1] == ["|"])
+            continue
+        if len(words) >= 2:
+            names.append(words[1])
+    return names
+
+
+def parse_hwaccels(lines: list[str]) -> list[str]:
+    """Returns the hardware acceleration methods listed by ffmpeg -hwaccels"""
+    return [line.strip() for line in lines[1:] if line.strip()]
+
+
+def __query(path: str) -> dict:
+    log.logger.info("Querying capabilities of %s", path)
+    version = __run(path, "-version")
+    return {
+        "version": version[0] if version else None,
+        "filters": parse_list(__run(path, "-filters")),
+        "encoders": parse_list(__run(path, "-encoders")),
+        "hwaccels": parse_hwaccels(__run(path, "-hwaccels")),
+        "hw_accel": None,
+    }
+
+
+def __load() -> dict[str, dict]:
+    try:
+        with open(cache_file(), "r", encoding="utf-8") as fd:
+            return json.load(fd)
+    except (OSError, ValueError):
+        return {}
+
+
+def __save(key: str, entry: dict) -> None:
+    """Saves the capabilities of a binary, keeping those of other binaries"""
+    all_entries = __load()
+    all_entries[key] = entry
+    tmp = f"{cache_file()}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as fd:
+            json.dump(all_entries, fd, indent=1)
+        os.replace(tmp, cache_file())
+    except OSError as e:
+        log.logger.warning("Can't save ffmpeg capabilities in %s: %s", cache_file(), str(e))
+
+
+def get() -> dict:
+    """Returns the capabilities of the ffmpeg binary, queried from ffmpeg only if not known yet"""
+    path = ffmpeg_path()
+    key = None if path is None else __binary_key(path)
+    if key is None:
+        log.logger.warning("ffmpeg binary not found, no ffmpeg capabilities")
+        return {"version": None, "filters": [], "encoders": [], "hwaccels": [], "hw_accel": False}
+    with _LOCK:
+        if key not in _CAPABILITIES:
+            entry = __load().get(key, None)
+            if entry is None:
+                entry = __query(path)
+                __save(key, entry)
+            _CAPABILITIES[key] = entry
+        return _CAPABILITIES[key]
+
+
+def version() -> str | None:
+    """Returns the ffmpeg version string"""
+    return get()["version"]
+
+
+def has_filter(name: str) -> bool:
+    """Returns whether ffmpeg has a given filter"""
+    return name in get()["filters"]
+
+
+def has_encoder(name: str) -> bool:
+    """Returns whether ffmpeg has a given encoder"""
+    return name in get()["encoders"]
+
+
+def has_hwaccel(name: str) -> bool:
+    """Returns whether ffmpeg has a given hardware acceleration method"""
+    return name in get()["hwaccels"]
+
+
+def hw_accel_usable() -> bool:
+    """Returns whether hardware accelerated encoding works, testing it with a short encode the first time only"""
+    import mediatools.utilities as util
+
+    with _LOCK:
+        caps = get()
+        if caps["hw_accel"] is not None:
+            return caps["hw_accel"]
+        if not has_hwaccel(HW_ACCEL_METHOD) or not has_encoder(HW_ACCEL_ENCODER):
+            log.logger.info("ffmpeg has no %s hardware acceleration or no %s encoder", HW_ACCEL_METHOD, HW_ACCEL_ENCODER)
+            caps["hw_accel"] = False
+        else:
+            log.logger.info("Checking if hardware acceleration can be used")
+            outputfile = util.get_tmp_file() + ".mp4"
+            inputfile = str(util.package_home() / "video-720p.mp4")
+            try:
+                log.logger.debug("Trying to encode 1 second of %s", inputfile)
+                util.run_ffmpeg(
+                    f'{util.HW_ACCEL_PREFIX} -ss 0 -i "{inputfile}" -vf scale_cuda=640:-1 -c:a copy -c:v {HW_ACCEL_ENCODER} -to 2 "{outputfile}"'
+                )
+                os.remove(outputfile)
+                caps["hw_accel"] = True
+            except subprocess.CalledProcessError:
+                caps["hw_accel"] = False
+        path = ffmpeg_path()
+        __save(__binary_key(path), caps)
+        return caps["hw_accel"]
+
+
+def clear() -> None:
+    """Forgets all capabilities, so that they are queried from ffmpeg again"""
+    with _LOCK:
+        _CAPABILITIES.clear()
+        try:
+            os.remove(cache_file())
+        except FileNotFoundError:
+            pass
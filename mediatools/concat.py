@@ -34,8 +34,13 @@ def main():
     parser.add_argument("-o", "--outputfile", help="Output file to generate", required=True)
     parser.add_argument("-g", "--debug", required=False, type=int, help="Debug level")
     parser.add_argument("--hw_accel", required=False, choices=["auto", "off", "on"], help="Use Nvidia HW acceleration")
+    parser.add_argument(
+        "--reencode", required=False, default=False, action="store_true", help="Re-encode even if files can be concatenated without re-encoding"
+    )
     kwargs = util.parse_media_args(parser)
-    output = video.concat(kwargs.get("outputfile"), kwargs.pop("inputfiles"), hw_accel=kwargs.get("hw_accel", False))
+    output = video.concat(
+        kwargs.get("outputfile"), kwargs.pop("inputfiles"), hw_accel=kwargs.get("hw_accel", False), reencode=kwargs.get("reencode", False)
+    )
     util.generated_file(output)
 
 
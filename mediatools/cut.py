@@ -38,6 +38,13 @@ def main():
     parser = video.add_video_args(parser)
     parser.add_argument("--start", required=False, help="Cut start timestamp")
     parser.add_argument("--stop", required=False, help="Cut stop timestamp")
+    parser.add_argument(
+        "--smart",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Frame accurate cut, re-encoding only the partial GOPs at the cut boundaries",
+    )
     kwargs = util.parse_media_args(parser)
     if kwargs.get("timeranges", None) is not None:
         log.logger.info("Getting multiple ranges")
@@ -63,12 +70,12 @@ def main():
             start, stop = t_bounds
             outputfile = util.automatic_output_file_name(outfile=None, infile=ifile, postfix=f"cut{i}")
             log.logger.info("Generating file %s", outputfile)
-            av.cut(ifile, output=outputfile, start=start, stop=stop)
+            av.cut(ifile, output=outputfile, start=start, stop=stop, smart=kwargs.get("smart", False))
             last_stop = stop
             if i == len(t_ranges):
                 i += 1
                 outputfile = util.automatic_output_file_name(outfile=None, infile=ifile, postfix=f"cut{i}")
-                av.cut(ifile, output=outputfile, start=start, stop=stop)
+                av.cut(ifile, output=outputfile, start=start, stop=stop, smart=kwargs.get("smart", False))
         else:
             log.logger.info("Generating single cut")
             av.cut(ifile, output=kwargs.get("outputfile", None), **kwargs)
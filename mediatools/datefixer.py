@@ -28,10 +28,9 @@ from __future__ import annotations
 import sys
 import argparse
 import re
-import concurrent.futures
+import logging
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from exiftool import ExifToolHelper
 import mediatools.utilities as util
 import mediatools.log as log
 import utilities.file as fil
@@ -88,44 +87,45 @@ def guess_offset(string: str) -> relativedelta | None:
     return relativedelta(years=year, months=month, days=day, hours=hour, minutes=min, seconds=sec)
 
 
-def change_file_date(file: str, change_mode: str = "filename", offset: str = "") -> tuple[str, bool]:
-    """Changes the date of a file to the date in the filename"""
-    log.logger.info("Processing file %s", file)
-    success = False
+def new_file_date(file: str, change_mode: str = "filename", offset: str = "", creation_date: datetime | None = None) -> datetime | None:
+    """Returns the date a file should have, depending on the change mode
+
+    :param creation_date: Current creation date of the file for offset mode, read from the file if not provided
+    """
     if change_mode == "filename":
-        videofile.get_exif(file)
-        new_date = guess_date(fil.basename(file))
-        if new_date and videofile.set_creation_date(file, new_date):
-            success = True
+        if log.logger.isEnabledFor(logging.DEBUG):
+            videofile.get_exif(file)
+        return guess_date(fil.basename(file))
     elif change_mode == "offset":
-        if offset[0] in ("-", "+"):
-            complete_offset = guess_offset(offset)
-            if complete_offset and videofile.set_creation_date(file, videofile.get_creation_date(file) + complete_offset):
-                success = True
+        if offset[0] not in ("-", "+"):
+            return None
+        complete_offset = guess_offset(offset)
+        if creation_date is None:
+            creation_date = videofile.get_creation_date(file)
+        if complete_offset is None or creation_date is None:
+            return None
+        return creation_date + complete_offset
     elif change_mode == "absolute":
-        new_date = guess_date(offset)
-        if new_date and videofile.set_creation_date(file, new_date):
-            success = True
-    return file, success
+        return guess_date(offset)
+    return None
+
+
+def change_file_date(file: str, change_mode: str = "filename", offset: str = "") -> tuple[str, bool]:
+    """Changes the date of a file to the date in the filename"""
+    log.logger.info("Processing file %s", file)
+    return file, videofile.set_creation_date(file, new_file_date(file, change_mode, offset))
 
 
 def change_files_date(change_mode: str, offset: str, *file_list: str) -> int:
-    nb_success = 0
+    """Changes the date of files, all files are updated with a single exiftool invocation"""
     nb_files = len(file_list)
-    seq = 1
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="GetMetadata") as executor:
-        futures = [executor.submit(change_file_date, file, change_mode, offset) for file in file_list]
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                file, success = future.result(timeout=10)
-                if success:
-                    nb_success += 1  # Retrieve result or raise an exception
-                log.logger.info("Processed file %d/%d for %s", seq, nb_files, file)
-            except TimeoutError:
-                log.logger.error("Change file date timeout after 10 seconds for %s, aborted.", str(future))
-            except Exception as e:
-                log.logger.error("Change file date task raised an exception: %s", str(e))
-            seq += 1
+    current_dates = videofile.get_creation_dates(list(file_list)) if change_mode == "offset" else {}
+    new_dates = {}
+    for file in file_list:
+        new_dates[file] = new_file_date(file, change_mode, offset, current_dates.get(file, None))
+        if new_dates[file] is None:
+            log.logger.warning("Can't determine new date of %s, skipped", file)
+    nb_success = videofile.set_creation_dates(new_dates)
     log.logger.info("Processed all files. Success rate %d/%d or %d%%", nb_success, nb_files, int(nb_success * 100 / nb_files))
     return nb_success
 
@@ -140,7 +140,7 @@ def main() -> None:
     parser.add_argument("-g", "--debug", required=False, type=int, help="Debug level")
     kwargs = util.parse_media_args(parser)
 
-    file_list = fil.file_list(*kwargs["files"], file_type=None, recurse=False)
+    file_list = fil.file_list(*kwargs["files"], file_type=None, recurse=True)
     file_list = [f for f in file_list if fil.extension(f).lower() in fil.IMAGE_AND_VIDEO_EXTENSIONS]
     mode = kwargs["mode"]
     if mode == "filename":
@@ -0,0 +1,153 @@
+#!python3
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""Finds duplicate files in 3 stages: same size, then same head and tail hash, then same full hash"""
+
+from __future__ import annotations
+
+import os
+import argparse
+import concurrent.futures
+from collections.abc import Callable
+from mediatools import log
+import mediatools.utilities as util
+import mediatools.media_config as conf
+import utilities.file as fil
+
+DEFAULT_ALGO: str = "blake2b"
+# Number of bytes hashed at the start and at the end of files in the partial hash stage
+PARTIAL_HASH_SIZE: int = 4 * 1024 * 1024
+ACTIONS: tuple[str, ...] = ("report", "hardlink", "symlink")
+
+# A group of files with the same size and, so far, the same content
+_Group = tuple[int, list[str]]
+
+
+def find_duplicates(files: list[str], algo: str = DEFAULT_ALGO, partial_size: int = PARTIAL_HASH_SIZE, workers: int | None = None) -> list[list[str]]:
+    """Returns the groups of files with identical content, in the order of the input file list
+
+    Only files with the same size are hashed, and only their first and last partial_size bytes.
+    Files still colliding after that are fully hashed. Empty files and symlinks are ignored
+    """
+    if workers is None:
+        workers = int(conf.get_property(fil.HASH_WORKERS_KEY) or fil.DEFAULT_HASH_WORKERS)
+    files = list(dict.fromkeys(files))
+    groups = __group_by_size(files)
+    log.logger.info("%d files share their size with another file", sum(len(g) for _, g in groups))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="Dedupe") as executor:
+        groups = __regroup(executor, groups, lambda f: fil.File(f).partial_hash(partial_size, algo))
+        log.logger.info("%d files share their partial hash with another file", sum(len(g) for _, g in groups))
+        # Files of up to 2 x partial_size bytes were fully hashed already
+        complete = [g for g in groups if g[0] <= 2 * partial_size]
+        partial = [g for g in groups if g[0] > 2 * partial_size]
+        complete += __regroup(executor, partial, lambda f: fil.File(f).hash(algo))
+    duplicates = [g for _, g in complete]
+    log.logger.info("Found %d groups of duplicate files, %d bytes wasted", len(duplicates), sum(s * (len(g) - 1) for s, g in complete))
+    order = {f: i for i, f in enumerate(files)}
+    return sorted(duplicates, key=lambda g: order[g[0]])
+
+
+def __group_by_size(files: list[str]) -> list[_Group]:
+    by_size: dict[int, list[str]] = {}
+    for f in files:
+        try:
+            st = os.lstat(f)
+        except OSError as e:
+            log.logger.warning("Can't access %s: %s", f, str(e))
+            continue
+        if st.st_size > 0 and os.path.isfile(f) and not os.path.islink(f):
+            by_size.setdefault(st.st_size, []).append(f)
+    return [(size, group) for size, group in by_size.items() if len(group) > 1]
+
+
+def __regroup(executor: concurrent.futures.Executor, groups: list[_Group], hash_func: Callable[[str], str | None]) -> list[_Group]:
+    """Splits groups of files by hash, keeps the sub groups of more than 1 file"""
+    files = [f for _, group in groups for f in group]
+    digests = dict(zip(files, executor.map(hash_func, files)))
+    result = []
+    for size, group in groups:
+        by_hash: dict[str, list[str]] = {}
+        for f in group:
+            if digests[f] is not None:
+                by_hash.setdefault(digests[f], []).append(f)
+        result += [(size, g) for g in by_hash.values() if len(g) > 1]
+    return result
+
+
+def replace_with_link(keeper: str, duplicate: str, hard: bool = False) -> str:
+    """Replaces a duplicate file by a link to the file kept, returns the link"""
+    tmp = f"{duplicate}.dedupe"
+    link = fil.File(keeper).create_link(tmp, hard=hard)
+    # Windows shortcuts get a .lnk extension
+    target = duplicate + link[len(tmp) :]
+    if target != duplicate:
+        os.remove(duplicate)
+    os.replace(link, target)
+    return target
+
+
+def link_duplicates(groups: list[list[str]], hard: bool = False) -> int:
+    """Replaces all files of each group but the first by a link to the first, returns the number of files replaced"""
+    nb_links = 0
+    for keeper, *duplicates in groups:
+        for f in duplicates:
+            try:
+                if hard and os.path.samestat(os.stat(keeper), os.stat(f)):
+                    log.logger.debug("%s is already a hard link to %s", f, keeper)
+                    continue
+                replace_with_link(keeper, f, hard=hard)
+                nb_links += 1
+            except OSError as e:
+                log.logger.error("Can't replace %s by a link to %s: %s", f, keeper, str(e))
+    return nb_links
+
+
+def report(groups: list[list[str]]) -> str:
+    """Returns a text report of duplicate files groups"""
+    lines = []
+    for group in groups:
+        lines.append(f"{len(group)} files of {os.path.getsize(group[0])} bytes:")
+        lines += [f"    {f}" for f in group]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    util.init("media-dedupe")
+    parser = argparse.ArgumentParser(description="Finds duplicate files, reports them or replaces them by links")
+    parser.add_argument("-i", "--inputfiles", required=True, nargs="+", help="Files or directories to search duplicates in")
+    parser.add_argument("-a", "--action", required=False, default="report", choices=ACTIONS, help="What to do with duplicates")
+    parser.add_argument("--algo", required=False, default=DEFAULT_ALGO, choices=fil.HASH_ALGORITHMS, help="Hash algorithm")
+    parser.add_argument("-t", "--type", required=False, choices=tuple(fil.FileType.FILE_EXTENSIONS), help="Only search files of that type")
+    parser.add_argument("-g", "--debug", required=False, type=int, help="Debug level")
+    kwargs = util.parse_media_args(parser)
+
+    files = fil.file_list(*kwargs["inputfiles"], file_type=kwargs.get("type", None), recurse=True)
+    groups = find_duplicates(files, algo=kwargs["algo"])
+    if kwargs["action"] == "report":
+        if groups:
+            print(report(groups))
+    else:
+        nb_links = link_duplicates(groups, hard=kwargs["action"] == "hardlink")
+        log.logger.info("Replaced %d duplicate files by links", nb_links)
+
+
+if __name__ == "__main__":
+    main()
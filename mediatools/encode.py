@@ -31,8 +31,10 @@ from mediatools import log
 import utilities.file as fil
 import mediatools.videofile as video
 import mediatools.audiofile as audio
+import mediatools.mediafile as media
 import mediatools.utilities as util
 import mediatools.options as opt
+import mediatools.scheduler as scheduler
 import utilities.file as fileutil
 
 
@@ -45,24 +47,24 @@ def encode_file(file: str, file_type: str, **kwargs) -> str:
     else:
         raise ValueError(f"File {file} is not an audio or video file")
 
+    # Creation date is carried by ffmpeg, exiftool only sets the dates ffmpeg can't write
+    creation_date = video.get_creation_date(file)
     if kwargs.get("timeranges", None) is None:
-        outfile = file_object.encode(kwargs.get("outputfile", None), **kwargs)
-        video.set_creation_date(outfile, video.get_creation_date(file))
+        outfile = file_object.encode(kwargs.get("outputfile", None), creation_date=creation_date, **kwargs)
+        video.set_creation_date(outfile, creation_date, after_encode=True)
         return outfile
 
     ext = util.get_profile_extension(kwargs.get("profile"))
     count = 0
     filelist: list[str] = []
     timeranges = kwargs.get("timeranges", None).split(",")
-    creation_date = video.get_creation_date(file)
     for t_r in timeranges:
         kwargs[opt.Option.START], kwargs[opt.Option.STOP] = t_r.split("-")
         count += 1
         target_file = util.automatic_output_file_name(None, file, str(count), ext)
         filelist.append(target_file)
-        outputfile = file_object.encode(target_file, **kwargs)
+        outputfile = file_object.encode(target_file, creation_date=creation_date, **kwargs)
         log.logger.info("File %s generated", outputfile)
-        video.set_creation_date(outputfile, creation_date)
 
         print(f"File {outputfile} generated")
 
@@ -75,6 +77,8 @@ def encode_file(file: str, file_type: str, **kwargs) -> str:
         log.logger.info("Concatenated file %s generated", target_file)
         video.set_creation_date(target_file, creation_date)
         print(f"Concatenated file {target_file} generated")
+    # Creation date of all parts is set at once
+    video.set_creation_dates({f: creation_date for f in filelist}, after_encode=True)
     return target_file
 
 
@@ -82,19 +86,23 @@ def main() -> None:
     parser = util.get_common_args("video-encode", "Audio and Video file (re)encoder")
     parser = video.add_video_args(parser)
 
+    scheduler.add_jobs_arg(parser)
     kwargs = util.parse_media_args(parser)
+    nb_jobs = kwargs.pop("jobs", None)
 
-    file_list = fil.file_list(*kwargs["inputfiles"])
-    nb_files = len(file_list)
-    for i in range(nb_files):
-        log.logger.info("%3d/%3d : %3d%% : %s", i + 1, nb_files, (i + 1) * 100 // nb_files, file_list[i])
-        ofile = encode_file(file_list[i], fil.get_type(file_list[i]), **kwargs)
+    def encode(file: str, threads: int | None) -> str:
+        ofile = encode_file(file, fil.get_type(file), **kwargs, **util.remove_nones({opt.Option.THREADS: threads}))
         if kwargs.get("keepName", False):
-            splits = file_list[i].split(".")
+            splits = file.split(".")
             ext = splits.pop()
             base = ".".join(splits)
-            fileutil.rename(file_list[i], f"{base}.before_encode.{ext}", False)
-            fileutil.rename(ofile, file_list[i])
+            fileutil.rename(file, f"{base}.before_encode.{ext}", False)
+            fileutil.rename(ofile, file)
+        return ofile
+
+    file_list = fil.file_list(*kwargs["inputfiles"], recurse=True)
+    durations = {mf.filename: mf.get_duration() or 0.0 for mf in media.probe_many(file_list, profile="duration-only")}
+    scheduler.Scheduler(nb_jobs).run([scheduler.Job(f, encode, duration=durations.get(os.path.abspath(f), 0.0)) for f in file_list])
 
 
 if __name__ == "__main__":
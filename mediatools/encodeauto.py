@@ -23,16 +23,31 @@
 # Accepts a single file or a directory (all video files in the directory are processed).
 
 import os
-import time
 import argparse
 from mediatools.log import logger
 import mediatools.utilities as util
 import mediatools.videofile as video
+import mediatools.mediafile as media
+import mediatools.probe_cache as probe_cache
+import mediatools.scheduler as scheduler
+import mediatools.journal as journal
 import utilities.file as fileutil
 
 
-def encode_file(inputfile: str, before: str, after: str, force: bool, duration: float | None = None) -> None:
-    """Encode a single video file with the given before/after ffmpeg options."""
+def encode_file(
+    inputfile: str,
+    before: str,
+    after: str,
+    force: bool,
+    duration: float | None = None,
+    threads: int | None = None,
+    batch_journal: journal.Journal | None = None,
+) -> None:
+    """Encode a single video file with the given before/after ffmpeg options.
+
+    :param threads: Max number of threads of the encode, None for ffmpeg default
+    :param batch_journal: Journal of the batch the file belongs to, to record the encode progress
+    """
     base, ext = os.path.splitext(inputfile)
     ext = ext.lstrip(".").lower()
 
@@ -45,6 +60,10 @@ def encode_file(inputfile: str, before: str, after: str, force: bool, duration:
     if ext in ("mts", "avi", "mkv"):
         file_after = f"-vf yadif_cuda=deint=all {after}"
         new_ext = "mp4"
+    thread_options = scheduler.ffmpeg_thread_options(threads, util.get_ffmpeg_cmdline_params(after).get("vcodec", None))
+    if util.get_ffmpeg_cmdline_switch(after, "x265-params"):
+        thread_options.pop("x265-params", None)
+    file_after += media.build_ffmpeg_options(thread_options)
 
     logger.info("Encoding %s (ext=%s)", inputfile, ext)
     seq = 0
@@ -53,22 +72,43 @@ def encode_file(inputfile: str, before: str, after: str, force: bool, duration:
             seq += 1
     outputfile = f"{base}.encode.{seq:02}.{new_ext}"
 
-    cmd = f'{before} -i "{inputfile}" {file_after} "{outputfile}"'
+    # The encode is written to the .encode.NN file, only renamed to its final name once complete
+    backup = None
+    if ext != new_ext:
+        final_file = f"{base}.{new_ext}"
+    elif is_original:
+        final_file = f"{base}.{ext}"
+    else:
+        final_file, backup = inputfile, f"{base}.original.{ext}"
+    if batch_journal is not None:
+        batch_journal.start(inputfile, final_file, outputfile, backup)
+
+    creation_date = video.get_creation_date(inputfile)
+    cmd = f'{before} -i "{inputfile}" {file_after} {video.ffmpeg_date_options(outputfile, creation_date)} "{outputfile}"'
     logger.info("COMMAND = ffmpeg %s", cmd)
     if duration is None:
         duration = video.get_duration(inputfile)
-    util.run_ffmpeg(params=cmd, duration=duration)
-
-    video.set_creation_date(outputfile, video.get_creation_date(inputfile))
-    if ext == new_ext:
-        if not is_original:
-            renamed = f"{base}.original.{ext}"
-            fileutil.rename(inputfile, renamed, force)
-            fileutil.rename(outputfile, inputfile, force)
-        else:
-            os.rename(outputfile, f"{base}.{ext}")
+    try:
+        util.run_ffmpeg(params=cmd, duration=duration)
+    except Exception as e:
+        if os.path.exists(outputfile):
+            os.remove(outputfile)
+        if batch_journal is not None:
+            batch_journal.failed(inputfile, e)
+        raise
+
+    video.set_creation_date(outputfile, creation_date, after_encode=True)
+    if batch_journal is not None:
+        batch_journal.written(inputfile)
+    if backup is not None:
+        fileutil.rename(inputfile, backup, force)
+        fileutil.rename(outputfile, inputfile, force)
+    elif is_original:
+        os.rename(outputfile, final_file)
     else:
-        fileutil.rename(outputfile, f"{base}.{new_ext}", force)
+        fileutil.rename(outputfile, final_file, force)
+    if batch_journal is not None:
+        batch_journal.done(inputfile, final_file)
 
 
 def main():
@@ -79,35 +119,33 @@ def main():
     parser.add_argument("--keepName", required=False, default=False, action="store_true")
     parser.add_argument("--before", nargs="*", required=True)
     parser.add_argument("--after", nargs="*", required=True)
+    util.add_probe_cache_arg(parser)
+    scheduler.add_jobs_arg(parser)
+    journal.add_resume_arg(parser)
     kwargs = vars(parser.parse_args())
     util.set_debug_level(kwargs.get("debug", 3))
+    if kwargs["no_probe_cache"]:
+        probe_cache.set_enabled(False)
 
     inputpath = kwargs["inputfiles"]
     before = " ".join(kwargs["before"])
     after = " ".join(kwargs["after"])
     force = not kwargs["nooverwrite"]
 
-    files = fileutil.file_list(inputpath, file_type=fileutil.FileType.VIDEO_FILE)
+    files = fileutil.file_list(inputpath, file_type=fileutil.FileType.VIDEO_FILE, recurse=True)
     if not files:
         logger.error("No video files found in %s", inputpath)
         return
 
-    n = len(files)
-    durations = [video.get_duration(f) or 0.0 for f in files]
-    total_dur = sum(durations)
-    logger.info("%d file(s) to encode, total duration: %s", n, util.to_hms_str(total_dur))
-
-    processed_dur = 0.0
-    wall_start = time.time()
-
-    for i, (f, dur) in enumerate(zip(files, durations)):
-        encode_file(f, before, after, force, duration=total_dur - processed_dur)
-        processed_dur += dur
-        pct = 100.0 * processed_dur / total_dur if total_dur > 0 else 100.0
-        elapsed = time.time() - wall_start
-        speed = processed_dur / elapsed if elapsed > 0 else 0
-        eta = (total_dur - processed_dur) / speed if speed > 0 else 0
-        logger.info("Processed %d/%d - %.0f%% - ETA %s", i + 1, n, pct, util.to_hms_str(eta))
+    with journal.Journal(journal.journal_file("encodeauto", [inputpath])) as batch_journal:
+        files = batch_journal.batch(files, resume=kwargs["resume"])
+        durations = {vf.filename: vf.get_duration() or 0.0 for vf in media.probe_many(files, profile="duration-only")}
+
+        def encode(f: str, threads: int | None) -> None:
+            encode_file(f, before, after, force, duration=durations.get(os.path.abspath(f), 0.0), threads=threads, batch_journal=batch_journal)
+
+        jobs = [scheduler.Job(f, encode, duration=durations.get(os.path.abspath(f), 0.0)) for f in files]
+        scheduler.Scheduler(kwargs["jobs"]).run(jobs)
 
 
 if __name__ == "__main__":
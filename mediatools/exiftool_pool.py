@@ -0,0 +1,107 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""Process wide pool of long lived (-stay_open) exiftool processes, one per thread"""
+
+from __future__ import annotations
+
+import atexit
+import threading
+import concurrent.futures
+from collections.abc import Iterator
+from exiftool import ExifToolHelper
+from mediatools import log
+import mediatools.utilities as util
+
+DEFAULT_CHUNK_SIZE: int = 50
+DEFAULT_WORKERS: int = 4
+
+_LOCK = threading.Lock()
+_HELPERS: dict[threading.Thread, ExifToolHelper] = {}
+
+
+def get() -> ExifToolHelper:
+    """Returns the exiftool helper of the calling thread, starting the exiftool process if needed"""
+    thread = threading.current_thread()
+    with _LOCK:
+        et = _HELPERS.get(thread, None)
+        if et is None:
+            __close_dead_threads_helpers()
+            et = ExifToolHelper(executable=util.get_exiftool(), encoding="utf-8")
+            _HELPERS[thread] = et
+    if not et.running:
+        log.logger.debug("Starting exiftool process for thread %s", thread.name)
+        et.run()
+    return et
+
+
+def __close_dead_threads_helpers() -> None:
+    """Terminates exiftool processes whose owner thread has ended (e.g. after a thread pool shutdown)"""
+    for thread in [t for t in _HELPERS if not t.is_alive()]:
+        __terminate(_HELPERS.pop(thread))
+
+
+def __terminate(et: ExifToolHelper) -> None:
+    try:
+        if et.running:
+            et.terminate()
+    except Exception as e:
+        log.logger.debug("Error while terminating exiftool: %s", str(e))
+
+
+def close_all() -> None:
+    """Terminates all exiftool processes of the pool"""
+    with _LOCK:
+        for et in _HELPERS.values():
+            __terminate(et)
+        _HELPERS.clear()
+
+
+def read_tags(
+    files: list[str], tags: list[str] | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = DEFAULT_WORKERS
+) -> Iterator[tuple[str, dict]]:
+    """Reads tags of many files with one exiftool call per chunk of files, yields (file, tags) as soon as each chunk is read
+
+    :param tags: Tags to read (eg ["DateTimeOriginal", "Make"]), None reads all tags
+    """
+    chunks = [files[i : i + chunk_size] for i in range(0, len(files), chunk_size)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ExifRead") as executor:
+        futures = [executor.submit(__read_chunk, chunk, tags) for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
+
+
+def __read_chunk(files: list[str], tags: list[str] | None) -> list[tuple[str, dict]]:
+    try:
+        results = get().get_tags(files, tags=tags)
+        if len(results) == len(files):
+            return list(zip(files, results))
+        error = "no result returned"
+    except Exception as e:
+        error = str(e)
+    if len(files) == 1:
+        log.logger.warning("Could not read metadata of %s: %s", files[0], error)
+        return []
+    # Some file of the chunk failed, retry one by one to isolate it
+    log.logger.debug("Reading chunk of %d files failed, reading files one by one", len(files))
+    return [result for f in files for result in __read_chunk([f], tags)]
+
+
+atexit.register(close_all)
@@ -23,10 +23,9 @@ from __future__ import annotations
 
 import argparse
 from mediatools import log
-import mediatools.exceptions as ex
 import mediatools.utilities as util
 import utilities.file as fil
-import mediatools.creator as creator
+import mediatools.mediafile as media
 import mediatools.options as opt
 
 STD_FMT: str = "%-20s : %s"
@@ -142,9 +141,10 @@ def main() -> None:
     parser.add_argument("-t", "--types", required=False, default="", help="Types of files to include [audio,video,image]")
     parser.add_argument("-g", "--debug", required=False, default=0, help="Debug level")
     parser.add_argument("--dry_run", required=False, default=0, help="Dry run mode")
+    util.add_probe_cache_arg(parser)
     kwargs = util.parse_media_args(parser)
 
-    filelist = fil.file_list(*kwargs["inputfiles"])
+    filelist = fil.file_list(*kwargs["inputfiles"], recurse=True)
 
     all_props = list(set(VIDEO_PROPS + AUDIO_PROPS + IMAGE_PROPS))
 
@@ -157,11 +157,7 @@ def main() -> None:
                 print("%s," % "Duration HH:MM:SS.x", end="")
         print("")
 
-    for file in filelist:
-        try:
-            file_object = creator.file(file)
-        except ex.FileTypeError:
-            continue
+    for file_object in media.probe_many(filelist, ordered=True):
         specs = file_object.get_properties()
         log.logger.info("Specs = %s", str(specs))
         log.logger.debug("Specs = %s", util.json_fmt(specs))
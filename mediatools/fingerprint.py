@@ -0,0 +1,238 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""Acoustic fingerprints made of spectral peak pairs (landmarks), and their SQLite inverted index,
+to find the same recording encoded with different codecs or bitrates"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import subprocess
+import concurrent.futures
+from collections import Counter
+from mediatools import log
+import mediatools.utilities as util
+import mediatools.media_config as conf
+import utilities.file as fil
+
+SCHEMA_VERSION: int = 1
+INDEX_FILE_EXTENSION: str = "fingerprints.db"
+
+# Decoded audio window that is fingerprinted, and its decoding format
+DEFAULT_SECONDS: int = 30
+SAMPLE_RATE: int = 11025
+FFT_SIZE: int = 1024
+HOP_SIZE: int = 512
+# Frequency bins bands where peaks are searched, so that all parts of the spectrum get peaks
+BANDS: tuple[int, ...] = (2, 12, 24, 48, 96, 192, 512)
+# Number of frames before and after a peak where it must be the loudest of its band
+PEAK_NEIGHBORHOOD: int = 10
+# Number of peaks each peak is paired with, and max frames distance between them
+FAN_OUT: int = 5
+MAX_DELTA: int = 63
+# Min number of landmarks matching with the same time offset to consider 2 files are the same recording
+MIN_MATCHES: int = 20
+# Fingerprints are committed by batches of that many files, so that an interrupted update keeps the fingerprints already computed
+COMMIT_BATCH_SIZE: int = 100
+
+Landmarks = list[tuple[int, int]]
+
+
+def decode(filename: str, seconds: int = DEFAULT_SECONDS) -> object:
+    """Returns the first seconds of audio of a file, decoded as mono samples, as a numpy float array"""
+    import numpy as np
+
+    cmd = [util.get_ffmpeg(), "-v", "error", "-nostdin", "-i", filename, "-t", str(seconds)]
+    cmd += ["-map", "0:a:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"]
+    result = subprocess.run(cmd, capture_output=True, check=False)
+    if result.returncode != 0:
+        log.logger.error("Can't decode audio of %s: %s", filename, result.stderr.decode("utf-8", errors="replace").strip())
+        return np.zeros(0)
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32)
+
+
+def landmarks(samples: object) -> Landmarks:
+    """Returns the landmarks of decoded audio, as a list of (hash, frame) where hash encodes
+    the frequencies of 2 spectral peaks and their time distance, and frame is the time of the first peak"""
+    import numpy as np
+
+    if len(samples) < FFT_SIZE:
+        return []
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    spectrum = np.log1p(np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE), axis=1)))
+    peaks = []
+    for low, high in zip(BANDS[:-1], BANDS[1:]):
+        band = spectrum[:, low:high]
+        bins = band.argmax(axis=1)
+        levels = band.max(axis=1)
+        # Peaks are the loudest frames of the band in their neighborhood, louder than the band average
+        padded = np.pad(levels, PEAK_NEIGHBORHOOD, mode="constant")
+        local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * PEAK_NEIGHBORHOOD + 1).max(axis=1)
+        for t in np.flatnonzero((levels == local_max) & (levels > levels.mean())):
+            peaks.append((int(t), int(bins[t]) + low))
+    peaks.sort()
+    result = []
+    for i, (t1, f1) in enumerate(peaks):
+        for t2, f2 in peaks[i + 1 : i + 1 + FAN_OUT]:
+            if 0 < t2 - t1 <= MAX_DELTA:
+                result.append(((f1 << 16) | (f2 << 6) | (t2 - t1), t1))
+    return result
+
+
+def fingerprint(filename: str, seconds: int = DEFAULT_SECONDS) -> Landmarks:
+    """Returns the landmarks of the first seconds of audio of a file"""
+    return landmarks(decode(filename, seconds))
+
+
+def index_file(master_dir: str) -> str:
+    """Returns the default fingerprint index file of a directory"""
+    return f"{os.path.abspath(master_dir)}.{INDEX_FILE_EXTENSION}"
+
+
+class FingerprintIndex:
+    """Inverted index of landmarks to the files (and time in files) where they are found"""
+
+    def __init__(self, db_file: str) -> None:
+        self.db_file: str = db_file
+        self._db: sqlite3.Connection = sqlite3.connect(db_file)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            log.logger.info("Creating fingerprint index %s", db_file)
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS landmarks")
+                self._db.execute("DROP TABLE IF EXISTS files")
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, size INTEGER NOT NULL, "
+                "mtime_ns INTEGER NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS landmarks (hash INTEGER NOT NULL, file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE, "
+                "frame INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS landmarks_hash ON landmarks (hash)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS landmarks_file ON landmarks (file_id)")
+        self._db.execute("PRAGMA foreign_keys = ON")
+
+    def __enter__(self) -> FingerprintIndex:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self) -> None:
+        """Closes the index database"""
+        self._db.close()
+
+    def add(self, path: str, stat: os.stat_result, file_landmarks: Landmarks) -> None:
+        """Adds or replaces the landmarks of a file"""
+        with self._db:
+            self.__add(os.path.abspath(path), stat, file_landmarks)
+
+    def __add(self, path: str, stat: os.stat_result, file_landmarks: Landmarks) -> None:
+        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+        file_id = self._db.execute(
+            "INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)", (path, stat.st_size, stat.st_mtime_ns)
+        ).lastrowid
+        self._db.executemany("INSERT INTO landmarks (hash, file_id, frame) VALUES (?, ?, ?)", ((h, file_id, t) for h, t in file_landmarks))
+
+    def update(self, root_dir: str, seconds: int = DEFAULT_SECONDS, workers: int | None = None) -> dict[str, int]:
+        """Fingerprints audio files of a directory tree that are new or changed since the last update, and removes deleted files
+        Files that can't be fingerprinted are not indexed, so that they are retried by the next update
+
+        :return: Number of files added, updated, unchanged and removed
+        """
+        root_dir = os.path.abspath(root_dir)
+        prefix = os.path.join(root_dir, "")
+        known = {
+            row[0]: (row[1], row[2])
+            for row in self._db.execute("SELECT path, size, mtime_ns FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+        }
+        # Files indexed without landmarks by earlier versions are fingerprinted again
+        empty = {
+            row[0]
+            for row in self._db.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ? AND NOT EXISTS (SELECT 1 FROM landmarks WHERE file_id = files.id)",
+                (len(prefix), prefix),
+            )
+        }
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        seen, todo = set(), []
+        for f in fil.iter_files(root_dir, recurse=True, file_type=fil.FileType.AUDIO_FILE):
+            seen.add(f)
+            try:
+                stat = os.stat(f)
+            except OSError as e:
+                log.logger.warning("Can't access %s: %s", f, str(e))
+                continue
+            if known.get(f, None) == (stat.st_size, stat.st_mtime_ns) and f not in empty:
+                counts["unchanged"] += 1
+            else:
+                todo.append((f, stat))
+        if workers is None:
+            workers = int(conf.get_property(fil.HASH_WORKERS_KEY) or fil.DEFAULT_HASH_WORKERS)
+        log.logger.info("Fingerprinting %d files of %s", len(todo), root_dir)
+        with self._db, concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Fingerprint") as executor:
+            results = executor.map(fingerprint, [f for f, _ in todo], [seconds] * len(todo))
+            for (f, stat), file_landmarks in zip(todo, results):
+                if not file_landmarks:
+                    log.logger.warning("No fingerprint for %s, not indexed", f)
+                    self._db.execute("DELETE FROM files WHERE path = ?", (f,))
+                    continue
+                self.__add(f, stat, file_landmarks)
+                counts["updated" if f in known else "added"] += 1
+                if (counts["added"] + counts["updated"]) % COMMIT_BATCH_SIZE == 0:
+                    self._db.commit()
+                    log.logger.info("%d files fingerprinted in %s", counts["added"] + counts["updated"], root_dir)
+            removed = [(f,) for f in known if f not in seen]
+            self._db.executemany("DELETE FROM files WHERE path = ?", removed)
+            counts["removed"] = len(removed)
+        log.logger.info("Fingerprint index of %s updated: %s", root_dir, str(counts))
+        return counts
+
+    def match(self, file_landmarks: Landmarks, min_matches: int = MIN_MATCHES) -> list[tuple[str, int]]:
+        """Returns the indexed files matching landmarks, with their score (number of landmarks matching
+        with the same time offset), best matches first"""
+        frames_by_hash: dict[int, list[int]] = {}
+        for h, t in file_landmarks:
+            frames_by_hash.setdefault(h, []).append(t)
+        offsets: Counter = Counter()
+        hashes = list(frames_by_hash)
+        # Stay below the SQLite max number of query parameters
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i : i + 500]
+            rows = self._db.execute(f"SELECT hash, file_id, frame FROM landmarks WHERE hash IN ({','.join('?' * len(chunk))})", chunk)
+            for h, file_id, frame in rows:
+                for t in frames_by_hash[h]:
+                    offsets[(file_id, frame - t)] += 1
+        scores: dict[int, int] = {}
+        for (file_id, _), count in offsets.items():
+            scores[file_id] = max(scores.get(file_id, 0), count)
+        matches = []
+        for file_id, score in sorted(scores.items(), key=lambda x: -x[1]):
+            if score < min_matches:
+                break
+            matches.append((self._db.execute("SELECT path FROM files WHERE id = ?", (file_id,)).fetchone()[0], score))
+        return matches
@@ -0,0 +1,209 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""SQLite index of file hashes, with per file size and mtime to only rehash files that changed"""
+
+from __future__ import annotations
+
+import os
+import json
+import sqlite3
+from datetime import datetime
+from collections.abc import Callable
+from mediatools import log
+import utilities.file as fil
+
+SCHEMA_VERSION: int = 1
+INDEX_FILE_EXTENSION: str = "hashes.db"
+DEFAULT_ALGO: str = "audio"
+# Hashes are committed by batches of that many files, so that an interrupted update keeps the hashes already computed
+COMMIT_BATCH_SIZE: int = 100
+
+
+def index_file(master_dir: str) -> str:
+    """Returns the default hash index file of a directory"""
+    return f"{os.path.abspath(master_dir)}.{INDEX_FILE_EXTENSION}"
+
+
+class HashIndex:
+    """Index of the hashes of files, for one or several hash algorithms"""
+
+    def __init__(self, db_file: str) -> None:
+        self.db_file: str = db_file
+        self._db: sqlite3.Connection = sqlite3.connect(db_file)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            log.logger.info("Creating hash index %s", db_file)
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS hashes")
+                self._db.execute("DROP TABLE IF EXISTS files")
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE, "
+                "algo TEXT NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (path, algo))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS hashes_lookup ON hashes (algo, hash)")
+        self._db.execute("PRAGMA foreign_keys = ON")
+
+    def __enter__(self) -> HashIndex:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def count(self, algo: str = DEFAULT_ALGO) -> int:
+        """Returns the number of files with a hash of a given algorithm"""
+        return self._db.execute("SELECT COUNT(*) FROM hashes WHERE algo = ?", (algo,)).fetchone()[0]
+
+    def files(self, root_dir: str) -> list[str]:
+        """Returns the indexed files of a directory tree"""
+        prefix = os.path.join(os.path.abspath(root_dir), "")
+        rows = self._db.execute("SELECT path FROM files WHERE substr(path, 1, ?) = ? ORDER BY path", (len(prefix), prefix))
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        """Closes the index database"""
+        self._db.close()
+
+    def get(self, path: str, stat: os.stat_result, algo: str = DEFAULT_ALGO) -> str | None:
+        """Returns the indexed hash of a file, or None if not indexed or if the file changed since"""
+        row = self._db.execute(
+            "SELECT h.hash FROM files f JOIN hashes h ON h.path = f.path WHERE f.path = ? AND h.algo = ? AND f.size = ? AND f.mtime_ns = ?",
+            (os.path.abspath(path), algo, stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, path: str, stat: os.stat_result, file_hash: str, algo: str = DEFAULT_ALGO) -> None:
+        """Stores the hash of a file, hashes of other algorithms are dropped if the file changed"""
+        with self._db:
+            self.__put(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, file_hash, algo)
+
+    def __put(self, path: str, size: int, mtime_ns: int, file_hash: str, algo: str) -> None:
+        row = self._db.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (path,)).fetchone()
+        if row != (size, mtime_ns):
+            # Deletes hashes of the previous version of the file
+            self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._db.execute("INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)", (path, size, mtime_ns))
+        self._db.execute("INSERT OR REPLACE INTO hashes (path, algo, hash) VALUES (?, ?, ?)", (path, algo, file_hash))
+
+    def lookup(self, file_hash: str, algo: str = DEFAULT_ALGO) -> list[str]:
+        """Returns the files with a given hash"""
+        rows = self._db.execute("SELECT path FROM hashes WHERE algo = ? AND hash = ? ORDER BY path", (algo, file_hash))
+        return [row[0] for row in rows]
+
+    def update(
+        self, root_dir: str, hash_func: Callable[[str], str | None], algo: str = DEFAULT_ALGO, file_type: str | None = fil.FileType.AUDIO_FILE
+    ) -> dict[str, int]:
+        """Hashes files of a directory tree that are new or changed since the last update, and removes deleted files
+
+        :param hash_func: Function returning the hash of a file, or None if the file can't be hashed
+        :return: Number of files added, updated, unchanged and removed
+        """
+        root_dir = os.path.abspath(root_dir)
+        prefix = os.path.join(root_dir, "")
+        known = {
+            row[0]: (row[1], row[2])
+            for row in self._db.execute(
+                "SELECT f.path, f.size, f.mtime_ns FROM files f JOIN hashes h ON h.path = f.path WHERE h.algo = ? AND substr(f.path, 1, ?) = ?",
+                (algo, len(prefix), prefix),
+            )
+        }
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        seen = set()
+        with self._db:
+            for f in fil.iter_files(root_dir, recurse=True, file_type=file_type):
+                seen.add(f)
+                try:
+                    stat = os.stat(f)
+                except OSError as e:
+                    log.logger.warning("Can't access %s: %s", f, str(e))
+                    continue
+                if known.get(f, None) == (stat.st_size, stat.st_mtime_ns):
+                    counts["unchanged"] += 1
+                    continue
+                file_hash = hash_func(f)
+                if file_hash is None:
+                    continue
+                self.__put(f, stat.st_size, stat.st_mtime_ns, file_hash, algo)
+                counts["updated" if f in known else "added"] += 1
+                if (counts["added"] + counts["updated"]) % COMMIT_BATCH_SIZE == 0:
+                    self._db.commit()
+                    log.logger.info("%d files hashed in %s", counts["added"] + counts["updated"], root_dir)
+            removed = [(f,) for f in known if f not in seen]
+            self._db.executemany("DELETE FROM files WHERE path = ?", removed)
+            counts["removed"] = len(removed)
+        log.logger.info("Hash index of %s updated: %s", root_dir, str(counts))
+        return counts
+
+    def apply(self, files: list[str], removed: list[str], hash_func: Callable[[str], str | None], algo: str = DEFAULT_ALGO) -> dict[str, int]:
+        """Hashes files that are not indexed or changed since indexed, and removes removed files,
+        typically from the change set of a directory manifest scan
+
+        :return: Number of files hashed, unchanged and removed
+        """
+        counts = {"hashed": 0, "unchanged": 0, "removed": len(removed)}
+        with self._db:
+            for f in files:
+                try:
+                    stat = os.stat(f)
+                except OSError as e:
+                    log.logger.warning("Can't access %s: %s", f, str(e))
+                    continue
+                if self.get(f, stat, algo) is not None:
+                    counts["unchanged"] += 1
+                    continue
+                file_hash = hash_func(f)
+                if file_hash is not None:
+                    self.__put(os.path.abspath(f), stat.st_size, stat.st_mtime_ns, file_hash, algo)
+                    counts["hashed"] += 1
+                    if counts["hashed"] % COMMIT_BATCH_SIZE == 0:
+                        self._db.commit()
+            self._db.executemany("DELETE FROM files WHERE path = ?", [(os.path.abspath(f),) for f in removed])
+        log.logger.info("Hash index updated: %s", str(counts))
+        return counts
+
+    def import_json(self, json_file: str, algo: str = DEFAULT_ALGO) -> int:
+        """Imports a JSON hash list as saved by audiofile.save_hash_list(), returns the number of files imported
+
+        Files modified after the JSON file date are imported as stale, so that the next update rehashes them
+        """
+        with open(json_file, "r", encoding="utf-8") as fh:
+            data = json.loads(fh.read())
+        last_date = datetime.strptime(data.get("datetime", "1970-01-01 00:00:00"), "%Y-%m-%d %H:%M:%S").timestamp()
+        files = data.get("files", {})
+        if not files:
+            files = {f: h for h, hash_files in data.get("hashes", {}).items() for f in hash_files}
+        nb_files = 0
+        with self._db:
+            for f, file_hash in files.items():
+                try:
+                    stat = os.stat(f)
+                except OSError:
+                    continue
+                mtime_ns = stat.st_mtime_ns if stat.st_mtime <= last_date else 0
+                self.__put(os.path.abspath(f), stat.st_size, mtime_ns, file_hash, algo)
+                nb_files += 1
+        log.logger.info("Imported %d files hashes from %s", nb_files, json_file)
+        return nb_files
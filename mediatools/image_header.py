@@ -0,0 +1,137 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""Reads image dimensions and EXIF orientation from JPEG, PNG and GIF headers, without decoding the image"""
+
+from __future__ import annotations
+
+import struct
+from typing import BinaryIO
+from mediatools import log
+
+PNG_SIGNATURE: bytes = b"\x89PNG\r\n\x1a\n"
+GIF_SIGNATURES: tuple[bytes, ...] = (b"GIF87a", b"GIF89a")
+EXIF_HEADER: bytes = b"Exif\x00\x00"
+EXIF_ORIENTATION_TAG: int = 0x0112
+# EXIF orientations where the image must be rotated by 90° to be displayed
+PORTRAIT_ORIENTATIONS: tuple[int, ...] = (6, 8)
+
+# ffprobe format names of the image codecs
+FORMAT_NAMES: dict[str, str] = {"mjpeg": "image2", "png": "png_pipe", "gif": "gif"}
+
+# JPEG Start Of Frame markers (all except DHT C4, JPG C8 and DAC CC)
+_JPEG_SOF_MARKERS: frozenset[int] = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+_JPEG_SOS_MARKER: int = 0xDA
+_JPEG_APP1_MARKER: int = 0xE1
+# Markers without a length field
+_JPEG_STANDALONE_MARKERS: frozenset[int] = frozenset([0x01, 0xD8] + list(range(0xD0, 0xD8)))
+
+
+def read(filename: str) -> dict | None:
+    """Returns the codec, width, height and EXIF orientation (None if unknown) of an image,
+    or None if the image format is not handled or the header can't be parsed"""
+    try:
+        with open(filename, "rb") as fd:
+            start = fd.read(10)
+            if start[:2] == b"\xff\xd8":
+                return _read_jpeg(fd)
+            if start[:8] == PNG_SIGNATURE:
+                return _read_png(fd)
+            if start[:6] in GIF_SIGNATURES:
+                width, height = struct.unpack("<HH", start[6:10])
+                return {"codec": "gif", "width": width, "height": height, "orientation": 1}
+    except (OSError, struct.error, ValueError) as e:
+        log.logger.debug("Can't read image header of %s: %s", filename, str(e))
+    return None
+
+
+def probe(filename: str) -> dict | None:
+    """Returns ffprobe like specs of an image built from its header, or None if the header can't be read"""
+    header = read(filename)
+    if header is None:
+        return None
+    stream = {"index": 0, "codec_type": "video", "codec_name": header["codec"], "width": header["width"], "height": header["height"]}
+    if header["orientation"] is not None:
+        stream["orientation"] = header["orientation"]
+    return {"format": {"filename": filename, "nb_streams": 1, "format_name": FORMAT_NAMES[header["codec"]]}, "streams": [stream]}
+
+
+def is_portrait(orientation: int | None) -> bool:
+    """Returns whether an EXIF orientation means the image is displayed rotated by 90°"""
+    return orientation in PORTRAIT_ORIENTATIONS
+
+
+def _read_png(fd: BinaryIO) -> dict | None:
+    fd.seek(8)
+    length, chunk_type = struct.unpack(">I4s", fd.read(8))
+    if chunk_type != b"IHDR" or length < 8:
+        return None
+    width, height = struct.unpack(">II", fd.read(8))
+    return {"codec": "png", "width": width, "height": height, "orientation": None}
+
+
+def _read_jpeg(fd: BinaryIO) -> dict | None:
+    """Walks JPEG segments up to the first Start Of Frame, skipping segments data"""
+    fd.seek(2)
+    orientation = 1
+    while True:
+        byte = fd.read(1)
+        if byte == b"":
+            return None
+        if byte != b"\xff":
+            continue
+        marker = fd.read(1)
+        while marker == b"\xff":
+            marker = fd.read(1)
+        if marker == b"":
+            return None
+        marker_id = marker[0]
+        if marker_id in _JPEG_STANDALONE_MARKERS or marker_id == 0x00:
+            continue
+        if marker_id == _JPEG_SOS_MARKER:
+            return None
+        (length,) = struct.unpack(">H", fd.read(2))
+        if marker_id in _JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", fd.read(5))
+            return {"codec": "mjpeg", "width": width, "height": height, "orientation": orientation}
+        if marker_id == _JPEG_APP1_MARKER:
+            segment = fd.read(length - 2)
+            if segment.startswith(EXIF_HEADER):
+                orientation = _exif_orientation(segment[len(EXIF_HEADER) :]) or orientation
+            continue
+        fd.seek(length - 2, 1)
+
+
+def _exif_orientation(tiff: bytes) -> int | None:
+    """Returns the Orientation tag of the IFD0 of a TIFF (EXIF) block"""
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        return None
+    (ifd_offset,) = struct.unpack(endian + "I", tiff[4:8])
+    (nb_entries,) = struct.unpack(endian + "H", tiff[ifd_offset : ifd_offset + 2])
+    for i in range(nb_entries):
+        entry = ifd_offset + 2 + i * 12
+        tag, _, _, value = struct.unpack(endian + "HHIH", tiff[entry : entry + 10])
+        if tag == EXIF_ORIENTATION_TAG:
+            return value
+    return None
@@ -31,6 +31,7 @@ import exifread
 from mediatools import log
 import utilities.file as fil
 from mediatools import resolution as res, exceptions as ex, media_config as conf, mediafile as media, utilities as util
+from mediatools import image_header
 from filters import filters
 
 INPUT_FILE_FMT: str = ' -i "%s"'
@@ -46,22 +47,23 @@ class ImageFile(media.MediaFile):
 
     SUPPORTED_IMG_CODECS: tuple[str, ...] = ("mjpeg", "png", "gif")
 
+    resolution = media.LazySpec()
+    dar = media.LazySpec()
+    width = media.LazySpec()
+    height = media.LazySpec()
+    pixels = media.LazySpec()
+    ratio = media.LazySpec()
+    orientation = media.LazySpec(default="landscape")
+
     def __init__(self, filename: str) -> None:
         if not fil.is_image_file(filename):
             raise ex.FileTypeError(file=filename, expected_type="image")
-        self.resolution: res.Resolution | None = None
-        self.dar: str | None = None
-        self.width: int | None = None
-        self.height: int | None = None
-        self.pixels: int | None = None
-        self.ratio: float | None = None
-        self.orientation: str = "landscape"
         super().__init__(filename)
-        self.probe()
 
     def __str__(self) -> str:
+        resolution = str(self.resolution)
         d = vars(self).copy()
-        d["resolution"] = str(self.resolution)
+        d["resolution"] = resolution
         return str(d)
 
     def get_properties(self) -> dict:
@@ -72,24 +74,37 @@ class ImageFile(media.MediaFile):
         log.logger.debug("Returning image props %s", str(all_props))
         return all_props
 
-    def probe(self, force: bool = False) -> None:
-        if self.specs is not None:
+    def probe(self, force: bool = False, profile: str | None = None) -> None:
+        """Reads image specs, the probe profile is ignored since images specs are all read at once"""
+        if self.specs is not None and not force:
             return
-        super().probe(force=force)
+        self._specs_loaded = True
+        # Dimensions and orientation are read from the image header, ffprobe is only a fallback
+        self.stat(force)
+        self.specs = image_header.probe(self.filename)
+        if self.specs is None:
+            super().probe(force=force)
+        else:
+            self.get_file_specs()
         stream = self.__get_stream_by_codec__("codec_name", ImageFile.SUPPORTED_IMG_CODECS)
         self.format = stream["codec_name"]
         self.width = int(util.find_key(stream, ("width", "codec_width", "coded_width")))
         self.height = int(util.find_key(stream, ("height", "codec_height", "coded_height")))
-        self.dar = util.find_key(stream, ["display_aspect_ratio"])
+        self.dar = stream.get("display_aspect_ratio", None)
         self.resolution = res.Resolution(width=self.width, height=self.height)
         self.pixels = self.width * self.height
         self.ratio = self.width / self.height
-        self.exif_read()
+        self.orientation = "landscape"
+        if "orientation" in stream:
+            if image_header.is_portrait(stream["orientation"]):
+                self.orientation = "portrait"
+        else:
+            self.exif_read()
         log.logger.debug("Image = %s", str(vars(self)))
 
     def exif_read(self) -> dict:
-        f = open(self.filename, "rb")
-        tags = exifread.process_file(f)
+        with open(self.filename, "rb") as f:
+            tags = exifread.process_file(f, details=False)
         if re.search("Rotated 90", str(tags.get("Image Orientation", ""))):
             self.orientation = "portrait"
             log.logger.debug("Portrait orientation: %s", str(self.orientation))
@@ -499,7 +514,7 @@ def posterize(*file_list: str, out_file: str | None = None, **kwargs) -> str:
     - stretch: stretch images to be all the same width and height
     """
     log.logger.debug("posterize(%s, %s)", str(file_list), str(kwargs))
-    files = [ImageFile(f) for f in fil.file_list(*file_list, file_type=fil.FileType.IMAGE_FILE)]
+    files = [ImageFile(f) for f in fil.file_list(*file_list, file_type=fil.FileType.IMAGE_FILE, recurse=True)]
     fcomplex = filters.Complex(*files)
 
     max_w = max([f.width for f in files])
@@ -554,7 +569,7 @@ def posterize(*file_list: str, out_file: str | None = None, **kwargs) -> str:
 def stack(*files: str, out_file: str | None = None, **kwargs) -> str:
     log.logger.debug("stack(%s, %s)", str(files), str(kwargs))
     out_file = util.automatic_output_file_name(out_file, files[0], "stack")
-    files_to_stack = fil.file_list(*files, file_type=fil.FileType.IMAGE_FILE)
+    files_to_stack = fil.file_list(*files, file_type=fil.FileType.IMAGE_FILE, recurse=True)
     rows, cols = 1, 1
     if kwargs["direction"] == "vertical":
         rows = len(files_to_stack)
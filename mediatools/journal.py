@@ -0,0 +1,186 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""SQLite journal of the files of a batch, so that an interrupted batch can be resumed
+
+Each input file is planned, then running, then written, then done (or failed). A running file records
+the temporary file being written, its final output and, when the output replaces the input, where the
+input is moved (its backup). Once the temporary output is complete, including its metadata such as its creation
+date, the file is written: the input is then moved to its backup and the temporary output renamed to the output.
+When resuming, a file interrupted while running is undone, and a file interrupted while written is completed,
+which only needs renaming files
+"""
+
+from __future__ import annotations
+
+import os
+import hashlib
+import sqlite3
+import argparse
+import threading
+from mediatools import log
+
+SCHEMA_VERSION: int = 1
+
+PLANNED: str = "planned"
+RUNNING: str = "running"
+WRITTEN: str = "written"
+DONE: str = "done"
+FAILED: str = "failed"
+
+
+def journal_file(name: str, inputs: list[str]) -> str:
+    """Returns the journal file of a batch of a tool on given inputs, in the cache directory"""
+    import mediatools.media_config as conf
+
+    journal_dir = os.path.join(conf.get_cache_dir(), "journals")
+    os.makedirs(journal_dir, exist_ok=True)
+    batch_id = hashlib.sha1("\n".join(sorted(os.path.abspath(f) for f in inputs)).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(journal_dir, f"{name}-{batch_id}.db")
+
+
+def temp_output(filename: str) -> str:
+    """Returns the temporary file to write an output to, before renaming it to its final name once complete"""
+    base, ext = os.path.splitext(filename)
+    return f"{base}.tmp{ext}"
+
+
+def add_resume_arg(parser: argparse.ArgumentParser) -> None:
+    """Adds the option to resume an interrupted batch"""
+    parser.add_argument(
+        "--resume",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Resume the previous batch on the same inputs, skipping files already done",
+    )
+
+
+class Journal:
+    """Journal of the state of each input file of a batch"""
+
+    def __init__(self, db_file: str) -> None:
+        self.db_file: str = db_file
+        self._lock = threading.Lock()
+        # Jobs of a batch may run in several threads
+        self._db: sqlite3.Connection = sqlite3.connect(db_file, check_same_thread=False)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS jobs")
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (seq INTEGER PRIMARY KEY, input TEXT UNIQUE NOT NULL, state TEXT NOT NULL, "
+                "output TEXT, tmp_output TEXT, backup TEXT, error TEXT)"
+            )
+
+    def __enter__(self) -> Journal:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the journal"""
+        self._db.close()
+
+    def plan(self, files: list[str]) -> None:
+        """Starts a new batch of files, forgetting the previous batch"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM jobs")
+            self._db.executemany("INSERT OR IGNORE INTO jobs (input, state) VALUES (?, ?)", [(f, PLANNED) for f in files])
+
+    def batch(self, files: list[str], resume: bool = False) -> list[str]:
+        """Returns the files to process: the files of the previous batch not done yet when resuming, the files of a new batch otherwise"""
+        if resume and self.files():
+            return self.resume()
+        self.plan(files)
+        return files
+
+    def state(self, filename: str) -> str | None:
+        """Returns the state of a file of the batch, None if not in the batch"""
+        with self._lock:
+            row = self._db.execute("SELECT state FROM jobs WHERE input = ?", (filename,)).fetchone()
+        return None if row is None else row[0]
+
+    def files(self, state: str | None = None) -> list[str]:
+        """Returns the files of the batch, in planned order, optionally only those in a given state"""
+        with self._lock:
+            if state is None:
+                rows = self._db.execute("SELECT input FROM jobs ORDER BY seq")
+            else:
+                rows = self._db.execute("SELECT input FROM jobs WHERE state = ? ORDER BY seq", (state,))
+            return [row[0] for row in rows]
+
+    def start(self, filename: str, output: str, tmp_output: str, backup: str | None = None) -> None:
+        """Records that a file is being processed
+
+        :param output: Final output file
+        :param tmp_output: Temporary file written, renamed to output once complete
+        :param backup: Where the input file is moved, when the output replaces the input
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, output = ?, tmp_output = ?, backup = ?, error = NULL WHERE input = ?",
+                (RUNNING, output, tmp_output, backup, filename),
+            )
+
+    def written(self, filename: str) -> None:
+        """Records that the temporary output of a file is complete, before it is renamed to the output"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET state = ? WHERE input = ?", (WRITTEN, filename))
+
+    def done(self, filename: str, output: str | None = None) -> None:
+        """Records that a file was successfully processed"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET state = ?, output = COALESCE(?, output), error = NULL WHERE input = ?", (DONE, output, filename))
+
+    def failed(self, filename: str, error: Exception | str) -> None:
+        """Records that a file could not be processed"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET state = ?, error = ? WHERE input = ?", (FAILED, str(error), filename))
+
+    def resume(self) -> list[str]:
+        """Recovers files interrupted while processed and returns the files of the batch that are not done yet"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT input, state, output, tmp_output, backup FROM jobs WHERE state IN (?, ?)", (RUNNING, WRITTEN)
+            ).fetchall()
+        for filename, state, output, tmp_output, backup in rows:
+            if state == WRITTEN:
+                log.logger.info("Completing interrupted processing of %s", filename)
+                if os.path.exists(tmp_output):
+                    if backup and os.path.exists(filename):
+                        os.replace(filename, backup)
+                    os.replace(tmp_output, output)
+                self.done(filename)
+                continue
+            if tmp_output and os.path.exists(tmp_output):
+                log.logger.info("Removing partial output %s of interrupted %s", tmp_output, filename)
+                os.remove(tmp_output)
+            if backup and not os.path.exists(filename) and os.path.exists(backup):
+                log.logger.info("Restoring %s from %s", filename, backup)
+                os.replace(backup, filename)
+            with self._lock, self._db:
+                self._db.execute("UPDATE jobs SET state = ? WHERE input = ?", (PLANNED, filename))
+        done = set(self.files(DONE))
+        todo = [f for f in self.files() if f not in done]
+        log.logger.info("Resuming batch: %d file(s) done, %d to process", len(done), len(todo))
+        return todo
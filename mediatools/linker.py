@@ -27,29 +27,47 @@ from mediatools import log
 import mediatools.utilities as util
 import utilities.file as fil
 import mediatools.audiofile as audio
+import mediatools.hash_index as hash_index
+import mediatools.fingerprint as fingerprint
 import mediatools.exceptions as exc
 
 
-def link_file(file, directory, hash_data):
-    hashes = hash_data["hashes"]
+def link_file(file, directory, index, algo="audio"):
     if fil.is_link(file) or not fil.is_audio_file(file):
         return None
-    h = audio.AudioFile(file).hash("audio")
+    h = audio.AudioFile(file).hash(algo)
     if h is None:
         log.logger.warning("Can't hash %s", file)
         return None
     log.logger.debug("Hash for %s is %s", file, h)
-    if h not in hashes.keys():
+    masters = index.lookup(h, algo)
+    if not masters:
         log.logger.warning("Can't find master file for %s", file)
         return None
-    srcfile = audio.AudioFile(hashes[h][0])
+    return __link_master(masters[0], directory)
+
+
+def fuzzy_link_file(file, directory, index):
+    """Links a collection file to the master file of the same recording, even if encoded differently"""
+    if fil.is_link(file) or not fil.is_audio_file(file):
+        return None
+    matches = index.match(fingerprint.fingerprint(file))
+    if not matches:
+        log.logger.warning("Can't find master file for %s", file)
+        return None
+    log.logger.debug("Best match for %s is %s with score %d", file, matches[0][0], matches[0][1])
+    return __link_master(matches[0][0], directory)
+
+
+def __link_master(master, directory):
+    srcfile = audio.AudioFile(master)
     srcfile.get_tags()
     base = "{}{}{} - {}".format(directory, os.sep, srcfile.title, srcfile.artist)
     srcfile.create_link(base)
     return directory + os.sep + base
 
 
-def copy_file(file, directory, hash_data):
+def copy_file(file, directory, index):
     if not fil.is_link(file):
         return None
     shortcut = fil.File(file)
@@ -77,35 +95,67 @@ def main():
         "-c", "--copyFiles", action="store_true", default=False, help="ask to copy files linked from master directory", required=False
     )
     parser.add_argument("-a", "--all", action="store_true", default=False, help="Do everything", required=False)
+    parser.add_argument(
+        "--algo",
+        required=False,
+        default="audio",
+        help="Hash to match files: audio (tags and specs), pcm (decoded audio) or pcm:<seconds> (first seconds of decoded audio)",
+    )
+    parser.add_argument(
+        "--fuzzy",
+        action="store_true",
+        default=False,
+        help="Match files by acoustic fingerprint, to find the same recording with another codec or bitrate",
+        required=False,
+    )
     parser.add_argument("-g", "--debug", required=False, type=int, help="Debug level")
     kwargs = util.parse_media_args(parser)
 
     master_dir = kwargs["master"]
     directory = kwargs["directory"]
-    hash_file = f"{master_dir}.json"
+    algo = kwargs["algo"]
 
-    if not os.path.exists(hash_file) or kwargs["updateHash"]:
-        log.logger.info("Rebuilding file hash")
-        hashes = audio.update_hash_list(master_dir)
-        if kwargs["updateHash"]:
-            sys.exit(0)
+    if kwargs["fuzzy"]:
+        index = fingerprint.FingerprintIndex(fingerprint.index_file(master_dir))
+        if len(index) == 0 or kwargs["updateHash"]:
+            log.logger.info("Updating fingerprints")
+            index.update(master_dir)
+        log.logger.info("%d files in fingerprint index", len(index))
     else:
-        log.logger.info("Reading existing hash")
-        hashes = audio.read_hash_list(hash_file)
-    log.logger.info("%d files in hash", len(hashes["hashes"]))
-    collection = fil.dir_list(directory, recurse=False)
+        index_file = hash_index.index_file(master_dir)
+        index = hash_index.HashIndex(index_file) if os.path.exists(index_file) else None
+        if index is None or index.count(algo) == 0 or kwargs["updateHash"]:
+            log.logger.info("Updating file hash")
+            if index is not None:
+                index.close()
+            index = audio.update_hash_list(master_dir, index_file, algo=algo)
+        else:
+            log.logger.info("Reading existing hash")
+        log.logger.info("%d files in hash", index.count(algo))
+    if kwargs["updateHash"]:
+        index.close()
+        sys.exit(0)
+
+    def link(file):
+        if kwargs["fuzzy"]:
+            return fuzzy_link_file(file, directory, index)
+        return link_file(file, directory, index, algo)
+
+    # Snapshot the listing since links and copies are created in the same directory
+    collection = list(fil.iter_files(directory, recurse=True))
 
     if kwargs["linkFiles"]:
         for file in collection:
-            link_file(file, directory, hashes)
+            link(file)
     elif kwargs["copyFiles"]:
         for file in collection:
-            copy_file(file, directory, hashes)
+            copy_file(file, directory, index)
     elif kwargs["all"]:
         for file in collection:
-            link_file(file, directory, hashes)
-            copy_file(file, directory, hashes)
+            link(file)
+            copy_file(file, directory, index)
 
+    index.close()
     sys.exit(0)
 
 
@@ -28,6 +28,8 @@ CONFIG_FILE: str = ".mediatools.properties"
 VIDEO_RESOLUTION_KEY: str = "default.video.resolution"
 VIDEO_FPS_KEY: str = "default.video.fps"
 SLIDESHOW_DURATION_KEY: str = "default.slideshow.duration"
+CACHE_DIR_KEY: str = "cache.directory"
+DEFAULT_CACHE_DIR: str = ".mediatools"
 
 
 def load() -> dict:
@@ -78,3 +80,12 @@ def get_property(name: str, settings: dict | None = None):
         global CONFIG_SETTINGS
         settings = CONFIG_SETTINGS
     return settings.get(name, None)
+
+
+def get_cache_dir() -> str:
+    """Returns the directory where persistent caches are stored, creating it if needed"""
+    cache_dir = get_property(CACHE_DIR_KEY)
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser("~"), DEFAULT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
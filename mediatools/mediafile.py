@@ -21,9 +21,13 @@
 
 from __future__ import annotations
 
+import os
 from datetime import datetime
 import re
-from exiftool import ExifToolHelper
+import json
+import subprocess
+import concurrent.futures
+from collections.abc import Iterator
 import ffmpeg
 from mediatools import log
 import utilities.file as fil
@@ -32,6 +36,9 @@ import mediatools.utilities as util
 import filters.filters as filters
 import mediatools.options as opt
 import mediatools.media_config as conf
+import mediatools.probe_cache as probe_cache
+import mediatools.scheduler as scheduler
+import mediatools.exiftool_pool as exiftool_pool
 
 EXIF_LONGITUDE_TAG: str = "EXIF:GPSLongitude"
 EXIF_LONG_REF_TAG: str = "EXIF:GPSLongitudeRef"
@@ -44,6 +51,68 @@ TIME_FMT: str = "%H:%M:%S"
 DATE_FORMATS: tuple[str, ...] = (ISO_DATE_FMT, f"{ISO_DATE_FMT}%z", EXIF_DATE_FMT, f"{EXIF_DATE_FMT}%z")
 CREATION_DATE_TAGS: tuple[str, ...] = ("QuickTime:CreateDate", "EXIF:DateTimeOriginal", "File:FileModifyDate")
 
+FULL_PROBE: str = probe_cache.FULL_PROBE
+_FORMAT_ENTRIES: str = "format=duration,format_name,format_long_name,nb_streams,bit_rate"
+# ffprobe options of each probe profile, probe sizes are in bytes and analyze durations in microseconds
+PROBE_PROFILES: dict[str, list[str]] = {
+    "duration-only": ["-probesize", "1000000", "-analyzeduration", "1000000", "-show_entries", _FORMAT_ENTRIES],
+    "video-basics": [
+        "-probesize",
+        "2000000",
+        "-analyzeduration",
+        "2000000",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        f"{_FORMAT_ENTRIES}:stream=index,codec_type,codec_name,width,height,coded_width,coded_height,avg_frame_rate,r_frame_rate,"
+        "bit_rate,duration,display_aspect_ratio,sample_aspect_ratio,pix_fmt",
+    ],
+    "audio-tags": [
+        "-probesize",
+        "1000000",
+        "-analyzeduration",
+        "1000000",
+        "-show_entries",
+        f"{_FORMAT_ENTRIES}:format_tags:stream=index,codec_type,codec_name,bit_rate,duration,sample_rate,channels,coded_width,coded_height",
+    ],
+    FULL_PROBE: ["-show_format", "-show_streams"],
+}
+
+PROBE_WORKERS_KEY: str = "probe.workers"
+DEFAULT_PROBE_WORKERS: int = 8
+
+
+def ffprobe(filename: str, profile: str = FULL_PROBE) -> dict:
+    """Runs ffprobe on a file with the options of a probe profile, returns the JSON output as dict"""
+    cmd = [util.get_ffprobe(), "-v", "error", "-of", "json", *PROBE_PROFILES[profile], filename]
+    log.logger.debug("Running %s", " ".join(cmd))
+    result = subprocess.run(cmd, capture_output=True, check=False)
+    if result.returncode != 0:
+        raise ffmpeg.Error(util.get_ffprobe(), result.stdout, result.stderr)
+    specs = json.loads(result.stdout.decode("utf-8"))
+    specs.setdefault("format", {})
+    specs.setdefault("streams", [])
+    return specs
+
+
+class LazySpec:
+    """Media attribute decoded from the file specs.
+    The file is probed on the first read of any such attribute that was not set yet"""
+
+    def __init__(self, default=None) -> None:
+        self.default = default
+        self.name: str | None = None
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        # Non data descriptor: Only called while the attribute is not in the instance dict
+        obj._load_specs()
+        return obj.__dict__.get(self.name, self.default)
+
 
 class MediaFile(fil.File):
     """Media file abstraction
@@ -52,6 +121,14 @@ class MediaFile(fil.File):
     - An audio file
     - An image file"""
 
+    format = LazySpec()
+    format_long = LazySpec()
+    nb_streams = LazySpec()
+    bitrate = LazySpec()
+    duration = LazySpec()
+
+    PROBE_PROFILE: str = FULL_PROBE
+
     def __init__(self, filename: str) -> None:
         if not fil.is_media_file(filename):
             raise ex.FileTypeError(file=filename)
@@ -60,15 +137,11 @@ class MediaFile(fil.File):
         self.specs: dict | None = None
         self.author: str | None = None
         self.copyright: str | None = None
-        self.format: str | None = None
-        self.duration: float | None = None
-        self.format_long: str | None = None
-        self.nb_streams: int | None = None
         self.title: str | None = None
-        self.bitrate: int | None = None
         self.comment: str | None = None
         self._exif_data: dict | None = None
-        # self.probe()
+        self._specs_loaded: bool = False
+        self._probe_profile: str | None = None
 
     def __str__(self) -> str:
         return self.filename
@@ -76,18 +149,35 @@ class MediaFile(fil.File):
     def __format__(self, format_spec: str) -> str:
         return self.filename
 
-    def probe(self, force: bool = False) -> dict:
-        """Returns media file general specs"""
+    def _load_specs(self) -> None:
+        """Probes the file and decodes its specs, once, when a lazy attribute is first read"""
+        if self.__dict__.get("_specs_loaded", True):
+            return
+        self._specs_loaded = True
+        self.get_specs()
+
+    def get_specs(self) -> dict:
+        """Returns media file specs"""
+        return self.probe()
+
+    def probe(self, force: bool = False, profile: str | None = None) -> dict:
+        """Returns media file general specs
+        - profile is one of PROBE_PROFILES, the class PROBE_PROFILE by default. Specs of a full probe satisfy any profile"""
+        if profile is None:
+            profile = self.PROBE_PROFILE
         self.stat(force)
-        if self.specs is not None and not force:
+        if self.specs is not None and not force and self._probe_profile in (profile, FULL_PROBE):
             return self.specs
-        try:
-            log.logger.debug("%s(%s)", util.get_ffprobe(), self.filename)
-            self.specs = ffmpeg.probe(self.filename, cmd=util.get_ffprobe())
-            # log.logger.debug("Specs = %s", util.json_fmt(self.specs))
-        except ffmpeg.Error as e:
-            log.logger.error("%s error: %s", util.get_ffprobe(), e.stderr.decode("utf-8").split("\n")[-2].rstrip())
-            raise
+        self.specs = None if force else probe_cache.get(self.filename, self._stat, profile)
+        if self.specs is None:
+            try:
+                self.specs = ffprobe(self.filename, profile)
+                # log.logger.debug("Specs = %s", util.json_fmt(self.specs))
+            except ffmpeg.Error as e:
+                log.logger.error("%s error: %s", util.get_ffprobe(), e.stderr.decode("utf-8").split("\n")[-2].rstrip())
+                raise
+            probe_cache.put(self.filename, self._stat, self.specs, profile)
+        self._probe_profile = profile
         self.get_file_specs()
         return self.specs
 
@@ -113,12 +203,14 @@ class MediaFile(fil.File):
     def get_file_properties(self) -> dict:
         """Returns file properties as dict"""
         self.stat()
+        self._load_specs()
         d = vars(self)
         d["size"] = d.pop("_size")
         return d
 
     def __get_first_video_stream__(self) -> dict | None:
         log.logger.debug("Searching first video stream")
+        self.probe()
         for stream in self.specs["streams"]:
             log.logger.debug("Found codec %s / %s", stream["codec_type"], stream["codec_name"])
             if stream["codec_type"] == "video" and stream["codec_name"] != "gif":
@@ -148,6 +240,7 @@ class MediaFile(fil.File):
 
     def __get_stream_by_codec__(self, field: str, codec_list: tuple | list | str) -> dict | None:
         log.logger.debug("Searching stream for codec %s = %s", field, codec_list)
+        self.probe()
         for stream in self.specs["streams"]:
             log.logger.debug("Found codec %s", stream[field])
             if stream[field] in codec_list:
@@ -187,8 +280,8 @@ class MediaFile(fil.File):
 
     def get_exif_data(self, force: bool = False) -> dict[str, str]:
         if self._exif_data is None or force:
-            with ExifToolHelper(executable=util.get_exiftool()) as et:
-                self._exif_data = et.get_metadata(self.filename)[0]
+            et = exiftool_pool.get()
+            self._exif_data = et.get_metadata(self.filename)[0]
         return self._exif_data
 
     def set_exif_creation_date(self, some_datetime: datetime | str) -> None:
@@ -196,8 +289,8 @@ class MediaFile(fil.File):
             time_to_set = datetime.strftime(some_datetime, EXIF_DATE_FMT)
         else:
             time_to_set = some_datetime
-        with ExifToolHelper(executable=util.get_exiftool()) as et:
-            et.set_tags([self.filename], tags={"DateTimeOriginal": time_to_set}, params=["-P", "-overwrite_original"])
+        et = exiftool_pool.get()
+        et.set_tags([self.filename], tags={"DateTimeOriginal": time_to_set}, params=["-P", "-overwrite_original"])
 
     def get_exif_creation_date(self) -> datetime | None:
         exif_data = self.get_exif_data()
@@ -281,12 +374,12 @@ class MediaFile(fil.File):
         if longitude < 0:
             longitude = -longitude
             long_ref = "W"
-        with ExifToolHelper(executable=util.get_exiftool()) as et:
-            et.set_tags(
-                [self.filename],
-                tags={"EXIF:GPSLatitude": latitude, "EXIF:GPSLatitudeRef": lat_ref, "EXIF:GPSLongitude": longitude, "EXIF:GPSLongitudeRef": long_ref},
-                params=["-P", "-overwrite_original"],
-            )
+        et = exiftool_pool.get()
+        et.set_tags(
+            [self.filename],
+            tags={"EXIF:GPSLatitude": latitude, "EXIF:GPSLatitudeRef": lat_ref, "EXIF:GPSLongitude": longitude, "EXIF:GPSLongitudeRef": long_ref},
+            params=["-P", "-overwrite_original"],
+        )
 
 
 # ---------------- Class methods ---------------------------------
@@ -321,8 +414,10 @@ def get_prefilter_settings(**kwargs) -> list[str]:
     return settings
 
 
-def get_output_settings(file_type: str = fil.FileType.VIDEO_FILE, **kwargs) -> dict:
+def get_output_settings(file_type: str = fil.FileType.VIDEO_FILE, profile_params: dict | None = None, **kwargs) -> dict:
+    """Returns the ffmpeg output options of an encode, profile_params are the params of the encoding profile, if any"""
     settings: dict = {}
+    profile_params = profile_params or {}
     log.logger.debug("get_output_setting(%s)", str(kwargs))
 
     if file_type == fil.FileType.VIDEO_FILE:
@@ -356,6 +451,14 @@ def get_output_settings(file_type: str = fil.FileType.VIDEO_FILE, **kwargs) -> d
     if kwargs.get(opt.Option.FPS, None) not in ("", None):
         settings[opt.OptionFfmpeg.FPS] = kwargs[opt.Option.FPS]
 
+    # Thread budget of the encode when several files are encoded concurrently
+    # The video codec may only come from the profile, whose x265 params are kept
+    vcodec = settings.get(opt.Option.VCODEC, None)
+    if opt.Option.VCODEC not in kwargs:
+        vcodec = profile_params.get(opt.Option.VCODEC, vcodec)
+    thread_options = scheduler.ffmpeg_thread_options(kwargs.get(opt.Option.THREADS, None), vcodec, profile_params.get("x265-params", None))
+    settings.update(thread_options)
+
     log.logger.debug("get_output_settings returns %s", str(settings))
     return settings
 
@@ -474,6 +577,44 @@ def concat(target_file: str, file_list: list[str]) -> None:
     util.run_ffmpeg(cmd)
 
 
+def keyframes(filename: str) -> list[float]:
+    """Returns the timestamps of the key frames of the first video stream of a file, from a packet probe"""
+    cmd = [util.get_ffprobe(), "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", filename]
+    log.logger.debug("Running %s", " ".join(cmd))
+    result = subprocess.run(cmd, capture_output=True, encoding="utf-8", errors="replace", check=False)
+    if result.returncode != 0:
+        raise ffmpeg.Error(util.get_ffprobe(), result.stdout, result.stderr)
+    times = set()
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            times.add(float(pts))
+    return sorted(times)
+
+
+def concat_list_file(file_list: list[str]) -> str:
+    """Writes the list of files to concatenate with the concat demuxer, returns the list file"""
+    list_file = util.get_tmp_file() + ".txt"
+    with open(list_file, "w", encoding="utf-8") as fd:
+        for f in file_list:
+            # Single quotes are escaped as '\'' in concat demuxer lists
+            escaped = os.path.abspath(f).replace("'", "'\\''")
+            print(f"file '{escaped}'", file=fd)
+    return list_file
+
+
+def concat_demuxer(target_file: str, file_list: list[str], params: str = "-map 0 -c copy", duration: float | None = None) -> str:
+    """Concatenates files with the concat demuxer, by default without re-encoding
+    Files must have the same streams, with same codecs and codec parameters"""
+    log.logger.info("Concatenating %s into %s with the concat demuxer", " + ".join(file_list), target_file)
+    list_file = concat_list_file(file_list)
+    try:
+        util.run_ffmpeg(f'-f concat -safe 0 -i "{list_file}" {params} "{target_file}"', duration)
+    finally:
+        os.remove(list_file)
+    return target_file
+
+
 def strip_media_options(options: dict) -> dict:
     strip: dict = {}
     for k in options:
@@ -509,3 +650,31 @@ def build_ffmpeg_options(options: dict, with_mapping: bool = False) -> str:
             cmd = cmd + f' -{k} "{v}"'
     log.logger.debug("Mapped ffmpeg options = %s", cmd)
     return cmd
+
+
+def probe_many(paths: list[str], workers: int | None = None, ordered: bool = False, profile: str | None = None) -> Iterator[MediaFile]:
+    """Probes many files concurrently and yields the media file objects with their specs loaded
+    - Files are yielded as soon as probed, or in the order of paths if ordered is True
+    - If a probe profile is given, files are only probed with that profile, otherwise their full specs are loaded
+    - Files that are not media files or that can't be probed are logged and skipped"""
+    import mediatools.creator as creator
+
+    def __probe(path: str) -> MediaFile:
+        media_file = creator.file(path)
+        if profile is None:
+            media_file.get_specs()
+        else:
+            media_file.probe(profile=profile)
+        return media_file
+
+    if workers is None:
+        workers = int(conf.get_property(PROBE_WORKERS_KEY) or DEFAULT_PROBE_WORKERS)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Probe") as executor:
+        futures = {executor.submit(__probe, path): path for path in paths}
+        for future in futures if ordered else concurrent.futures.as_completed(futures):
+            try:
+                yield future.result()
+            except ex.FileTypeError:
+                log.logger.debug("%s is not a media file, skipped", futures[future])
+            except Exception as e:
+                log.logger.error("Can't probe %s, skipped: %s", futures[future], str(e))
@@ -106,6 +106,11 @@ class Option:
     MUTE: str = "mute"
     VMUTE: str = "vmute"
     SAMPLERATE: str = "samplerate"
+    THREADS: str = "threads"
+    SPEED: str = "speed"
+    REVERSE: str = "reverse"
+    FADE: str = "fade"
+    VIDSTAB_TRF: str = "vidstab_trf"
 
 
 M2F_MAPPING: dict[str, str] = {
@@ -0,0 +1,188 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""Persistent on-disk cache of ffprobe results, keyed by absolute path, size, mtime and probe profile"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from mediatools import log
+import mediatools.media_config as conf
+
+SCHEMA_VERSION: int = 2
+FULL_PROBE: str = "full"
+CACHE_FILE_NAME: str = "probe_cache.db"
+ENABLED_KEY: str = "probe_cache.enabled"
+MAX_ENTRIES_KEY: str = "probe_cache.max_entries"
+DEFAULT_MAX_ENTRIES: int = 200000
+
+# Don't rewrite the access time of an entry read again within that delay
+_ACCESS_REFRESH_SECONDS: int = 3600
+# Number of insertions between 2 checks of the cache size
+_EVICTION_CHECK_INTERVAL: int = 500
+
+_ENABLED: bool | None = None
+_CACHE_FILE: str | None = None
+_CONNECTION: sqlite3.Connection | None = None
+_LOCK = threading.RLock()
+_PUTS_SINCE_CHECK: int = 0
+
+
+def set_enabled(enabled: bool) -> None:
+    """Enables or disables the probe cache for the current process"""
+    global _ENABLED
+    _ENABLED = enabled
+
+
+def is_enabled() -> bool:
+    """Returns whether the probe cache is used"""
+    if _ENABLED is None:
+        return conf.get_property(ENABLED_KEY) is not False
+    return _ENABLED
+
+
+def set_cache_file(filename: str | None) -> None:
+    """Sets the SQLite file holding the cache, None reverts to the default location"""
+    global _CACHE_FILE
+    close()
+    _CACHE_FILE = filename
+
+
+def cache_file() -> str:
+    """Returns the SQLite file holding the cache"""
+    if _CACHE_FILE is not None:
+        return _CACHE_FILE
+    return os.path.join(conf.get_cache_dir(), CACHE_FILE_NAME)
+
+
+def max_entries() -> int:
+    """Returns the max number of entries kept in the cache"""
+    value = int(conf.get_property(MAX_ENTRIES_KEY) or DEFAULT_MAX_ENTRIES)
+    return value if value > 0 else DEFAULT_MAX_ENTRIES
+
+
+def close() -> None:
+    """Closes the cache database"""
+    global _CONNECTION
+    with _LOCK:
+        if _CONNECTION is not None:
+            _CONNECTION.close()
+            _CONNECTION = None
+
+
+def _connect() -> sqlite3.Connection:
+    global _CONNECTION
+    if _CONNECTION is not None:
+        return _CONNECTION
+    db = sqlite3.connect(cache_file(), check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        log.logger.info("Creating probe cache %s", cache_file())
+        db.execute("DROP TABLE IF EXISTS probes")
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS probes (path TEXT NOT NULL, profile TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+        "specs TEXT NOT NULL, last_access INTEGER NOT NULL, PRIMARY KEY (path, profile))"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS probes_last_access ON probes (last_access)")
+    _CONNECTION = db
+    return db
+
+
+def _disable_on_error(e: sqlite3.Error) -> None:
+    log.logger.warning("Probe cache %s unusable, disabling it: %s", cache_file(), str(e))
+    set_enabled(False)
+    close()
+
+
+def get(filename: str, stat: os.stat_result | None, profile: str = FULL_PROBE) -> dict | None:
+    """Returns the cached probe of a file, or None if not cached or if the file changed since
+    A cached full probe is returned for any requested profile"""
+    if stat is None or not is_enabled():
+        return None
+    path = os.path.abspath(filename)
+    now = int(time.time())
+    with _LOCK:
+        try:
+            db = _connect()
+            row = db.execute(
+                "SELECT specs, profile FROM probes WHERE path = ? AND profile IN (?, ?) AND size = ? AND mtime_ns = ?",
+                (path, profile, FULL_PROBE, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE probes SET last_access = ? WHERE path = ? AND profile = ? AND last_access < ?",
+                (now, path, row[1], now - _ACCESS_REFRESH_SECONDS),
+            )
+        except sqlite3.Error as e:
+            _disable_on_error(e)
+            return None
+    log.logger.debug("Probe cache hit for %s", path)
+    return json.loads(row[0])
+
+
+def put(filename: str, stat: os.stat_result | None, specs: dict, profile: str = FULL_PROBE) -> None:
+    """Stores the probe of a file in the cache"""
+    global _PUTS_SINCE_CHECK
+    if stat is None or specs is None or not is_enabled():
+        return
+    path = os.path.abspath(filename)
+    with _LOCK:
+        try:
+            db = _connect()
+            db.execute(
+                "INSERT OR REPLACE INTO probes (path, profile, size, mtime_ns, specs, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, profile, stat.st_size, stat.st_mtime_ns, json.dumps(specs, separators=(",", ":")), int(time.time())),
+            )
+            _PUTS_SINCE_CHECK += 1
+            if _PUTS_SINCE_CHECK >= _EVICTION_CHECK_INTERVAL:
+                _PUTS_SINCE_CHECK = 0
+                evict()
+        except sqlite3.Error as e:
+            _disable_on_error(e)
+
+
+def evict(limit: int | None = None) -> int:
+    """Removes the least recently used entries beyond the cache size limit, returns the number of removed entries"""
+    if limit is None:
+        limit = max_entries()
+    with _LOCK:
+        db = _connect()
+        count = db.execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+        if count <= limit:
+            return 0
+        db.execute(
+            "DELETE FROM probes WHERE rowid IN (SELECT rowid FROM probes ORDER BY last_access LIMIT ?)",
+            (count - limit,),
+        )
+    log.logger.info("Evicted %d entries from probe cache", count - limit)
+    return count - limit
+
+
+def clear() -> None:
+    """Removes all entries from the cache"""
+    with _LOCK:
+        _connect().execute("DELETE FROM probes")
@@ -28,11 +28,10 @@ from __future__ import annotations
 import sys
 import os
 import argparse
-import concurrent.futures
-from exiftool import ExifToolHelper
 import mediatools.utilities as util
 import mediatools.log as log
 import utilities.file as fil
+import mediatools.exiftool_pool as exiftool_pool
 
 SEQ: str = "#SEQ#"
 SIZE: str = "#SIZE#"
@@ -45,6 +44,23 @@ DEFAULT_FORMAT: str = f"{util.FILE_DATE_FMT} - #SEQ3# - {SIZE} - {DEVICE}"
 DEFAULT_VIDEO_FORMAT: str = f"{util.FILE_DATE_FMT} - {SEQ} - {SIZE} - {FPS}fps - {BITRATE}MBps"
 DEFAULT_PHOTO_FORMAT: str = f"{util.FILE_DATE_FMT} - {SEQ} - {SIZE} - {DEVICE}"
 
+# Only tags used to rename files are read from exiftool
+EXIF_TAGS: list[str] = [tag.split(":")[-1] for tag in util.CREATION_DATE_TAGS] + [
+    "Make",
+    "Model",
+    "Author",
+    "CompressorName",
+    "ImageWidth",
+    "ImageHeight",
+    "ExifImageWidth",
+    "ExifImageHeight",
+    "SourceImageWidth",
+    "SourceImageHeight",
+    "ImageSize",
+    "AvgBitrate",
+    "VideoFrameRate",
+]
+
 
 def get_device(exif_data: dict[str, str]) -> str:
     device = ""
@@ -128,50 +144,44 @@ def get_file_data(filename: str) -> dict | None:
         return None
 
     log.logger.info("Reading data for %s", filename)
-    with ExifToolHelper(executable=util.get_exiftool()) as et:
-        for data in et.get_metadata(filename):
-            log.logger.debug("MetaData = %s", util.json_fmt(data))
-            creation_date = util.get_creation_date(data)
-            device = get_device(data)
-            bitrate = get_bitrate(data)
-            fps = get_fps(data)
-            size = get_size(data)
+    et = exiftool_pool.get()
+    return __file_data(filename, et.get_tags(filename, tags=EXIF_TAGS)[0])
+
+
+def __file_data(filename: str, data: dict) -> dict:
+    log.logger.debug("MetaData = %s", util.json_fmt(data))
     return {
-        "creation_date": creation_date,
-        "device": device,
+        "creation_date": util.get_creation_date(data),
+        "device": get_device(data),
         "file": filename,
-        "bitrate": bitrate,
-        "size": size,
-        "fps": fps,
+        "bitrate": get_bitrate(data),
+        "size": get_size(data),
+        "fps": get_fps(data),
     }
 
 
 def get_files_data(files: list[str], sortby: str) -> dict:
     seq = 1
     filelist: dict = {}
+    files = [f for f in files if fil.extension(f).lower() in fil.IMAGE_AND_VIDEO_EXTENSIONS]
     nb_files = len(files)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="GetMetadata") as executor:
-        futures = [executor.submit(get_file_data, file) for file in files]
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                result = future.result(timeout=10)  # Retrieve result or raise an exception
-                log.logger.debug("Result: %s", str(result))
-            except TimeoutError:
-                log.logger.error("File renaming timed out after 60 seconds for %s, aborted.", str(future))
-            except Exception as e:
-                log.logger.error("File renaming task raised an exception: %s", str(e))
-            if not result:
-                continue
-            if sortby == "name":
-                filelist[result["filename"]] = result
-            elif sortby == "device":
-                if result["device"] is not None:
-                    filelist[f"{result['device']} {seq:06}"] = result
-            else:
-                if result["creation_date"] is not None:
-                    filelist[f"{result['creation_date'].strftime(util.FILE_DATE_FMT)} {seq:06}"] = result
-            seq += 1
-            log.logger.debug("Renamed %d/%d files = %d%%", seq, nb_files, (100 * seq) // nb_files)
+    for filename, data in exiftool_pool.read_tags(files, tags=EXIF_TAGS):
+        try:
+            result = __file_data(filename, data)
+            log.logger.debug("Result: %s", str(result))
+        except Exception as e:
+            log.logger.error("Reading data of %s raised an exception: %s", filename, str(e))
+            continue
+        if sortby == "name":
+            filelist[result["file"]] = result
+        elif sortby == "device":
+            if result["device"] is not None:
+                filelist[f"{result['device']} {seq:06}"] = result
+        else:
+            if result["creation_date"] is not None:
+                filelist[f"{result['creation_date'].strftime(util.FILE_DATE_FMT)} {seq:06}"] = result
+        log.logger.debug("Read data of %d/%d files = %d%%", seq, nb_files, (100 * seq) // nb_files)
+        seq += 1
     return filelist
 
 
@@ -222,7 +232,7 @@ def main() -> None:
     parser.add_argument("-g", "--debug", required=False, type=int, help="Debug level")
     kwargs = util.parse_media_args(parser)
 
-    file_list = fil.file_list(*kwargs["files"], file_type=None, recurse=False)
+    file_list = fil.file_list(*kwargs["files"], file_type=None, recurse=True)
     nb_photo_files = sum(1 for f in file_list if fil.extension(f).lower() in fil.FileType.FILE_EXTENSIONS[fil.FileType.IMAGE_FILE])
     nb_video_files = sum(1 for f in file_list if fil.extension(f).lower() in fil.FileType.FILE_EXTENSIONS[fil.FileType.VIDEO_FILE])
     nb_other_files = len(file_list) - nb_photo_files - nb_video_files
@@ -230,7 +240,7 @@ def main() -> None:
     photo_seq = video_seq = other_seq = int(kwargs.get("seqstart", 1))
     photo_format, video_format = get_formats(nb_photo_files, nb_video_files, **kwargs)
 
-    files_data = get_files_data(fil.file_list(*kwargs["files"], file_type=None, recurse=False), kwargs["sortby"])
+    files_data = get_files_data(file_list, kwargs["sortby"])
 
     log.logger.info("%d image files and %d video files to process", nb_photo_files, nb_video_files)
     for key in sorted(files_data.keys()):
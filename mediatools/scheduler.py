@@ -0,0 +1,152 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""Runs batches of encoding jobs concurrently, longest first, sharing the CPU cores between concurrent jobs"""
+
+from __future__ import annotations
+
+import os
+import time
+import argparse
+import threading
+import concurrent.futures
+from collections.abc import Callable
+from mediatools import log
+import mediatools.utilities as util
+import mediatools.media_config as conf
+
+JOBS_KEY: str = "encode.jobs"
+DEFAULT_JOBS: int = 1
+# Encoders with their own thread pool, sized with x265 params rather than with -threads
+X265_ENCODERS: tuple[str, ...] = ("libx265", "x265", "h265")
+
+
+class Job:
+    """A file to process, with the function processing it and its media duration,
+    used to start longest jobs first and to compute the batch progress"""
+
+    def __init__(self, filename: str, func: Callable[[str, int | None], object], duration: float = 0.0) -> None:
+        """
+        :param func: Function processing the file, called with the file and the number of threads it may use (None for no limit)
+        """
+        self.filename: str = filename
+        self.func: Callable[[str, int | None], object] = func
+        self.duration: float = duration or 0.0
+        self.result: object = None
+        self.error: Exception | None = None
+
+
+def nb_jobs(jobs: int | None = None) -> int:
+    """Returns the number of jobs to run concurrently, from the jobs requested or the configuration"""
+    if jobs is None:
+        jobs = int(conf.get_property(JOBS_KEY) or DEFAULT_JOBS)
+    return max(1, jobs)
+
+
+def thread_budget(jobs: int, cores: int | None = None) -> int | None:
+    """Returns the number of threads each of concurrent jobs may use, None when jobs run one at a time"""
+    if jobs <= 1:
+        return None
+    if cores is None:
+        cores = os.cpu_count() or 1
+    return max(1, cores // jobs)
+
+
+def ffmpeg_thread_options(threads: int | None, vcodec: str | None = None, x265_params: str | None = None) -> dict[str, str]:
+    """Returns the ffmpeg output options limiting an encode to a number of threads,
+    x265_params are the x265 params of the encode the thread pool size is appended to"""
+    if threads is None:
+        return {}
+    options = {"threads": str(threads)}
+    if vcodec in X265_ENCODERS:
+        options["x265-params"] = f"{x265_params}:pools={threads}" if x265_params else f"pools={threads}"
+    return options
+
+
+def add_jobs_arg(parser: argparse.ArgumentParser) -> None:
+    """Adds the option to set the number of files processed concurrently"""
+    parser.add_argument(
+        "-j", "--jobs", required=False, type=int, help=f"Number of files processed concurrently, default from {JOBS_KEY} config, 1 otherwise"
+    )
+
+
+class Scheduler:
+    """Runs jobs concurrently, each limited to its share of the CPU cores, and logs the progress of the whole batch"""
+
+    def __init__(self, jobs: int | None = None, cores: int | None = None) -> None:
+        self.nb_jobs: int = nb_jobs(jobs)
+        self.threads: int | None = thread_budget(self.nb_jobs, cores)
+        self._lock = threading.Lock()
+        self._total: float = 0.0
+        self._done: float = 0.0
+        self._nb_done: int = 0
+        self._nb_jobs_total: int = 0
+        self._running: dict[int, float] = {}
+        self._start: float = 0.0
+        self._last_log: float = 0.0
+
+    def run(self, jobs: list[Job]) -> list[Job]:
+        """Runs jobs, longest first, returns the jobs with their result or error, in the input order"""
+        self._total = sum(j.duration for j in jobs)
+        self._done, self._nb_done, self._nb_jobs_total, self._running = 0.0, 0, len(jobs), {}
+        self._start = self._last_log = time.monotonic()
+        log.logger.info(
+            "%d file(s) to process, total duration %s, %d at a time with %s threads each",
+            len(jobs),
+            util.to_hms_str(self._total),
+            self.nb_jobs,
+            "default" if self.threads is None else str(self.threads),
+        )
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.nb_jobs, thread_name_prefix="Job") as executor:
+            list(executor.map(self.__run_job, sorted(jobs, key=lambda j: -j.duration)))
+        nb_failed = sum(1 for j in jobs if j.error is not None)
+        if nb_failed > 0:
+            log.logger.error("%d/%d file(s) failed", nb_failed, len(jobs))
+        return jobs
+
+    def __run_job(self, job: Job) -> None:
+        util.set_thread_progress_callback(lambda progress: self.__progress(job, progress))
+        try:
+            job.result = job.func(job.filename, self.threads)
+        except Exception as e:
+            log.logger.error("Failed to process %s: %s", job.filename, e)
+            job.error = e
+        finally:
+            util.set_thread_progress_callback(None)
+        with self._lock:
+            self._running.pop(id(job), None)
+            self._done += job.duration
+            self._nb_done += 1
+            self.__log_progress()
+
+    def __progress(self, job: Job, progress: util.FfmpegProgress) -> None:
+        with self._lock:
+            self._running[id(job)] = min(progress.out_time, job.duration)
+            if time.monotonic() - self._last_log >= util.progress_log_interval():
+                self.__log_progress()
+
+    def __log_progress(self) -> None:
+        processed = self._done + sum(self._running.values())
+        pct = 100.0 * processed / self._total if self._total > 0 else 100.0 * self._nb_done / max(1, self._nb_jobs_total)
+        elapsed = time.monotonic() - self._start
+        speed = processed / elapsed if elapsed > 0 else 0
+        eta = (self._total - processed) / speed if speed > 0 else 0
+        log.logger.info("Processed %d/%d - %.0f%% - ETA %s", self._nb_done, self._nb_jobs_total, pct, util.to_hms_str(eta))
+        self._last_log = time.monotonic()
@@ -29,26 +29,17 @@ from __future__ import annotations
 
 import os
 import platform
-import subprocess
 import tempfile
 import mediatools.utilities as util
 import mediatools.videofile as video
+import mediatools.capabilities as capabilities
 import utilities.file as fil
 from mediatools import log
 
 
 def has_vidstab() -> bool:
     """Return True if FFmpeg was compiled with libvidstab support."""
-    try:
-        quot = '"' if platform.system() == "Windows" else ""
-        result = subprocess.run(
-            [f"{quot}{util.get_ffmpeg()}{quot}", "-filters"],
-            capture_output=True,
-            text=True,
-        )
-        return "vidstabdetect" in result.stdout or "vidstabdetect" in result.stderr
-    except Exception:
-        return False
+    return capabilities.has_filter("vidstabdetect")
 
 
 def run_vidstabdetect(filename: str, shakiness: int = 8) -> str:
@@ -142,7 +133,7 @@ def main() -> None:
     )
     kwargs = util.parse_media_args(parser)
 
-    input_files = fil.file_list(*kwargs["inputfiles"], file_type=fil.FileType.VIDEO_FILE)
+    input_files = fil.file_list(*kwargs["inputfiles"], file_type=fil.FileType.VIDEO_FILE, recurse=True)
     stab_kwargs = dict(
         shakiness=kwargs.get("shakiness", 8),
         smoothing=kwargs.get("smoothing", 30),
@@ -21,6 +21,8 @@
 
 import os
 import platform
+import time
+import threading
 import json
 import logging
 import re
@@ -30,17 +32,25 @@ import tempfile
 import subprocess
 import shlex
 from datetime import datetime
+from collections.abc import Callable
 from mediatools import version
 from mediatools import log
 import mediatools.options as opt
 import mediatools.resolution as res
 import utilities.file as fil
 import mediatools.media_config as conf
+import mediatools.probe_cache as probe_cache
 
 DEBUG_LEVEL: int = 0
 DRY_RUN: bool = False
 HW_ACCEL: bool | None = None
 HW_ACCEL_PREFIX: str = "-hwaccel cuda -hwaccel_output_format cuda"
+# ffmpeg writes its key=value progress blocks on stdout, and no longer prints its stats lines on stderr
+FFMPEG_PROGRESS_OPTIONS: str = "-progress pipe:1 -nostats"
+PROGRESS_LOG_INTERVAL_KEY: str = "progress.log_interval"
+DEFAULT_PROGRESS_LOG_INTERVAL: float = 10
+# Progress callback of ffmpeg commands run by each thread, when not passed explicitly to run_ffmpeg()
+_THREAD_PROGRESS = threading.local()
 
 LANGUAGE_MAPPING: dict[str, str] = {"fre": "French", "eng": "English"}
 
@@ -137,10 +147,133 @@ def __get_log_level_from_ffmpeg_log__(line: str) -> int:
     return level
 
 
-def run_os_cmd(cmd: str, total_time: float | str | None = None) -> None:
+class FfmpegProgress:
+    """Progress of an ffmpeg command, as reported by its -progress key=value blocks"""
+
+    def __init__(self, total_time: float | None = None) -> None:
+        self.total_time: float | None = total_time
+        self.frame: int = 0
+        self.fps: float = 0.0
+        self.out_time: float = 0.0
+        self.speed: float | None = None
+        self.done: bool = False
+
+    def __str__(self) -> str:
+        eta = self.eta
+        s = f"frame={self.frame} fps={self.fps:g} time={to_hms_str(self.out_time)} speed={'N/A' if self.speed is None else f'{self.speed:g}x'}"
+        if self.total_time is None:
+            return s
+        return s + " ETA=" + ("Undefined" if eta is None else to_hms_str(eta))
+
+    @property
+    def eta(self) -> float | None:
+        """Returns the estimated remaining time in seconds, None if unknown"""
+        if self.total_time is None or not self.speed:
+            return None
+        return max(0.0, (self.total_time - self.out_time) / self.speed)
+
+    def update(self, line: str) -> bool:
+        """Updates the progress with a key=value line, returns whether the line ends a progress block"""
+        key, _, value = line.strip().partition("=")
+        value = value.strip()
+        try:
+            if key == "frame":
+                self.frame = int(value)
+            elif key == "fps":
+                self.fps = float(value)
+            elif key == "out_time_us":
+                self.out_time = int(value) / 1000000
+            elif key == "speed":
+                self.speed = float(value.rstrip("x"))
+        except ValueError:
+            # ffmpeg reports N/A values when not known yet
+            if key == "speed":
+                self.speed = None
+        if key != "progress":
+            return False
+        self.done = value == "end"
+        return True
+
+
+def __log_ffmpeg_stderr(stream, last_lines: list[str]) -> None:
+    """Logs ffmpeg stderr lines, collapsing repeated lines, and keeps the last error line and last line"""
+    last_seen_line, last_seen_level, same_line_count = None, logging.INFO, 0
+    for line in stream:
+        line = line.rstrip()
+        if not line:
+            continue
+        level = __get_log_level_from_ffmpeg_log__(line)
+        if level >= logging.ERROR:
+            log.logger.log(level, line)
+            last_lines[0] = line
+            last_seen_line = None
+            same_line_count = 0
+        elif last_seen_line is not None and last_seen_line == line:
+            same_line_count += 1
+        else:
+            if same_line_count > 1:
+                log.logger.log(last_seen_level, "Above line repeated %d times", same_line_count)
+            log.logger.log(level, line)
+            same_line_count = 1
+            last_seen_line = line
+            last_seen_level = level
+        last_lines[1] = line
+
+
+def progress_log_interval() -> float:
+    """Returns the min number of seconds between 2 ffmpeg progress log lines"""
+    return float(conf.get_property(PROGRESS_LOG_INTERVAL_KEY) or DEFAULT_PROGRESS_LOG_INTERVAL)
+
+
+def run_os_cmd(
+    cmd: str, total_time: float | str | None = None, progress: bool = False, progress_callback: Callable[[FfmpegProgress], None] | None = None
+) -> None:
+    """Runs a command and logs its output
+
+    :param progress: Whether the command is ffmpeg writing its progress on stdout (see FFMPEG_PROGRESS_OPTIONS),
+        progress is then logged at most every progress.log_interval seconds and passed to the progress callback
+    :param progress_callback: Function called with the progress at the end of each ffmpeg progress block
+    """
     log.logger.info("Running: %s", cmd)
     if total_time is not None and isinstance(total_time, str):
         total_time = to_seconds(total_time)
+    if not progress:
+        __run_os_cmd_merged_output(cmd, total_time)
+        return
+    try:
+        # Last error line and last line of stderr
+        last_lines = [None, None]
+        pipe = subprocess.Popen(
+            shlex.split(cmd), stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, encoding="utf-8", errors="replace", bufsize=1
+        )
+        stderr_thread = threading.Thread(target=__log_ffmpeg_stderr, args=(pipe.stderr, last_lines), daemon=True)
+        stderr_thread.start()
+        status = FfmpegProgress(total_time)
+        interval = progress_log_interval()
+        last_log = time.monotonic()
+        for line in pipe.stdout:
+            if not status.update(line):
+                continue
+            if progress_callback is not None:
+                progress_callback(status)
+            now = time.monotonic()
+            if status.done or now - last_log >= interval:
+                log.logger.info(str(status))
+                last_log = now
+        pipe.wait()
+        stderr_thread.join()
+        log.logger.debug("Return code = %d", pipe.returncode)
+        if pipe.returncode not in (0, 3221225477):  # TODO: Better than this ugly hack for ffmpeg
+            raise subprocess.CalledProcessError(cmd=cmd, output=last_lines[0] or last_lines[1], returncode=pipe.returncode)
+        log.logger.info("Successfully completed: %s", cmd)
+    except subprocess.CalledProcessError as e:
+        log.logger.error("Command: %s failed with return code %d", cmd, e.returncode)
+        if e.output:
+            log.logger.error("Last ffmpeg error: %s", e.output)
+        raise e
+
+
+def __run_os_cmd_merged_output(cmd: str, total_time: float | None) -> None:
     try:
         last_seen_line, last_seen_level, same_line_count = None, logging.INFO, 0
         last_error_line = None
@@ -179,10 +312,23 @@ def run_os_cmd(cmd: str, total_time: float | str | None = None) -> None:
         raise e
 
 
-def run_ffmpeg(params: str, duration: float | None = None) -> None:
+def set_thread_progress_callback(progress_callback: Callable[[FfmpegProgress], None] | None) -> None:
+    """Sets the progress callback of all ffmpeg commands run by the current thread, None to unset it"""
+    _THREAD_PROGRESS.callback = progress_callback
+
+
+def run_ffmpeg(params: str, duration: float | None = None, progress_callback: Callable[[FfmpegProgress], None] | None = None) -> None:
+    """Runs ffmpeg with given parameters
+
+    :param duration: Duration of the output, to compute the ETA of the command
+    :param progress_callback: Function called with the command progress, about every 0.5s,
+        defaults to the callback set with set_thread_progress_callback()
+    """
+    if progress_callback is None:
+        progress_callback = getattr(_THREAD_PROGRESS, "callback", None)
     quot = '"' if platform.system() == "Windows" else ""
-    cmd = f"{quot}{get_ffmpeg()}{quot} -y {params}"
-    run_os_cmd(cmd, duration)
+    cmd = f"{quot}{get_ffmpeg()}{quot} -y {FFMPEG_PROGRESS_OPTIONS} {params}"
+    run_os_cmd(cmd, duration, progress=True, progress_callback=progress_callback)
 
 
 def build_ffmpeg_complex_prep(input_file_list: list) -> str:
@@ -284,10 +430,23 @@ def get_common_args(executable: str, desc: str) -> argparse.ArgumentParser:
 
     parser.add_argument("-g", "--debug", required=False, help="Debug level")
     parser.add_argument("--keepName", required=False, default=False, action="store_true", help="Generate new file with same name as old")
+    add_probe_cache_arg(parser)
 
     return parser
 
 
+def add_probe_cache_arg(parser: argparse.ArgumentParser) -> None:
+    """Adds the option to bypass the persistent probe cache"""
+    parser.add_argument(
+        "--no-probe-cache",
+        dest="no_probe_cache",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Don't use the persistent media probe cache",
+    )
+
+
 def remove_nones(d: dict) -> dict:
     return {k: v for k, v in d.items() if v is not None}
 
@@ -302,6 +461,8 @@ def parse_media_args(parser: argparse.ArgumentParser, args: list[str] | None = N
     log.logger.debug("Raw args = %s", str(kwargs))
     kwargs = {k: v for k, v in kwargs.items() if not isinstance(v, str) or v.strip() != ""}
     kwargs.pop("debug", None)
+    if kwargs.pop("no_probe_cache", False):
+        probe_cache.set_enabled(False)
     # (kwargs[opt.Option.WIDTH], kwargs[opt.Option.HEIGHT]) = resolve_resolution(**kwargs)
     timerange = kwargs.get("timeranges", None)
     if timerange:
@@ -557,17 +718,10 @@ def use_hardware_accel(**kwargs) -> bool:
     if HW_ACCEL is not None:
         return HW_ACCEL
 
-    # Auto mode, test execution with HW acceleration
-    log.logger.info("Checking if hardware acceleration can be used")
-    outputfile = get_tmp_file() + ".mp4"
-    inputfile = str(package_home() / "video-720p.mp4")
-    try:
-        log.logger.debug("Trying to encode 1 second of %s", inputfile)
-        run_ffmpeg(f'{HW_ACCEL_PREFIX} -ss 0 -i "{inputfile}" -vf scale_cuda=640:-1 -c:a copy -c:v h264_nvenc -to 2 "{outputfile}"')
-        os.remove(outputfile)
-        HW_ACCEL = True
-    except subprocess.CalledProcessError:
-        HW_ACCEL = False
+    # Auto mode, the test execution with HW acceleration is done once per ffmpeg binary
+    import mediatools.capabilities as capabilities
+
+    HW_ACCEL = capabilities.hw_accel_usable()
     log.logger.info("Auto hardware acceleration = %s", str(HW_ACCEL))
     return HW_ACCEL
 
@@ -22,10 +22,13 @@
 """Enhances video colors to produce more vivid, punchy images using the ffmpeg eq filter."""
 
 import os
-import time
+from datetime import datetime
 import mediatools.utilities as util
 import mediatools.videofile as video
+import mediatools.mediafile as media
 import mediatools.stabilize as stab
+import mediatools.scheduler as scheduler
+import mediatools.journal as journal
 import utilities.file as fileutil
 from mediatools import log
 
@@ -40,12 +43,28 @@ def enhance_file(
     hw_accel: bool | None = None,
     stabilize: bool = True,
     batch_remaining: float | None = None,
-) -> None:
-    """Color-enhance a single video file, preserve creation date, rename original."""
-    creation_date = video.get_creation_date(input_file)
+    set_date: bool = True,
+    creation_date: datetime | None = None,
+    threads: int | None = None,
+    batch_journal: journal.Journal | None = None,
+) -> str | None:
+    """Color-enhance a single video file, preserve creation date, rename original.
+
+    :param set_date: Whether to set the file dates ffmpeg can't write, otherwise left to the caller
+    :param creation_date: Creation date of the input file, read from the file if not provided
+    :param threads: Max number of threads of the encode, None for ffmpeg default
+    :param batch_journal: Journal of the batch the file belongs to, to record the enhancement progress
+    :return: The enhanced file, or None if enhancement failed
+    """
+    if creation_date is None:
+        creation_date = video.get_creation_date(input_file)
     extra = {} if hw_accel is None else {"hw_accel": hw_accel}
+    if creation_date is not None:
+        extra["creation_date"] = creation_date
     if batch_remaining is not None:
         extra["batch_remaining"] = batch_remaining
+    if threads is not None:
+        extra["threads"] = threads
 
     trf_file = None
     if stabilize:
@@ -59,23 +78,43 @@ def enhance_file(
             log.logger.warning("libvidstab not available — falling back to deshake filter")
             extra["deshake"] = "32x32"
 
+    # The output is written to a temporary file, only renamed to its final name once complete
+    if output_file is None:
+        base, ext = os.path.splitext(input_file)
+        final_file, backup = input_file, f"{base}.original{ext}"
+        tmp_file = util.automatic_output_file_name(outfile=None, infile=input_file, postfix="color")
+    else:
+        final_file, backup, tmp_file = output_file, None, journal.temp_output(output_file)
+    if batch_journal is not None:
+        batch_journal.start(input_file, final_file, tmp_file, backup)
+
     try:
-        outfile = video.color_enhance(input_file, output_file, saturation=saturation, contrast=contrast, brightness=brightness, gamma=gamma, **extra)
+        video.color_enhance(input_file, tmp_file, saturation=saturation, contrast=contrast, brightness=brightness, gamma=gamma, **extra)
     except Exception as e:
         log.logger.error("Failed to enhance %s: %s", input_file, e)
-        return
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        if batch_journal is not None:
+            batch_journal.failed(input_file, e)
+        return None
     finally:
         if trf_file and os.path.exists(trf_file):
             os.unlink(trf_file)
-    video.set_creation_date(outfile, creation_date)
-
-    if output_file is None:
-        base, ext = os.path.splitext(input_file)
-        fileutil.rename(input_file, f"{base}.original{ext}")
-        fileutil.rename(outfile, input_file)
-        util.generated_file(input_file)
+    # Dates are set before the file is recorded written, since resuming a written file only renames it
+    if set_date:
+        video.set_creation_date(tmp_file, creation_date, after_encode=True)
+
+    if batch_journal is not None:
+        batch_journal.written(input_file)
+    if backup is not None:
+        fileutil.rename(input_file, backup)
+        fileutil.rename(tmp_file, input_file)
     else:
-        util.generated_file(outfile)
+        os.replace(tmp_file, final_file)
+    if batch_journal is not None:
+        batch_journal.done(input_file, final_file)
+    util.generated_file(final_file)
+    return final_file
 
 
 def main():
@@ -96,6 +135,8 @@ def main():
     parser.add_argument(
         "--no_stabilize", required=False, default=False, action="store_true", help="Skip video stabilization (stabilization is applied by default)"
     )
+    scheduler.add_jobs_arg(parser)
+    journal.add_resume_arg(parser)
     kwargs = util.parse_media_args(parser)
 
     output_file = kwargs.get("outputfile", None)
@@ -118,32 +159,32 @@ def main():
         log.logger.error("-o/--outputfile cannot be used with multiple input files; omit it to rename in place")
         return
 
-    n = len(files)
-    durations = [video.get_duration(f) or 0.0 for f in files]
-    total_dur = sum(durations)
-    log.logger.info("%d file(s) to enhance, total duration: %s", n, util.to_hms_str(total_dur))
-
-    processed_dur = 0.0
-    wall_start = time.time()
-
-    for i, (f, dur) in enumerate(zip(files, durations)):
-        enhance_file(
-            f,
-            output_file,
-            saturation,
-            contrast,
-            brightness,
-            gamma,
-            hw_accel=hw_accel,
-            stabilize=do_stabilize,
-            batch_remaining=total_dur - processed_dur,
+    with journal.Journal(journal.journal_file("video-enhance", kwargs["inputfiles"])) as batch_journal:
+        files = batch_journal.batch(files, resume=kwargs.get("resume", False))
+        durations = {vf.filename: vf.get_duration() or 0.0 for vf in media.probe_many(files, profile="duration-only")}
+
+        # Creation dates are read before all encodings with one exiftool invocation and carried by ffmpeg,
+        # dates ffmpeg can't write are set as soon as each file is enhanced, before it is recorded done
+        creation_dates = video.get_creation_dates(files)
+
+        def enhance(f: str, threads: int | None) -> str | None:
+            return enhance_file(
+                f,
+                output_file,
+                saturation,
+                contrast,
+                brightness,
+                gamma,
+                hw_accel=hw_accel,
+                stabilize=do_stabilize,
+                creation_date=creation_dates[f],
+                threads=threads,
+                batch_journal=batch_journal,
+            )
+
+        scheduler.Scheduler(kwargs.get("jobs", None)).run(
+            [scheduler.Job(f, enhance, duration=durations.get(os.path.abspath(f), 0.0)) for f in files]
         )
-        processed_dur += dur
-        pct = 100.0 * processed_dur / total_dur if total_dur > 0 else 100.0
-        elapsed = time.time() - wall_start
-        speed = processed_dur / elapsed if elapsed > 0 else 0
-        eta = (total_dur - processed_dur) / speed if speed > 0 else 0
-        log.logger.info("Processed %d/%d - %.0f%% - ETA %s", i + 1, n, pct, util.to_hms_str(eta))
 
 
 if __name__ == "__main__":
@@ -25,8 +25,11 @@ from __future__ import annotations, print_function
 import datetime
 import math
 import os
-from exiftool import ExifToolHelper
 import re
+import bisect
+import shutil
+import tempfile
+import subprocess
 from mediatools import log
 import mediatools.exceptions as ex
 import mediatools.resolution as res
@@ -38,37 +41,79 @@ import mediatools.options as opt
 from filters import filter
 from filters import filters
 import mediatools.media_config as conf
+import mediatools.capabilities as capabilities
+import mediatools.exiftool_pool as exiftool_pool
 
 FFMPEG_CLASSIC_FMT: str = '-i "{0}" {1} "{2}"'
 
+FILE_DATE_TAGS: tuple[str, ...] = ("File:FileCreateDate", "File:FileModifyDate")
+IMAGE_DATE_TAGS: tuple[str, ...] = ("DateTimeOriginal",)
+VIDEO_DATE_TAGS: tuple[str, ...] = (
+    "CreateDate",
+    "ModifyDate",
+    "DateTimeOriginal",
+    "EXIF:CreateDate",
+    "EXIF:ModifyDate",
+    "EXIF:DateTimeOriginal",
+    "Composite:SubSecCreateDate",
+    "Composite:SubSecDateTimeOriginal",
+    "Composite:SubSecModifyDate",
+    "Quicktime:CreateDate",
+    "Quicktime:DateTimeOriginal",
+    "QuickTime:MediaCreateDate",
+    "QuickTime:MediaModifyDate",
+    "QuickTime:TrackCreateDate",
+    "QuickTime:TrackModifyDate",
+    "QuickTime:CreateDate",
+    "QuickTime:ModifyDate",
+)
+# Options that apply to the whole video timeline, and can't be applied to chunks encoded separately
+CHUNKED_UNSUPPORTED_OPTIONS: tuple[str, ...] = (
+    opt.Option.START,
+    opt.Option.STOP,
+    opt.Option.SPEED,
+    opt.Option.REVERSE,
+    opt.Option.FADE,
+    opt.Option.VIDSTAB_TRF,
+)
+# Stream parameters that must be identical in all files to concatenate them without re-encoding
+CONCAT_VIDEO_KEYS: tuple[str, ...] = ("codec_type", "codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base")
+CONCAT_AUDIO_KEYS: tuple[str, ...] = ("codec_type", "codec_name", "profile", "sample_rate", "channels", "channel_layout")
+# Encoders used to re-encode the partial GOPs of a smart cut, by source video codec
+SMART_CUT_ENCODERS: dict[str, str] = {"h264": "libx264", "hevc": "libx265"}
+# Cut points closer than that to a key frame are considered on the key frame
+SMART_CUT_TOLERANCE: float = 0.001
+
+# Formats where ffmpeg writes the creation date in the container (QuickTime movie, track and media headers, Matroska DateUTC)
+FFMPEG_DATE_FORMATS: tuple[str, ...] = ("mp4", "mov", "m4v", "3gp", "mkv")
+
 
 class VideoFile(media.MediaFile):
     AV_PASSTHROUGH: str = "-{0} copy -{1} copy -map 0 ".format(opt.OptionFfmpeg.VCODEC, opt.OptionFfmpeg.ACODEC)
 
-    """Video file abstraction"""
+    """Video file abstraction, the file is only probed when one of its specs is needed"""
+
+    aspect = media.LazySpec()
+    video_codec = media.LazySpec()
+    video_bitrate = media.LazySpec()
+    resolution = media.LazySpec()
+    video_fps = media.LazySpec()
+    pixel_aspect = media.LazySpec()
+    audio_bitrate = media.LazySpec()
+    audio_codec = media.LazySpec()
+    audio_language = media.LazySpec()
+    audio_sample_rate = media.LazySpec()
 
     def __init__(self, filename: str) -> None:
         if not fil.is_video_file(filename):
             raise ex.FileTypeError(file=filename, expected_type="video")
-
-        self.aspect: str | None = None
-        self.video_codec: str | None = None
-        self.video_bitrate: int | None = None
-        self.resolution: res.Resolution | None = None
-        self.duration: float | None = None
-        self.video_fps: float | None = None
-        self.pixel_aspect: str | None = None
-        self.audio_bitrate: int | None = None
-        self.audio_codec: str | None = None
-        self.audio_language: str | None = None
-        self.audio_sample_rate: int | None = None
         self.year: int | None = None
         super().__init__(filename)
-        self.get_specs()
 
     def get_specs(self) -> None:
         """Returns video file complete specs as dict"""
         # if self.specs is None:
+        self._specs_loaded = True
         self.probe()
         self.decode_specs()
 
@@ -356,7 +401,12 @@ class VideoFile(media.MediaFile):
         """Encodes a file
         - target_file is the name of the output file. Optional
         - Profile is the encoding profile as per the VideoTools.properties config file
-        - **kwargs accepts at large panel of other optional options"""
+        - **kwargs accepts at large panel of other optional options
+        - creation_date (datetime) is written in the output container metadata when the format supports it
+        - chunked (int) splits the video in that number of chunks at key frames, encoded concurrently"""
+        if int(kwargs.get("chunked", None) or 0) > 1:
+            return self.__encode_chunked(target_file, profile, **kwargs)
+        kwargs.pop("chunked", None)
         kwargs = util.get_all_options(**kwargs)
         log.logger.debug("Encoding %s with profile %s and args %s", self.filename, profile, str(kwargs))
         if target_file is None:
@@ -367,7 +417,7 @@ class VideoFile(media.MediaFile):
         video_filters = self.__get_video_filters(**kwargs)
         audio_filters = media.get_audio_filters(**kwargs)
         raw_settings = util.get_profile_params(profile)
-        output_settings = media.get_output_settings(**kwargs)
+        output_settings = media.get_output_settings(profile_params=raw_settings, **kwargs)
         ext = target_file.split(".")[-1].lower()
         log.logger.debug("Output file extension = %s", ext)
         if ext == "mp3" and output_settings[opt.OptionFfmpeg.ACODEC] != "copy":
@@ -385,8 +435,10 @@ class VideoFile(media.MediaFile):
         else:
             mapping = "-map 0:v:0 -map 0:a -map 0:s? -c:s copy"
 
+        date_options = ffmpeg_date_options(target_file, kwargs.get("creation_date", None))
+
         cmd = f'{" ".join(input_settings)} -i "{self.filename}" {" ".join(prefilter_settings)}'
-        cmd += f'{str(video_filters)} {str(audio_filters)} {output_str} {mapping} "{target_file}"'
+        cmd += f'{str(video_filters)} {str(audio_filters)} {output_str} {mapping} {date_options} "{target_file}"'
         eta_duration = kwargs.get("batch_remaining", self.duration)
         speed_val = kwargs.get("speed", None)
         if speed_val is not None:
@@ -400,34 +452,115 @@ class VideoFile(media.MediaFile):
         log.logger.info("File %s encoded", target_file)
         return target_file
 
+    def __encode_chunked(self, target_file: str | None, profile: str | None, **kwargs) -> str:
+        """Encodes the video in chunks split at key frames, concurrently, then joins the encoded chunks
+        with the concat demuxer and adds the audio of the source, encoded once"""
+        import mediatools.scheduler as scheduler
+
+        nb_chunks = int(kwargs.pop("chunked"))
+        unsupported = [k for k in CHUNKED_UNSUPPORTED_OPTIONS if kwargs.get(k, None) not in (None, "", False)]
+        if unsupported:
+            log.logger.warning("Options %s can't be used in chunked encoding, encoding %s in one piece", ", ".join(unsupported), self.filename)
+            return self.encode(target_file, profile, **kwargs)
+        if not self.duration:
+            log.logger.warning("%s has no duration, encoding it in one piece", self.filename)
+            return self.encode(target_file, profile, **kwargs)
+        split_points = chunk_split_points(media.keyframes(self.filename), self.duration, nb_chunks)
+        if not split_points:
+            log.logger.warning("No key frames to split %s in chunks, encoding it in one piece", self.filename)
+            return self.encode(target_file, profile, **kwargs)
+        if target_file is None:
+            target_file = media.build_target_file(self.filename, profile)
+        bounds = [0.0, *split_points, self.duration]
+        log.logger.info("Encoding %s in %d chunks split at %s", self.filename, len(bounds) - 1, ", ".join(util.to_hms_str(t) for t in split_points))
+
+        tmp_dir = tempfile.mkdtemp(prefix=".chunks-", dir=os.path.dirname(os.path.abspath(target_file)))
+        try:
+            times = ",".join(f"{t:.6f}" for t in split_points)
+            util.run_ffmpeg(
+                f'-i "{self.filename}" -map 0:v:0 -c copy -f segment -segment_times {times} -reset_timestamps 1 "{tmp_dir}{os.sep}chunk%04d.mkv"',
+                self.duration,
+            )
+            chunks = sorted(os.path.join(tmp_dir, f) for f in os.listdir(tmp_dir) if f.startswith("chunk"))
+            chunk_kwargs = {k: v for k, v in kwargs.items() if k not in ("creation_date", "batch_remaining", opt.Option.THREADS)}
+            chunk_kwargs[opt.Option.MUTE] = True
+
+            def encode_chunk(chunk: str, threads: int | None) -> str:
+                return VideoFile(chunk).encode(
+                    f"{chunk[:-4]}.encoded.mkv", profile, **chunk_kwargs, **util.remove_nones({opt.Option.THREADS: threads})
+                )
+
+            # The cores given to this encode, if limited, are shared between chunks
+            jobs = [scheduler.Job(c, encode_chunk, duration=end - start) for c, start, end in zip(chunks, bounds[:-1], bounds[1:])]
+            jobs = scheduler.Scheduler(jobs=nb_chunks, cores=kwargs.get(opt.Option.THREADS, None)).run(jobs)
+            failed = [j.filename for j in jobs if j.error is not None]
+            if failed:
+                raise subprocess.CalledProcessError(returncode=1, cmd=f"Encoding of chunks {', '.join(failed)} of {self.filename}")
+
+            video_only = media.concat_demuxer(os.path.join(tmp_dir, "video.mkv"), [j.result for j in jobs], duration=self.duration)
+            output_settings = media.get_output_settings(**kwargs)
+            audio_keys = (opt.Option.ACODEC, opt.OptionFfmpeg.ABITRATE, opt.OptionFfmpeg.MUTE)
+            audio_settings = {k: output_settings[k] for k in audio_keys if k in output_settings}
+            mapping = "-map 0:v:0" if kwargs.get(opt.Option.MUTE, False) else "-map 0:v:0 -map 1:a? -map 1:s? -c:s copy"
+            date_options = ffmpeg_date_options(target_file, kwargs.get("creation_date", None))
+            cmd = f'-i "{video_only}" -i "{self.filename}" {mapping} -c:v copy {media.build_ffmpeg_options(audio_settings)} {date_options}'
+            cmd += f' "{target_file}"'
+            util.run_ffmpeg(cmd, self.duration)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        log.logger.info("File %s encoded", target_file)
+        return target_file
+
+    def smart_cut(self, target_file: str, start: float | str, stop: float | str) -> str:
+        """Cuts a time window of the video, frame accurately, only re-encoding the partial GOPs at the cut boundaries:
+        Whole GOPs in the window are stream copied, the pieces are joined with the concat demuxer and the audio is stream copied"""
+        start, stop = util.to_seconds(start), util.to_seconds(stop)
+        stream = self.__get_first_video_stream__()
+        encoder = SMART_CUT_ENCODERS.get(stream["codec_name"] if stream else "", None)
+        if encoder is None or not capabilities.has_encoder(encoder):
+            log.logger.warning("Can't smart cut %s video, cutting %s at key frames", stream["codec_name"] if stream else "no", self.filename)
+            return self.encode(target_file, start=start, stop=stop, vcodec="copy", acodec="copy")
+        pieces = smart_cut_pieces(media.keyframes(self.filename), start, stop)
+        pieces_str = ", ".join(f"{'copy' if copy else 'encode'} {util.to_hms_str(s)}-{util.to_hms_str(e)}" for s, e, copy in pieces)
+        log.logger.info("Smart cut of %s: %s", self.filename, pieces_str)
+        # Re-encoded pieces must have the parameters of the copied GOPs, for the concat demuxer
+        encode_options = f'-c:v {encoder} -b:v {self.video_bitrate} -pix_fmt {stream["pix_fmt"]}'
+        if stream.get("profile", None):
+            encode_options += f' -profile:v {stream["profile"].lower().replace("constrained", "").replace(" ", "")}'
+        tmp_dir = tempfile.mkdtemp(prefix=".smartcut-", dir=os.path.dirname(os.path.abspath(target_file)))
+        try:
+            files = []
+            for i, (piece_start, piece_stop, copy) in enumerate(pieces):
+                duration = piece_stop - piece_start
+                if copy:
+                    # Seeks just after the key frame, so that seeking lands on it despite timestamps rounding, and splits at
+                    # the key frame ending the piece, since a stream copy -t cuts on decoding timestamps and keeps frames of the next GOP,
+                    # reading 1 second past the piece to get that key frame
+                    seek = piece_start + SMART_CUT_TOLERANCE
+                    util.run_ffmpeg(
+                        f'-ss {seek:.6f} -to {piece_stop + 1:.6f} -i "{self.filename}" -map 0:v:0 -c:v copy -f segment '
+                        f'-segment_times {piece_stop - seek - SMART_CUT_TOLERANCE:.6f} -reset_timestamps 1 "{tmp_dir}{os.sep}piece{i:02d}-%02d.mkv"',
+                        duration,
+                    )
+                    files.append(os.path.join(tmp_dir, f"piece{i:02d}-00.mkv"))
+                else:
+                    piece = os.path.join(tmp_dir, f"piece{i:02d}.mkv")
+                    util.run_ffmpeg(f'-ss {piece_start:.6f} -i "{self.filename}" -t {duration:.6f} -map 0:v:0 {encode_options} "{piece}"', duration)
+                    files.append(piece)
+            # The source is also an input for its audio
+            params = f'-ss {start:.6f} -t {stop - start:.6f} -i "{self.filename}" -map 0:v -map 1:a? -c copy'
+            media.concat_demuxer(target_file, files, params=params, duration=stop - start)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return target_file
+
     def set_creation_date(self, some_datetime: datetime.datetime | str) -> None:
-        if type(some_datetime) is datetime.datetime:
-            time_to_set = datetime.strftime(some_datetime, media.EXIF_DATE_FMT)
+        if isinstance(some_datetime, datetime.datetime):
+            time_to_set = some_datetime.strftime(media.EXIF_DATE_FMT)
         else:
             time_to_set = some_datetime
-        p = ["-P", "-overwrite_original"]
-        with ExifToolHelper(executable=util.get_exiftool(), encoding="utf-8") as et:
-            et.set_tags([self.filename], tags={"CreateDate": time_to_set, "ModifyDate": time_to_set, "DateTimeOriginal": time_to_set}, params=p)
-            et.set_tags(
-                [self.filename], tags={"EXIF:CreateDate": time_to_set, "EXIF:ModifyDate": time_to_set, "EXIF:DateTimeOriginal": time_to_set}, params=p
-            )
-            et.set_tags(
-                [self.filename],
-                tags={
-                    "Composite:SubSecCreateDate": time_to_set,
-                    "Composite:SubSecDateTimeOriginal": time_to_set,
-                    "Composite:SubSecModifyDate": time_to_set,
-                    "Quicktime:CreateDate": time_to_set,
-                    "Quicktime:DateTimeOriginal": time_to_set,
-                    "QuickTime:MediaCreateDate": time_to_set,
-                    "QuickTime:MediaModifyDate": time_to_set,
-                    "QuickTime:TrackCreateDate": time_to_set,
-                    "QuickTime:TrackModifyDate": time_to_set,
-                    "QuickTime:CreateDate": time_to_set,
-                    "QuickTime:ModifyDate": time_to_set,
-                },
-                params=p,
-            )
+        tags = {tag: time_to_set for tag in VIDEO_DATE_TAGS}
+        exiftool_pool.get().set_tags([self.filename], tags=tags, params=["-P", "-overwrite_original"])
 
     def get_exif_bitrate(self) -> int | None:
         exif_data = self.get_exif_data()
@@ -458,6 +591,7 @@ class VideoFile(media.MediaFile):
 
     def __get_number_of_audio_tracks(self) -> int:
         n = 0
+        self.probe()
         for stream in self.specs["streams"]:
             if stream["codec_type"] != "audio":
                 n += 1
@@ -550,13 +684,45 @@ def get_crop_filter_options(width: int, height: int, top: int, left: int) -> str
     return "-filter:v crop={0}:{1}:{2}:{3}".format(width, height, top, left)
 
 
-def concat(target_file: str, file_list: list[str], with_audio: bool = True, hw_accel: bool = False) -> str:
-    """Concatenates several video files - They must have same video+audio format and bitrate"""
+def __stream_signature(stream: dict) -> tuple:
+    """Returns the stream parameters that must be identical to concatenate streams without re-encoding"""
+    if stream["codec_type"] == "video":
+        keys = CONCAT_VIDEO_KEYS
+    elif stream["codec_type"] == "audio":
+        keys = CONCAT_AUDIO_KEYS
+    else:
+        keys = ("codec_type", "codec_name")
+    return tuple(stream.get(k, None) for k in keys)
+
+
+def concat_compatible(file_list: list[str], with_audio: bool = True) -> bool:
+    """Returns whether video files can be concatenated without re-encoding, ie if they have the same
+    video and audio streams, with same codecs, resolution, frame rate, time base, pixel format and audio layout"""
+    signatures = set()
+    nb_files = 0
+    for f in media.probe_many(file_list):
+        nb_files += 1
+        stream_types = ("video", "audio") if with_audio else ("video",)
+        signatures.add(tuple(__stream_signature(s) for s in f.specs["streams"] if s["codec_type"] in stream_types))
+        if len(signatures) > 1:
+            log.logger.info("%s streams differ from other files, files can't be concatenated without re-encoding", f.filename)
+            return False
+    return nb_files == len(file_list)
+
+
+def concat(target_file: str, file_list: list[str], with_audio: bool = True, hw_accel: bool = False, reencode: bool = False) -> str:
+    """Concatenates several video files - They must have same video+audio format and bitrate
+    Files are concatenated without re-encoding when their streams are compatible, unless reencode is True"""
     file_list = sorted(file_list, key=lambda f: os.path.basename(f).lower())
     log.logger.info("%s = %s", target_file, " + ".join(file_list))
 
+    if not reencode and concat_compatible(file_list, with_audio):
+        total_duration = sum(VideoFile(f).duration or 0.0 for f in file_list)
+        params = "-map 0:v:0 -map 0:a? -c copy" if with_audio else "-map 0:v:0 -c copy"
+        return media.concat_demuxer(target_file, file_list, params=params, duration=total_duration)
+
     first = VideoFile(file_list[0])
-    n_audio = sum(1 for s in first.specs["streams"] if s["codec_type"] == "audio") if with_audio else 0
+    n_audio = sum(1 for s in first.probe()["streams"] if s["codec_type"] == "audio") if with_audio else 0
     n_files = len(file_list)
     total_duration = (first.duration or 0.0) + sum(VideoFile(f).duration or 0.0 for f in file_list[1:])
 
@@ -583,6 +749,34 @@ def concat(target_file: str, file_list: list[str], with_audio: bool = True, hw_a
     return target_file
 
 
+def chunk_split_points(keyframe_times: list[float], duration: float, nb_chunks: int) -> list[float]:
+    """Returns the key frames where to split a video in about nb_chunks chunks of similar durations"""
+    points: list[float] = []
+    for i in range(1, nb_chunks):
+        target = duration * i / nb_chunks
+        idx = bisect.bisect_left(keyframe_times, target)
+        candidates = [k for k in keyframe_times[max(0, idx - 1) : idx + 1] if k > (points[-1] if points else 0) and k < duration]
+        if candidates:
+            points.append(min(candidates, key=lambda k: abs(k - target)))
+    return points
+
+
+def smart_cut_pieces(keyframe_times: list[float], start: float, stop: float) -> list[tuple[float, float, bool]]:
+    """Returns the pieces of a smart cut, as (start, stop, copy) tuples: the whole GOPs between start and stop are copied,
+    the partial GOPs before the first and after the last key frame are re-encoded"""
+    inside = [k for k in keyframe_times if start - SMART_CUT_TOLERANCE <= k <= stop + SMART_CUT_TOLERANCE]
+    if len(inside) < 2:
+        return [(start, stop, False)]
+    first, last = inside[0], inside[-1]
+    pieces = []
+    if first - start > SMART_CUT_TOLERANCE:
+        pieces.append((start, first, False))
+    pieces.append((max(start, first), min(stop, last), True))
+    if stop - last > SMART_CUT_TOLERANCE:
+        pieces.append((last, stop, False))
+    return pieces
+
+
 def add_video_args(parser) -> object:
     """Parses options specific to video encoding scripts"""
     parser.add_argument("-p", "--profile", required=False, help="Profile to use for encoding")
@@ -599,6 +793,8 @@ def add_video_args(parser) -> object:
 
     parser.add_argument("-t", "--timeranges", required=False, help="Ranges of encoding <start>:<end>,<start>:<end>")
 
+    parser.add_argument("--chunked", required=False, type=int, help="Split the video in that number of chunks encoded concurrently")
+
     parser.add_argument("-f", "--" + opt.Option.FORMAT, required=False, help="Output file format eg mp4")
     parser.add_argument("-r", "--" + opt.Option.FPS, required=False, help="Video framerate of the output eg 25")
 
@@ -678,7 +874,7 @@ def __build_slideshow__(input_files: list[str], outfile: str = "slideshow.mp4",
 def slideshow(*inputs: str, resolution: str | None = None) -> tuple[str, list]:
     log.logger.info("slideshow(%s)", str(inputs))
     MAX_SLIDESHOW_AT_ONCE = 30
-    slideshow_files = fil.file_list(*inputs)
+    slideshow_files = fil.file_list(*inputs, recurse=True)
     video_files: list[str] = []
     all_video_files: list[list[str]] = []
     slideshows: list[str] = []
@@ -753,46 +949,44 @@ def deshake(filename: str, output: str | None = None, **kwargs) -> str:
     return VideoFile(filename).encode(target_file=output, **kwargs)
 
 
-def set_creation_date(filename: str, new_date: datetime.datetime | None) -> bool:
+def carries_creation_date(filename: str) -> bool:
+    """Returns whether ffmpeg writes the creation date in the container of a file, based on its extension"""
+    return fil.extension(filename).lower() in FFMPEG_DATE_FORMATS
+
+
+def ffmpeg_date_options(target_file: str, creation_date: datetime.datetime | None) -> str:
+    """Returns the ffmpeg output options to carry a creation date in the target file container"""
+    if creation_date is None or not carries_creation_date(target_file):
+        return ""
+    # The wall clock date is written as is, with a Z so that ffmpeg does not convert it from local time,
+    # like exiftool writes QuickTime dates
+    return f"-map_metadata 0 -metadata creation_time={creation_date.strftime('%Y-%m-%dT%H:%M:%S')}Z"
+
+
+def creation_date_tags(filename: str, exif_date: str, after_encode: bool = False) -> dict[str, str]:
+    """Returns all the tags to write to set the creation date of a file, depending on its type
+
+    :param after_encode: Whether the file was just encoded with ffmpeg_date_options(), in which case
+                         only the tags ffmpeg can't write are returned
+    """
+    tags = {tag: exif_date for tag in FILE_DATE_TAGS}
+    if after_encode and carries_creation_date(filename):
+        return tags
+    if fil.is_image_file(filename):
+        tags.update({tag: exif_date for tag in IMAGE_DATE_TAGS})
+    elif fil.is_video_file(filename):
+        tags.update({tag: exif_date for tag in VIDEO_DATE_TAGS})
+    return tags
+
+
+def set_creation_date(filename: str, new_date: datetime.datetime | None, after_encode: bool = False) -> bool:
     if new_date is None:
         return False
     exif_date = datetime.datetime.strftime(new_date, util.EXIF_DATE_FMT)
     log.logger.info("Setting creation date of %s to %s", filename, exif_date)
-    p = ["-P", "-overwrite_original"]
     try:
-        with ExifToolHelper(executable=util.get_exiftool(), encoding="utf-8") as et:
-            et.set_tags([filename], tags={"File:FileCreateDate": exif_date, "File:FileModifyDate": exif_date}, params=p)
-            if fil.is_image_file(filename):
-                et.set_tags([filename], tags={"DateTimeOriginal": exif_date}, params=p)
-            elif fil.is_video_file(filename):
-                log.logger.info("Tagging video file")
-                et.set_tags([filename], tags={"CreateDate": exif_date, "ModifyDate": exif_date, "DateTimeOriginal": exif_date}, params=p)
-                et.set_tags(
-                    [filename],
-                    tags={
-                        "EXIF:CreateDate": exif_date,
-                        "EXIF:ModifyDate": exif_date,
-                        "EXIF:DateTimeOriginal": exif_date,
-                    },
-                    params=p,
-                )
-                et.set_tags(
-                    [filename],
-                    tags={
-                        "Composite:SubSecCreateDate": exif_date,
-                        "Composite:SubSecDateTimeOriginal": exif_date,
-                        "Composite:SubSecModifyDate": exif_date,
-                        "Quicktime:CreateDate": exif_date,
-                        "Quicktime:DateTimeOriginal": exif_date,
-                        "QuickTime:MediaCreateDate": exif_date,
-                        "QuickTime:MediaModifyDate": exif_date,
-                        "QuickTime:TrackCreateDate": exif_date,
-                        "QuickTime:TrackModifyDate": exif_date,
-                        "QuickTime:CreateDate": exif_date,
-                        "QuickTime:ModifyDate": exif_date,
-                    },
-                    params=p,
-                )
+        # All tags are written at once, so that the file is rewritten only once
+        exiftool_pool.get().set_tags([filename], tags=creation_date_tags(filename, exif_date, after_encode), params=["-P", "-overwrite_original"])
     except Exception as e:
         log.logger.warning("Could not set creation date of %s: %s", filename, e)
         return False
@@ -800,11 +994,44 @@ def set_creation_date(filename: str, new_date: datetime.datetime | None) -> bool
     return True
 
 
+def set_creation_dates(dates: dict[str, datetime.datetime | None], after_encode: bool = False) -> int:
+    """Sets the creation date of many files with a single exiftool invocation, driven by an argfile
+
+    :return: Number of files successfully updated
+    """
+    dates = {f: d for f, d in dates.items() if d is not None}
+    if len(dates) == 0:
+        return 0
+    if len(dates) == 1:
+        return int(set_creation_date(*next(iter(dates.items())), after_encode=after_encode))
+    blocks = []
+    for filename, new_date in dates.items():
+        exif_date = datetime.datetime.strftime(new_date, util.EXIF_DATE_FMT)
+        blocks.append("\n".join([f"-{tag}={value}" for tag, value in creation_date_tags(filename, exif_date, after_encode).items()] + [filename]))
+    argfile = util.get_tmp_file() + ".args"
+    with open(argfile, "w", encoding="utf-8") as fd:
+        print("\n-execute\n".join(blocks), file=fd)
+    log.logger.info("Setting creation date of %d files", len(dates))
+    try:
+        cmd = [util.get_exiftool(), "-@", argfile, "-common_args", "-charset", "filename=utf8", "-P", "-overwrite_original"]
+        result = subprocess.run(cmd, capture_output=True, encoding="utf-8", errors="replace", check=False)
+    except OSError as e:
+        log.logger.warning("Could not set creation dates: %s", e)
+        return 0
+    finally:
+        os.remove(argfile)
+    for line in result.stderr.splitlines():
+        log.logger.warning("exiftool: %s", line)
+    nb_updated = sum(int(m.group(1)) for m in re.finditer(r"(\d+) (?:image )?files? updated", result.stdout))
+    log.logger.info("Creation date of %d/%d files updated", nb_updated, len(dates))
+    return nb_updated
+
+
 def get_creation_date(filename: str) -> datetime.datetime | None:
     try:
-        with ExifToolHelper(executable=util.get_exiftool(), encoding="utf-8") as et:
-            for exif_data in et.get_metadata(filename):
-                creation_date = util.get_creation_date(exif_data)
+        et = exiftool_pool.get()
+        for exif_data in et.get_metadata(filename):
+            creation_date = util.get_creation_date(exif_data)
         return creation_date
     except FileNotFoundError:
         log.logger.warning("exiftool not found, cannot read creation date of %s", filename)
@@ -814,12 +1041,25 @@ def get_creation_date(filename: str) -> datetime.datetime | None:
         return None
 
 
+def get_creation_dates(files: list[str]) -> dict[str, datetime.datetime | None]:
+    """Reads the creation date of many files with batched exiftool calls"""
+    dates: dict[str, datetime.datetime | None] = {f: None for f in files}
+    for filename, exif_data in exiftool_pool.read_tags(list(files), tags=[tag.split(":")[-1] for tag in util.CREATION_DATE_TAGS]):
+        try:
+            dates[filename] = util.get_creation_date(exif_data)
+        except ValueError:
+            log.logger.warning("Could not read creation date of %s", filename)
+    return dates
+
+
 def get_exif(filename: str) -> None:
-    with ExifToolHelper(executable=util.get_exiftool()) as et:
-        for exif_data in et.get_metadata(filename):
-            for k, v in exif_data.items():
-                log.logger.info("EXIF - %s = %s", k, v)
+    et = exiftool_pool.get()
+    for exif_data in et.get_metadata(filename):
+        for k, v in exif_data.items():
+            log.logger.info("EXIF - %s = %s", k, v)
 
 
 def get_duration(filename: str) -> float:
-    return VideoFile(filename).get_duration()
+    vf = VideoFile(filename)
+    vf.probe(profile="duration-only")
+    return vf.get_duration()
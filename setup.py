@@ -99,6 +99,7 @@ setuptools.setup(
             "video-enhance = mediatools.video_enhance:main",
             "fix-mp3-meta = mediatools.fix_mp3_meta:main",
             "audio-normalize = mediatools.audio_normalize:main",
+            "media-dedupe = mediatools.dedupe:main",
         ]
     },
     python_requires=">=3.10",
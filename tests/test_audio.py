@@ -20,10 +20,12 @@
 #
 
 import os
+import subprocess
 import mediatools.exceptions as ex
 import mediatools.utilities as util
 import mediatools.avfile as av
 import mediatools.audiofile as audio
+import mediatools.hash_index as hash_index
 import utilities.file as fil
 
 AUDIO_FILE = "it" + os.sep + "seal.mp3"
@@ -48,6 +50,36 @@ def test_hash_list():
     assert len(hashes.keys()) == 2
 
 
+def __sine_mp3(file: str, title: str) -> str:
+    cmd = [util.get_ffmpeg(), "-v", "error", "-y", "-f", "lavfi", "-i", "sine=frequency=440:duration=3", "-metadata", f"title={title}", file]
+    subprocess.run(cmd, check=True)
+    return file
+
+
+def test_pcm_hash(tmp_path):
+    f1 = __sine_mp3(str(tmp_path / "sine1.mp3"), "Sine")
+    f2 = str(tmp_path / "sine2.mp3")
+    subprocess.run([util.get_ffmpeg(), "-v", "error", "-y", "-i", f1, "-c", "copy", "-metadata", "title=Retagged", f2], check=True)
+    assert fil.File(f1).hash() != fil.File(f2).hash()
+    h = audio.AudioFile(f1).hash("pcm")
+    assert h is not None and len(h) == 32
+    assert audio.AudioFile(f2).hash("pcm") == h
+    assert audio.AudioFile(f1).hash("pcm:1") not in (None, h)
+    assert audio.is_pcm_algo("pcm:1") and not audio.is_pcm_algo("audio")
+
+
+def test_pcm_hash_list_index(tmp_path):
+    f1 = __sine_mp3(str(tmp_path / "sine1.mp3"), "Sine")
+    f2 = __sine_mp3(str(tmp_path / "sine2.mp3"), "Other")
+    with hash_index.HashIndex(str(tmp_path / "index.db")) as index:
+        hashes = audio.get_hash_list([f1, f2, "nonexisting.mp3"], algo="pcm", index=index)
+        assert list(hashes.values()) == [[f1, f2]]
+        h = list(hashes)[0]
+        assert index.get(f1, os.stat(f1), "pcm") == h
+        assert index.lookup(h, "pcm") == [f1, f2]
+        assert audio.get_hash_list([f2], algo="pcm", index=index) == {h: [f2]}
+
+
 def test_read_hash_list():
     hashes = audio.read_hash_list("/tmp/nonexist.tser")
     assert hashes["hashes"] == {}
@@ -164,3 +196,34 @@ def test_build_target_file_replaces_extension_when_format_differs():
 def test_build_target_file_keeps_profile_postfix_when_format_unchanged():
     target = audio.build_target_file("Song Title.mp3", "mp3_128k")
     assert os.path.basename(target) == "Song Title.mp3_128k.mp3"
+
+
+def test_concat_stream_copy(tmp_path):
+    f1 = __sine_mp3(str(tmp_path / "sine1.mp3"), "First")
+    f2 = __sine_mp3(str(tmp_path / "sine2.mp3"), "Second")
+    assert audio.concat_compatible([f1, f2])
+    target = audio.concat(str(tmp_path / "concat.mp3"), [f2, f1])
+    f = audio.AudioFile(target)
+    f.get_specs()
+    assert f.acodec == "mp3" and f.title == "First"
+    assert abs(f.duration - 6) < 0.2
+
+
+def test_concat_reencode(tmp_path):
+    f1 = __sine_mp3(str(tmp_path / "sine1.mp3"), "First")
+    f2 = str(tmp_path / "sine2.mp3")
+    subprocess.run([util.get_ffmpeg(), "-v", "error", "-y", "-i", f1, "-ar", "22050", f2], check=True)
+    assert not audio.concat_compatible([f1, f2])
+    f = audio.AudioFile(audio.concat(str(tmp_path / "concat.mp3"), [f1, f2]))
+    f.get_specs()
+    assert abs(f.duration - 6) < 0.2
+
+
+def test_concat_compatible_aac_profiles(tmp_path):
+    files = []
+    for profile in ("aac_low", "aac_main"):
+        files.append(str(tmp_path / f"{profile}.m4a"))
+        cmd = [util.get_ffmpeg(), "-v", "error", "-y", "-f", "lavfi", "-i", "sine=duration=1", "-c:a", "aac", "-profile:a", profile, files[-1]]
+        subprocess.run(cmd, check=True)
+    assert audio.concat_compatible([files[0], files[0]])
+    assert not audio.concat_compatible(files)
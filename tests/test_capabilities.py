@@ -0,0 +1,60 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+#
+
+
+import json
+import mediatools.capabilities as capabilities
+import mediatools.stabilize as stab
+
+
+def test_parse():
+    encoders = ["Encoders:", " V..... = Video", " .....D = Supports direct rendering method 1", " ------"]
+    encoders += [" V....D libx264              libx264 H.264 (codec h264)", " A....D aac                  AAC (Advanced Audio Coding)"]
+    assert capabilities.parse_list(encoders) == ["libx264", "aac"]
+    filters = ["Filters:", "  T.. = Timeline support", "  | = Source or sink filter"]
+    filters += [" TSC aap               AA->A      Apply Affine Projection", " ... vidstabdetect     V->V       Extract relative transformations"]
+    assert capabilities.parse_list(filters) == ["aap", "vidstabdetect"]
+    assert capabilities.parse_hwaccels(["Hardware acceleration methods:", "vdpau", "cuda", ""]) == ["vdpau", "cuda"]
+
+
+def test_registry(tmp_path):
+    cache = str(tmp_path / "capabilities.json")
+    capabilities.set_cache_file(cache)
+    try:
+        assert capabilities.has_filter("scale")
+        assert capabilities.has_encoder("aac")
+        assert not capabilities.has_filter("no_such_filter")
+        assert capabilities.version().startswith("ffmpeg version")
+        assert stab.has_vidstab() == capabilities.has_filter("vidstabdetect")
+        with open(cache, "r", encoding="utf-8") as fd:
+            entries = json.load(fd)
+        assert len(entries) == 1
+        key = next(iter(entries))
+        assert key.startswith(capabilities.ffmpeg_path() + "|")
+
+        # Capabilities are read from disk by a new process, ffmpeg is not queried again
+        entries[key]["filters"].append("fake_filter")
+        with open(cache, "w", encoding="utf-8") as fd:
+            json.dump(entries, fd)
+        capabilities.set_cache_file(cache)
+        assert capabilities.has_filter("fake_filter")
+    finally:
+        capabilities.set_cache_file(None)
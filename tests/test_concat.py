@@ -45,6 +45,22 @@ def test_main_with_output():
             assert abs(video.VideoFile(VIDEO1).duration + video.VideoFile(VIDEO2).duration - video.VideoFile(TMP3).duration) < 0.06
 
 
+def test_main_reencode():
+    util.HW_ACCEL = False
+    with patch.object(sys, "argv", [CMD, "--reencode", "-i", VIDEO1, VIDEO2, "-o", TMP2]):
+        try:
+            concat.main()
+        except SystemExit as e:
+            assert int(str(e)) == 0
+    assert video.VideoFile(TMP2).video_codec in ("hevc", "h265")
+    os.remove(TMP2)
+
+
+def test_concat_compatible():
+    assert video.concat_compatible([VIDEO1, VIDEO2])
+    assert not video.concat_compatible([VIDEO1, "it" + os.sep + "video-1920x1080.mp4"])
+
+
 def test_main_help():
     with patch.object(sys, "argv", [CMD, "-h"]):
         try:
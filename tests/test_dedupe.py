@@ -0,0 +1,101 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+#
+
+import os
+import stat
+import pytest
+import mediatools.dedupe as dedupe
+import utilities.file as fil
+
+PARTIAL = 16
+
+
+def __make_files(tmp_path) -> dict[str, str]:
+    contents = {
+        "a1.jpg": b"same small content",
+        "a2.jpg": b"same small content",
+        "b.jpg": b"diff small content",
+        "c1.mp4": b"H" * PARTIAL + b"middle-1" + b"T" * PARTIAL,
+        "c2.mp4": b"H" * PARTIAL + b"middle-2" + b"T" * PARTIAL,
+        "c3.mp4": b"H" * PARTIAL + b"middle-1" + b"T" * PARTIAL,
+        "empty1.mp3": b"",
+        "empty2.mp3": b"",
+    }
+    files = {}
+    for name, data in contents.items():
+        (tmp_path / name).write_bytes(data)
+        files[name] = str(tmp_path / name)
+    return files
+
+
+def test_partial_hash(tmp_path):
+    f = __make_files(tmp_path)
+    assert fil.File(f["c1.mp4"]).partial_hash(PARTIAL) == fil.File(f["c2.mp4"]).partial_hash(PARTIAL)
+    assert fil.File(f["c1.mp4"]).partial_hash(PARTIAL) != fil.File(f["c1.mp4"]).hash()
+    assert fil.File(f["a1.jpg"]).partial_hash(PARTIAL) == fil.File(f["a1.jpg"]).hash()
+    assert fil.File(str(tmp_path / "nonexisting")).partial_hash(PARTIAL) is None
+
+
+def test_find_duplicates(tmp_path):
+    f = __make_files(tmp_path)
+    files = sorted(f.values())
+    groups = dedupe.find_duplicates(files, partial_size=PARTIAL, workers=2)
+    assert groups == [[f["a1.jpg"], f["a2.jpg"]], [f["c1.mp4"], f["c3.mp4"]]]
+    assert dedupe.find_duplicates(files + files, algo="crc32", partial_size=PARTIAL, workers=1) == groups
+
+
+def test_link_duplicates(tmp_path):
+    f = __make_files(tmp_path)
+    groups = dedupe.find_duplicates(sorted(f.values()), partial_size=PARTIAL)
+    assert dedupe.link_duplicates(groups, hard=True) == 2
+    assert os.path.samefile(f["a1.jpg"], f["a2.jpg"])
+    assert os.path.samefile(f["c1.mp4"], f["c3.mp4"])
+    assert dedupe.link_duplicates(groups, hard=True) == 0
+    assert dedupe.link_duplicates([[f["a2.jpg"], f["a1.jpg"]]]) == 1
+    assert os.path.islink(f["a1.jpg"])
+    assert os.path.realpath(f["a1.jpg"]) == os.path.realpath(f["a2.jpg"])
+
+
+def test_link_duplicates_missing_file(tmp_path):
+    f = __make_files(tmp_path)
+    groups = dedupe.find_duplicates(sorted(f.values()), partial_size=PARTIAL)
+    os.remove(groups[0][1])
+    assert dedupe.link_duplicates(groups, hard=True) == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() == 0, reason="File permissions are not enforced")
+def test_find_duplicates_unreadable_file(tmp_path):
+    f = __make_files(tmp_path)
+    os.chmod(f["a2.jpg"], 0)
+    os.chmod(f["c3.mp4"], 0)
+    try:
+        assert dedupe.find_duplicates(sorted(f.values()), partial_size=PARTIAL, workers=2) == []
+        assert fil.File(f["a2.jpg"]).hash() is None
+    finally:
+        os.chmod(f["a2.jpg"], stat.S_IRUSR | stat.S_IWUSR)
+        os.chmod(f["c3.mp4"], stat.S_IRUSR | stat.S_IWUSR)
+
+
+def test_report(tmp_path):
+    f = __make_files(tmp_path)
+    text = dedupe.report(dedupe.find_duplicates(sorted(f.values()), partial_size=PARTIAL))
+    assert text.startswith("2 files of 18 bytes:\n")
+    assert f"    {f['c3.mp4']}" in text
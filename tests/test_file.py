@@ -20,7 +20,10 @@
 
 import os
 import re
+import zlib
+import hashlib
 import platform
+import pytest
 import utilities.file as fil
 import mediatools.videofile as video
 import mediatools.version as version
@@ -101,6 +104,32 @@ def test_hash():
     assert f.hash() is not None
 
 
+def test_hash_algorithms():
+    with open(FILE, "rb") as fd:
+        data = fd.read()
+    for algo in ("md5", "sha1", "sha256", "blake2b"):
+        assert fil.File(FILE).hash(algo) == hashlib.new(algo, data).hexdigest()
+        assert fil.File(FILE).hash(algo, use_mmap=True) == hashlib.new(algo, data).hexdigest()
+    assert fil.File(FILE).hash("crc32") == f"{zlib.crc32(data):08x}"
+    f = fil.File(FILE)
+    assert f.hash("sha256") != f.hash("md5")
+    with pytest.raises(ValueError):
+        f.hash("sha3")
+
+
+def test_hash_empty_file(tmp_path):
+    empty = tmp_path / "empty.mp3"
+    empty.write_bytes(b"")
+    assert fil.File(str(empty)).hash("md5", use_mmap=True) == hashlib.md5().hexdigest()
+
+
+def test_hash_list_workers():
+    filelist = [FILE_2, FILE, FILE_2, FILE]
+    hashes = fil.get_hash_list(filelist, algo="blake2b", workers=3)
+    assert list(hashes.values()) == [[FILE_2, FILE_2], [FILE, FILE]]
+    assert fil.get_hash_list(filelist, algo="blake2b", workers=1) == hashes
+
+
 def test_hash_list():
     hashes = fil.get_hash_list([FILE, FILE_2, FILE])
     h = list(hashes.keys())[0]
@@ -111,5 +140,44 @@ def test_hash_list():
     assert len(hashes.keys()) == 2
 
 
+def test_iter_files(tmp_path):
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    for f in (tmp_path / "a.mp3", tmp_path / "b.JPG", tmp_path / "c.txt", sub / "d.mp3"):
+        f.write_bytes(b"")
+    root = str(tmp_path)
+    assert sorted(fil.iter_files(root)) == sorted(os.path.join(root, f) for f in ("a.mp3", "b.JPG", "c.txt"))
+    assert sorted(fil.iter_files(root, recurse=True, file_type=fil.FileType.AUDIO_FILE)) == sorted(
+        [os.path.join(root, "a.mp3"), os.path.join(root, "sub", "d.mp3")]
+    )
+    assert list(fil.iter_files(root, file_type=fil.FileType.IMAGE_FILE)) == [os.path.join(root, "b.JPG")]
+    assert list(fil.iter_files(os.path.join(root, "nonexisting"))) == []
+
+
+def test_file_list_dir(tmp_path):
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    (sub / "d.mp4").write_bytes(b"")
+    (tmp_path / "e.mp4").write_bytes(b"")
+    root = str(tmp_path)
+    assert fil.file_list(root, file_type=fil.FileType.VIDEO_FILE) == [os.path.join(root, "e.mp4")]
+    assert len(fil.file_list(root, FILE, file_type=fil.FileType.VIDEO_FILE, recurse=True)) == 3
+
+
+def test_scan_files(tmp_path):
+    for d in ("a", "a/x", "a/y", "b", "b/z/w"):
+        os.makedirs(tmp_path / d, exist_ok=True)
+        for i in range(3):
+            (tmp_path / d / f"f{i}.mp3").write_bytes(b"")
+        (tmp_path / d / "notes.txt").write_bytes(b"")
+    root = str(tmp_path)
+    expected = list(fil.iter_files(root, recurse=True, file_type=fil.FileType.AUDIO_FILE))
+    assert len(expected) == 15
+    assert list(fil.scan_files(root, file_type=fil.FileType.AUDIO_FILE, workers=4)) == expected
+    assert list(fil.scan_files(root, file_type=fil.FileType.AUDIO_FILE, workers=1)) == expected
+    roots = [str(tmp_path / "b"), str(tmp_path / "a")]
+    assert list(fil.scan_files(*roots, workers=3)) == [f for r in roots for f in fil.iter_files(r, recurse=True)]
+
+
 def test_version():
     assert re.match(r"^[0-9.]+$", version.MEDIA_TOOLS_VERSION)
@@ -19,7 +19,9 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 #
 
+import os
 import mediatools.audiofile as audio
+import mediatools.mediafile as media
 import mediatools.filespecs as spec
 
 FILE = "it/seal.mp3"
@@ -41,3 +43,9 @@ def test_2():
     std = spec.__to_std__(specs, allp)
     assert "abitrate            : 187.5 kbits/s" in std
     assert "duration            : 00:05:57.094" in std
+
+
+def test_probe_many_skips_errors():
+    files = ["it" + os.sep + "video-720p.mp4", "README.md", "nonexisting.mp4"]
+    probed = list(media.probe_many(files, workers=2, ordered=True))
+    assert all(f.filename.endswith("video-720p.mp4") for f in probed)
@@ -0,0 +1,92 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+#
+
+import os
+import subprocess
+import pytest
+import mediatools.utilities as util
+import mediatools.fingerprint as fingerprint
+
+TUNE_1 = "0.5*sin(2*PI*(220*pow(2,mod(floor(t*3),12)/12))*t)+0.3*sin(2*PI*(1320+400*sin(2*PI*0.3*t))*t)"
+TUNE_2 = "0.5*sin(2*PI*(330*pow(2,mod(floor(t*2),9)/12))*t)+0.3*sin(2*PI*(900+300*sin(2*PI*0.7*t))*t)"
+
+
+def __encode(tune: str, file: str, codec: str, bitrate: str) -> str:
+    cmd = [util.get_ffmpeg(), "-v", "error", "-y", "-f", "lavfi", "-i", f"aevalsrc='{tune}':s=44100:d=20", "-c:a", codec, "-b:a", bitrate, file]
+    subprocess.run(cmd, check=True)
+    return file
+
+
+def test_fingerprint_match(tmp_path):
+    master = tmp_path / "master"
+    master.mkdir()
+    m1 = __encode(TUNE_1, str(master / "tune1.mp3"), "libmp3lame", "192k")
+    m2 = __encode(TUNE_2, str(master / "tune2.mp3"), "libmp3lame", "192k")
+    other = __encode(TUNE_1, str(tmp_path / "tune1.m4a"), "aac", "64k")
+    with fingerprint.FingerprintIndex(str(tmp_path / "fp.db")) as index:
+        assert index.update(str(master), workers=2) == {"added": 2, "updated": 0, "unchanged": 0, "removed": 0}
+        assert index.update(str(master))["unchanged"] == 2
+        matches = index.match(fingerprint.fingerprint(other))
+        assert len(matches) == 1 and matches[0][0] == m1
+        assert index.match(fingerprint.fingerprint(m2))[0][0] == m2
+        os.remove(m2)
+        assert index.update(str(master))["removed"] == 1
+        assert len(index) == 1
+
+
+def test_fingerprint_no_audio(tmp_path):
+    assert fingerprint.fingerprint(str(tmp_path / "nonexisting.mp3")) == []
+
+
+def test_update_retries_failed_files(tmp_path, monkeypatch):
+    master = tmp_path / "master"
+    master.mkdir()
+    m1 = __encode(TUNE_1, str(master / "tune1.mp3"), "libmp3lame", "192k")
+    __encode(TUNE_2, str(master / "tune2.mp3"), "libmp3lame", "192k")
+    real_fingerprint = fingerprint.fingerprint
+    monkeypatch.setattr(fingerprint, "fingerprint", lambda f, seconds: [] if f == m1 else real_fingerprint(f, seconds))
+    with fingerprint.FingerprintIndex(str(tmp_path / "fp.db")) as index:
+        assert index.update(str(master))["added"] == 1
+        assert len(index) == 1
+        monkeypatch.setattr(fingerprint, "fingerprint", real_fingerprint)
+        assert index.update(str(master)) == {"added": 1, "updated": 0, "unchanged": 1, "removed": 0}
+
+
+def test_update_interrupted_keeps_committed_fingerprints(tmp_path, monkeypatch):
+    monkeypatch.setattr(fingerprint, "COMMIT_BATCH_SIZE", 1)
+    master = tmp_path / "master"
+    master.mkdir()
+    __encode(TUNE_1, str(master / "tune1.mp3"), "libmp3lame", "192k")
+    __encode(TUNE_2, str(master / "tune2.mp3"), "libmp3lame", "192k")
+    real_fingerprint = fingerprint.fingerprint
+    fingerprinted = []
+
+    def __failing_fingerprint(file: str, seconds: int) -> fingerprint.Landmarks:
+        if len(fingerprinted) == 1:
+            raise RuntimeError("Interrupted")
+        fingerprinted.append(file)
+        return real_fingerprint(file, seconds)
+
+    monkeypatch.setattr(fingerprint, "fingerprint", __failing_fingerprint)
+    with fingerprint.FingerprintIndex(str(tmp_path / "fp.db")) as index:
+        with pytest.raises(RuntimeError):
+            index.update(str(master), workers=1)
+        assert len(index) == 1
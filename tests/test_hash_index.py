@@ -0,0 +1,183 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+#
+
+import os
+import time
+import json
+import hashlib
+import pytest
+import mediatools.hash_index as hash_index
+
+CALLS = []
+
+
+def __content_hash(file: str) -> str:
+    CALLS.append(file)
+    with open(file, "r", encoding="utf-8") as fd:
+        return fd.read()
+
+
+def __make_tree(tmp_path) -> str:
+    root = tmp_path / "master"
+    (root / "album").mkdir(parents=True)
+    (root / "a.mp3").write_text("hash-a")
+    (root / "album" / "b.mp3").write_text("hash-b")
+    (root / "album" / "c.mp3").write_text("hash-a")
+    (root / "cover.jpg").write_text("not audio")
+    return str(root)
+
+
+def test_update(tmp_path):
+    root = __make_tree(tmp_path)
+    with hash_index.HashIndex(str(tmp_path / "index.db")) as index:
+        CALLS.clear()
+        assert index.update(root, __content_hash) == {"added": 3, "updated": 0, "unchanged": 0, "removed": 0}
+        assert len(index) == 3
+        assert index.lookup("hash-a") == [os.path.join(root, "a.mp3"), os.path.join(root, "album", "c.mp3")]
+        assert index.lookup("hash-b", algo="md5") == []
+
+        CALLS.clear()
+        assert index.update(root, __content_hash) == {"added": 0, "updated": 0, "unchanged": 3, "removed": 0}
+        assert CALLS == []
+
+        b = os.path.join(root, "album", "b.mp3")
+        with open(b, "w", encoding="utf-8") as fd:
+            fd.write("hash-a-longer")
+        os.remove(os.path.join(root, "a.mp3"))
+        assert index.update(root, __content_hash) == {"added": 0, "updated": 1, "unchanged": 1, "removed": 1}
+        assert CALLS == [b]
+        assert index.lookup("hash-a") == [os.path.join(root, "album", "c.mp3")]
+        assert index.get(b, os.stat(b)) == "hash-a-longer"
+
+
+def test_put_get(tmp_path):
+    root = __make_tree(tmp_path)
+    f = os.path.join(root, "a.mp3")
+    with hash_index.HashIndex(str(tmp_path / "index.db")) as index:
+        st = os.stat(f)
+        assert index.get(f, st) is None
+        index.put(f, st, "h1")
+        index.put(f, st, "h2", algo="pcm")
+        assert index.get(f, st) == "h1"
+        assert index.get(f, st, algo="pcm") == "h2"
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+        assert index.get(f, os.stat(f)) is None
+        index.put(f, os.stat(f), "h3")
+        assert index.get(f, os.stat(f), algo="pcm") is None
+
+
+def test_import_json(tmp_path):
+    root = __make_tree(tmp_path)
+    a, b = os.path.join(root, "a.mp3"), os.path.join(root, "album", "b.mp3")
+    json_file = str(tmp_path / "master.json")
+    with open(json_file, "w", encoding="utf-8") as fd:
+        fd.write(json.dumps({"datetime": "2100-01-01 00:00:00", "hashes": {"hash-a": [a], "hash-b": [b]}, "files": {a: "hash-a", b: "hash-b"}}))
+    with hash_index.HashIndex(str(tmp_path / "index.db")) as index:
+        assert index.import_json(json_file) == 2
+        assert index.lookup("hash-b") == [b]
+        CALLS.clear()
+        assert index.update(root, __content_hash)["unchanged"] == 2
+        assert CALLS == [os.path.join(root, "album", "c.mp3")]
+
+
+def test_update_hash_list(tmp_path):
+    import mediatools.audiofile as audio
+
+    root = __make_tree(tmp_path)
+    index = audio.update_hash_list(root, str(tmp_path / "index.db"), algo="md5")
+    assert index.count("md5") == 3
+    index.close()
+    (tmp_path / "master" / "album" / "d.mp3").write_text("hash-d")
+    os.remove(os.path.join(root, "a.mp3"))
+    with audio.update_hash_list(root, str(tmp_path / "index.db"), algo="md5") as index:
+        assert index.count("md5") == 3
+        assert index.lookup(hashlib.md5(b"hash-d").hexdigest(), "md5") == [os.path.join(root, "album", "d.mp3")]
+
+
+def test_update_hash_list_full_sync(tmp_path, monkeypatch):
+    import mediatools.audiofile as audio
+
+    root = __make_tree(tmp_path)
+    stale = os.path.join(root, "deleted.mp3")
+    with hash_index.HashIndex(str(tmp_path / "index.db")) as index:
+        index.put(stale, os.stat(os.path.join(root, "a.mp3")), "hash-x", "md5")
+
+    def __no_walk(*args, **kwargs) -> None:
+        raise AssertionError("Directory tree walked twice")
+
+    # Without manifest, the whole tree is hashed from the files listed by the manifest scan
+    monkeypatch.setattr(hash_index.HashIndex, "update", __no_walk)
+    with audio.update_hash_list(root, str(tmp_path / "index.db"), algo="md5") as index:
+        assert index.count("md5") == 3
+        assert index.files(root) == sorted(str(f) for f in (tmp_path / "master").rglob("*.mp3"))
+
+
+def test_update_hash_list_modified_in_place(tmp_path):
+    import mediatools.audiofile as audio
+
+    root = __make_tree(tmp_path)
+    # Directories modified recently are always listed again, the tree must look older
+    for d in (root, os.path.join(root, "album")):
+        os.utime(d, (time.time() - 100, time.time() - 100))
+    audio.update_hash_list(root, str(tmp_path / "index.db"), algo="md5").close()
+    modified = os.path.join(root, "album", "b.mp3")
+    dir_stat = os.stat(os.path.dirname(modified))
+    with open(modified, "w", encoding="utf-8") as fd:
+        fd.write("hash-z")
+    st = os.stat(modified)
+    os.utime(modified, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    # Modifying a file in place does not change its directory mtime
+    assert os.stat(os.path.dirname(modified)).st_mtime_ns == dir_stat.st_mtime_ns
+    with audio.update_hash_list(root, str(tmp_path / "index.db"), algo="md5") as index:
+        assert index.lookup(hashlib.md5(b"hash-z").hexdigest(), "md5") == [modified]
+        assert index.lookup(hashlib.md5(b"hash-b").hexdigest(), "md5") == []
+
+
+def test_update_interrupted_keeps_committed_hashes(tmp_path, monkeypatch):
+    monkeypatch.setattr(hash_index, "COMMIT_BATCH_SIZE", 1)
+    root = __make_tree(tmp_path)
+    hashed = []
+
+    def __failing_hash(file: str) -> str:
+        if len(hashed) == 2:
+            raise RuntimeError("Interrupted")
+        hashed.append(file)
+        return file
+
+    with hash_index.HashIndex(str(tmp_path / "index.db")) as index:
+        with pytest.raises(RuntimeError):
+            index.update(root, __failing_hash)
+        assert index.count() == 2
+
+
+def test_update_hash_list_corrupt_file(tmp_path):
+    import subprocess
+    import mediatools.utilities as util
+    import mediatools.audiofile as audio
+
+    root = tmp_path / "master"
+    root.mkdir()
+    (root / "corrupt.mp3").write_bytes(b"not an mp3 file")
+    good = str(root / "good.mp3")
+    subprocess.run([util.get_ffmpeg(), "-v", "error", "-y", "-f", "lavfi", "-i", "sine=duration=1", good], check=True)
+    with audio.update_hash_list(str(root), str(tmp_path / "index.db"), algo="audio") as index:
+        assert index.count("audio") == 1
+        assert index.get(good, os.stat(good), "audio") is not None
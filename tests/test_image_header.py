@@ -0,0 +1,68 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+#
+
+import os
+import mediatools.image_header as header
+import mediatools.imagefile as image
+
+FILE_LANDSCAPE = "it" + os.sep + "img-4000x3000.jpg"
+FILE_PORTRAIT = "it" + os.sep + "img-3000x4000.jpg"
+FILE_SMALL = "it" + os.sep + "img-640x480.jpg"
+
+
+def test_jpeg():
+    h = header.read(FILE_LANDSCAPE)
+    assert h["codec"] == "mjpeg"
+    assert (h["width"], h["height"]) == (4000, 3000)
+    assert h["orientation"] == 1
+    h = header.read(FILE_SMALL)
+    assert (h["width"], h["height"]) == (640, 480)
+
+
+def test_orientation():
+    h = header.read(FILE_PORTRAIT)
+    assert (h["width"], h["height"]) == (4000, 3000)
+    assert h["orientation"] == 6
+    assert header.is_portrait(h["orientation"])
+    assert not header.is_portrait(header.read(FILE_SMALL)["orientation"])
+
+
+def test_png_gif(tmp_path):
+    png = tmp_path / "img.png"
+    png.write_bytes(header.PNG_SIGNATURE + b"\x00\x00\x00\x0dIHDR" + (320).to_bytes(4, "big") + (200).to_bytes(4, "big") + b"\x08\x02\x00\x00\x00")
+    assert header.read(str(png)) == {"codec": "png", "width": 320, "height": 200, "orientation": None}
+    gif = tmp_path / "img.gif"
+    gif.write_bytes(b"GIF89a" + (50).to_bytes(2, "little") + (40).to_bytes(2, "little") + b"\x00" * 10)
+    assert header.read(str(gif)) == {"codec": "gif", "width": 50, "height": 40, "orientation": 1}
+
+
+def test_unknown_format():
+    assert header.read("README.md") is None
+    assert header.read("nonexisting.jpg") is None
+
+
+def test_image_file():
+    img = image.ImageFile(FILE_PORTRAIT)
+    assert img.dimensions() == (4000, 3000)
+    assert img.orientation == "portrait"
+    assert img.dimensions(ignore_orientation=False) == (3000, 4000)
+    assert img.format == "mjpeg"
+    assert image.ImageFile(FILE_LANDSCAPE).orientation == "landscape"
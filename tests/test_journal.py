@@ -0,0 +1,69 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+#
+
+
+import os
+import mediatools.journal as journal
+
+
+def __batch(tmp_path) -> tuple[list[str], str]:
+    files = []
+    for name in ("a.mp4", "b.mp4", "c.mp4", "d.mp4"):
+        (tmp_path / name).write_text(name)
+        files.append(str(tmp_path / name))
+    return files, str(tmp_path / "journal.db")
+
+
+def test_resume(tmp_path):
+    files, db = __batch(tmp_path)
+    a, b, c, d = files
+    with journal.Journal(db) as jnl:
+        assert jnl.batch(files, resume=True) == files
+        jnl.start(a, a, journal.temp_output(a))
+        jnl.written(a)
+        jnl.done(a)
+        # Interrupted during the encode, after moving the input to its backup
+        jnl.start(b, b, journal.temp_output(b), backup=str(tmp_path / "b.original.mp4"))
+        (tmp_path / "b.tmp.mp4").write_text("partial")
+        os.rename(b, str(tmp_path / "b.original.mp4"))
+        # Interrupted after the output was complete, before renaming it
+        jnl.start(c, c, journal.temp_output(c), backup=str(tmp_path / "c.original.mp4"))
+        (tmp_path / "c.tmp.mp4").write_text("encoded")
+        jnl.written(c)
+        jnl.failed(d, "error")
+
+    with journal.Journal(db) as jnl:
+        assert jnl.batch(files, resume=True) == [b, d]
+        assert not os.path.exists(journal.temp_output(b))
+        assert (tmp_path / "b.mp4").read_text() == "b.mp4"
+        assert not os.path.exists(str(tmp_path / "b.original.mp4"))
+        assert (tmp_path / "c.mp4").read_text() == "encoded"
+        assert (tmp_path / "c.original.mp4").read_text() == "c.mp4"
+        assert jnl.files(journal.DONE) == [a, c]
+        assert jnl.state(b) == journal.PLANNED
+
+        # Not resuming starts a new batch
+        assert jnl.batch(files[2:]) == files[2:]
+        assert jnl.files(journal.PLANNED) == files[2:]
+
+
+def test_temp_output():
+    assert journal.temp_output("/x/video.mp4") == "/x/video.tmp.mp4"
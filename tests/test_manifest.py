@@ -0,0 +1,96 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+#
+
+import os
+import shutil
+import utilities.manifest as manifest
+import utilities.file as fil
+
+
+def __age_dirs(root: str) -> None:
+    """Sets directories mtime in the past, out of the mtime granularity window"""
+    past = 1600000000
+    for d, _, _ in os.walk(root):
+        os.utime(d, (past, past))
+
+
+def __make_tree(tmp_path) -> str:
+    root = tmp_path / "music"
+    (root / "album1").mkdir(parents=True)
+    (root / "album2").mkdir()
+    for f in ("album1/t1.mp3", "album1/t2.mp3", "album2/t1.mp3", "album2/cover.jpg", "single.mp3"):
+        (root / f).write_text(f)
+    __age_dirs(str(root))
+    return str(root)
+
+
+def test_scan(tmp_path):
+    root = __make_tree(tmp_path)
+    db = str(tmp_path / "manifest.db")
+    with manifest.Manifest(db, file_type=fil.FileType.AUDIO_FILE) as mf:
+        changes = mf.scan(root)
+        assert len(changes.added) == 4 and len(changes) == 4
+        assert mf.files(root) == sorted(changes.added)
+        mf.commit()
+        assert len(mf.scan(root)) == 0
+
+        # In place modifications are only seen when verifying files
+        t1 = os.path.join(root, "album1", "t1.mp3")
+        with open(t1, "a", encoding="utf-8") as fd:
+            fd.write("more")
+        __age_dirs(root)
+        assert len(mf.scan(root)) == 0
+        assert mf.scan(root, verify_files=True).modified == [t1]
+
+        (tmp_path / "music" / "album2" / "t2.mp3").write_text("new")
+        shutil.rmtree(os.path.join(root, "album1"))
+        changes = mf.scan(root)
+        assert changes.added == [os.path.join(root, "album2", "t2.mp3")]
+        assert sorted(changes.removed) == [t1, os.path.join(root, "album1", "t2.mp3")]
+        assert mf.files(root) == [os.path.join(root, "album2", "t1.mp3"), os.path.join(root, "album2", "t2.mp3"), os.path.join(root, "single.mp3")]
+        mf.commit()
+
+
+def test_rollback(tmp_path):
+    root = __make_tree(tmp_path)
+    db = str(tmp_path / "manifest.db")
+    with manifest.Manifest(db) as mf:
+        assert len(mf.scan(root).added) == 5
+    with manifest.Manifest(db) as mf:
+        assert len(mf.scan(root).added) == 5
+        mf.commit()
+    with manifest.Manifest(db) as mf:
+        assert len(mf.scan(root)) == 0
+
+
+def test_refresh(tmp_path):
+    root = __make_tree(tmp_path)
+    db = str(tmp_path / "manifest.db")
+    with manifest.Manifest(db, file_type=fil.FileType.AUDIO_FILE) as mf:
+        mf.scan(root)
+        album = os.path.join(root, "album1")
+        os.rename(os.path.join(album, "t1.mp3"), os.path.join(album, "01 - t1.mp3"))
+        os.makedirs(os.path.join(album, "cd2"))
+        (tmp_path / "music" / "album1" / "cd2" / "t3.mp3").write_text("t3")
+        mf.refresh([album])
+        __age_dirs(root)
+        assert len(mf.scan(root)) == 0
+        assert os.path.join(album, "cd2", "t3.mp3") in mf.files(root)
@@ -0,0 +1,147 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+#
+
+import os
+import mediatools.probe_cache as probe_cache
+import mediatools.mediafile as media
+import mediatools.videofile as video
+import mediatools.media_config as conf
+
+FILE = "it" + os.sep + "video-720p.mp4"
+SPECS = {"format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "10.0", "nb_streams": 1, "bit_rate": "1000"}, "streams": []}
+
+
+def __use_tmp_cache(tmp_path) -> None:
+    probe_cache.set_cache_file(str(tmp_path / "probe_cache.db"))
+    probe_cache.set_enabled(True)
+
+
+def test_put_get(tmp_path):
+    __use_tmp_cache(tmp_path)
+    st = os.stat(FILE)
+    assert probe_cache.get(FILE, st) is None
+    probe_cache.put(FILE, st, SPECS)
+    assert probe_cache.get(FILE, st) == SPECS
+    assert probe_cache.get(os.path.abspath(FILE), st) == SPECS
+    probe_cache.set_cache_file(None)
+
+
+def test_file_changed(tmp_path):
+    __use_tmp_cache(tmp_path)
+    f = tmp_path / "file.mp4"
+    f.write_bytes(b"1234")
+    probe_cache.put(str(f), os.stat(f), SPECS)
+    f.write_bytes(b"123456")
+    assert probe_cache.get(str(f), os.stat(f)) is None
+    probe_cache.set_cache_file(None)
+
+
+def test_disabled(tmp_path):
+    __use_tmp_cache(tmp_path)
+    st = os.stat(FILE)
+    probe_cache.put(FILE, st, SPECS)
+    probe_cache.set_enabled(False)
+    assert probe_cache.get(FILE, st) is None
+    probe_cache.set_enabled(True)
+    probe_cache.set_cache_file(None)
+
+
+def test_evict(tmp_path):
+    __use_tmp_cache(tmp_path)
+    for i in range(10):
+        f = tmp_path / f"file{i}.mp4"
+        f.write_bytes(b"x" * i)
+        probe_cache.put(str(f), os.stat(f), SPECS)
+    assert probe_cache.evict(limit=4) == 6
+    assert probe_cache.evict(limit=4) == 0
+    probe_cache.set_cache_file(None)
+
+
+def test_evict_configured_limit(tmp_path, monkeypatch):
+    __use_tmp_cache(tmp_path)
+    # Numeric properties are loaded as floats
+    monkeypatch.setitem(conf.CONFIG_SETTINGS, probe_cache.MAX_ENTRIES_KEY, 3.0)
+    assert probe_cache.max_entries() == 3
+    for i in range(5):
+        f = tmp_path / f"file{i}.mp4"
+        f.write_bytes(b"x" * i)
+        probe_cache.put(str(f), os.stat(f), SPECS)
+    assert probe_cache.evict() == 2
+    monkeypatch.setitem(conf.CONFIG_SETTINGS, probe_cache.MAX_ENTRIES_KEY, 0.0)
+    assert probe_cache.max_entries() == probe_cache.DEFAULT_MAX_ENTRIES
+    probe_cache.set_cache_file(None)
+
+
+def test_probe_uses_cache(tmp_path):
+    __use_tmp_cache(tmp_path)
+    probe_cache.put(FILE, os.stat(FILE), SPECS)
+    f = media.MediaFile(FILE)
+    assert f.probe() == SPECS
+    assert f.format == "mp4"
+    assert f.duration == 10.0
+    probe_cache.set_cache_file(None)
+
+
+def test_lazy_specs(tmp_path):
+    __use_tmp_cache(tmp_path)
+    specs = {
+        "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "10.0", "nb_streams": 2, "bit_rate": "2000"},
+        "streams": [
+            {"codec_type": "video", "codec_name": "h264", "width": 1280, "height": 720, "avg_frame_rate": "25/1", "duration": "10.0"},
+            {"codec_type": "audio", "codec_name": "aac", "bit_rate": "128000", "sample_rate": "44100"},
+        ],
+    }
+    probe_cache.put(FILE, os.stat(FILE), specs)
+    v = video.VideoFile(FILE)
+    assert v.specs is None
+    assert v.video_codec == "h264"
+    assert v.specs is not None
+    assert v.get_width() == 1280
+    assert v.audio_codec == "aac"
+    assert v.audio_language is None
+    probe_cache.set_cache_file(None)
+
+
+def test_profiles(tmp_path):
+    __use_tmp_cache(tmp_path)
+    st = os.stat(FILE)
+    probe_cache.put(FILE, st, SPECS, "duration-only")
+    assert probe_cache.get(FILE, st, "duration-only") == SPECS
+    assert probe_cache.get(FILE, st, "video-basics") is None
+    assert probe_cache.get(FILE, st) is None
+    probe_cache.put(FILE, st, SPECS)
+    assert probe_cache.get(FILE, st, "video-basics") == SPECS
+    probe_cache.set_cache_file(None)
+
+
+def test_duration_profile(tmp_path):
+    __use_tmp_cache(tmp_path)
+    probe_cache.put(FILE, os.stat(FILE), {"format": {"duration": "12.5", "format_name": "mp4"}, "streams": []}, "duration-only")
+    assert video.get_duration(FILE) == 12.5
+    probe_cache.set_cache_file(None)
+
+
+def test_probe_many_images_with_profile(tmp_path):
+    __use_tmp_cache(tmp_path)
+    image_file = "it" + os.sep + "img-640x480.jpg"
+    probed = list(media.probe_many([image_file, FILE], ordered=True, profile="duration-only"))
+    assert [f.filename for f in probed] == [os.path.abspath(image_file), os.path.abspath(FILE)]
+    assert probed[0].width == 640
@@ -0,0 +1,74 @@
+#!python3
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+import threading
+import mediatools.scheduler as scheduler
+import mediatools.mediafile as media
+import mediatools.options as opt
+
+
+def test_thread_budget():
+    assert scheduler.thread_budget(1, 32) is None
+    assert scheduler.thread_budget(4, 32) == 8
+    assert scheduler.thread_budget(3, 32) == 10
+    assert scheduler.thread_budget(64, 32) == 1
+
+
+def test_thread_options():
+    assert scheduler.ffmpeg_thread_options(None, "libx265") == {}
+    assert scheduler.ffmpeg_thread_options(8, "libx264") == {"threads": "8"}
+    assert scheduler.ffmpeg_thread_options(8, "libx265") == {"threads": "8", "x265-params": "pools=8"}
+    settings = media.get_output_settings(vcodec="h265", hw_accel=False, **{opt.Option.THREADS: 4})
+    assert settings["threads"] == "4"
+    assert settings["x265-params"] == "pools=4"
+    assert "threads" not in media.get_output_settings(vcodec="h265", hw_accel=False)
+
+
+def test_thread_options_profile_x265_params():
+    assert scheduler.ffmpeg_thread_options(8, "libx265", "crf=22:preset=slow") == {"threads": "8", "x265-params": "crf=22:preset=slow:pools=8"}
+    profile_params = {opt.Option.VCODEC: "libx265", "x265-params": "crf=22:preset=slow"}
+    settings = media.get_output_settings(profile_params=profile_params, hw_accel=False, **{opt.Option.THREADS: 4})
+    assert settings["x265-params"] == "crf=22:preset=slow:pools=4"
+    settings = media.get_output_settings(profile_params=profile_params, vcodec="h264", hw_accel=False, **{opt.Option.THREADS: 4})
+    assert "x265-params" not in settings
+
+
+def test_longest_first():
+    order = []
+    jobs = [scheduler.Job(f, lambda f, threads: order.append((f, threads)) or f.upper(), duration=d) for f, d in (("a", 10), ("b", 30), ("c", 20))]
+    jobs = scheduler.Scheduler(jobs=1).run(jobs)
+    assert order == [("b", None), ("c", None), ("a", None)]
+    assert [j.result for j in jobs] == ["A", "B", "C"]
+
+
+def test_concurrent_jobs():
+    barrier = threading.Barrier(3, timeout=10)
+
+    def func(f, threads):
+        # Only completes if the 3 jobs run at the same time
+        barrier.wait()
+        if f == "bad":
+            raise ValueError(f)
+        return threads
+
+    jobs = scheduler.Scheduler(jobs=3, cores=12).run([scheduler.Job(f, func) for f in ("a", "bad", "c")])
+    assert [j.result for j in jobs] == [4, None, 4]
+    assert isinstance(jobs[1].error, ValueError)
@@ -21,6 +21,7 @@
 
 import os
 import platform
+import tempfile
 import mediatools.utilities as util
 import mediatools.videofile as video
 import mediatools.options as opt
@@ -187,6 +188,33 @@ def test_eta():
     assert util.__compute_eta__("frame=30608 fps=197 q=25.0 size=  7920kB" " time=00:00:10.000 bitrate=2261.3kbits/s sped=10x", 20) == ""
 
 
+def test_ffmpeg_progress():
+    status = util.FfmpegProgress(20)
+    block = ["frame=250", "fps=25.00", "out_time_us=10000000", "out_time=00:00:10.000000", "speed=5.0x"]
+    assert not any(status.update(line) for line in block)
+    assert status.update("progress=continue\n")
+    assert (status.frame, status.fps, status.out_time, status.speed, status.eta, status.done) == (250, 25.0, 10.0, 5.0, 2.0, False)
+    assert str(status).endswith(" ETA=00:00:02.000")
+    status.update("speed=N/A")
+    assert status.eta is None
+    assert str(status).endswith(" ETA=Undefined")
+    assert status.update("progress=end")
+    assert status.done
+    assert util.FfmpegProgress().eta is None
+
+
+def test_run_ffmpeg_progress_callback():
+    outfile = os.path.join(tempfile.gettempdir(), "progress_test.mp4")
+    progress = []
+    util.run_ffmpeg(
+        f'-f lavfi -i testsrc=duration=2:size=160x120:rate=25 -c:v mpeg4 "{outfile}"',
+        2,
+        progress_callback=lambda p: progress.append((p.frame, p.done)),
+    )
+    os.remove(outfile)
+    assert progress[-1] == (50, True)
+
+
 def test_hw_accel_auto():
     util.set_debug_level(4)
     util.HW_ACCEL = None
@@ -20,7 +20,10 @@
 #
 
 import os
+import time
 import shutil
+import subprocess
+import datetime
 import mediatools.utilities as util
 import mediatools.exceptions as ex
 import mediatools.avfile as av
@@ -161,6 +164,29 @@ def test_cut3():
     os.remove(v.filename)
 
 
+def test_smart_cut_pieces():
+    keyframes = [0.0, 4.0, 8.0]
+    assert video.smart_cut_pieces(keyframes, 2.0, 9.0) == [(2.0, 4.0, False), (4.0, 8.0, True), (8.0, 9.0, False)]
+    assert video.smart_cut_pieces(keyframes, 4.0, 8.0) == [(4.0, 8.0, True)]
+    assert video.smart_cut_pieces(keyframes, 1.0, 3.0) == [(1.0, 3.0, False)]
+    assert video.smart_cut_pieces(keyframes, 3.0, 6.0) == [(3.0, 6.0, False)]
+
+
+def test_smart_cut():
+    start, stop = 2.0, 9.0
+    v = video.VideoFile(av.cut(FILE, output=TMP1, start=start, stop=stop, smart=True))
+    assert abs(stop - start - v.duration) <= 0.06
+    assert v.video_codec == video.VideoFile(FILE).video_codec
+    os.remove(v.filename)
+
+
+def test_smart_cut_open_range():
+    av.cut(FILE, output=TMP1, timeranges="6-", smart=True)
+    v = video.VideoFile(TMP1)
+    assert abs(video.VideoFile(FILE).duration - 6.0 - v.duration) <= 0.06
+    os.remove(TMP1)
+
+
 def test_specs2():
     v = video.VideoFile(FILE)
     assert v.get_video_codec(None) == "h264"
@@ -186,3 +212,84 @@ def test_metadata():
     assert v.get_audio_codec() == "aac"
     assert (v.get_video_duration() - 10.0) < 0.01
     assert (v.get_audio_bitrate() - 96966) < 10
+
+
+def test_creation_date_tags():
+    d = "2021:06:15 10:20:30"
+    tags = video.creation_date_tags(FILE, d)
+    assert tags["File:FileModifyDate"] == d
+    assert tags["QuickTime:CreateDate"] == d
+    tags = video.creation_date_tags("it" + os.sep + "img-640x480.jpg", d)
+    assert tags["DateTimeOriginal"] == d
+    assert "QuickTime:CreateDate" not in tags
+
+
+def test_set_creation_dates_none():
+    assert video.set_creation_dates({FILE: None}) == 0
+
+
+def test_ffmpeg_date_options():
+    d = datetime.datetime(2021, 6, 15, 10, 20, 30)
+    assert video.ffmpeg_date_options("out.mp4", d) == "-map_metadata 0 -metadata creation_time=2021-06-15T10:20:30Z"
+    d_tz = datetime.datetime(2021, 6, 15, 10, 20, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    assert video.ffmpeg_date_options("out.mp4", d_tz) == "-map_metadata 0 -metadata creation_time=2021-06-15T10:20:30Z"
+    assert video.ffmpeg_date_options("out.avi", d) == ""
+    assert video.ffmpeg_date_options("out.mp4", None) == ""
+    tags = video.creation_date_tags("out.mp4", "2021:06:15 10:20:30", after_encode=True)
+    assert sorted(tags.keys()) == ["File:FileCreateDate", "File:FileModifyDate"]
+
+
+def test_ffmpeg_date_non_utc_timezone():
+    d = datetime.datetime(2021, 6, 15, 10, 20, 30)
+    tz = os.environ.get("TZ", None)
+    os.environ["TZ"] = "Europe/Paris"
+    time.tzset()
+    try:
+        util.run_ffmpeg(f'-i "{FILE}" -t 1 -c copy {video.ffmpeg_date_options(TMP1, d)} "{TMP1}"')
+        specs = subprocess.run(
+            [util.get_ffprobe(), "-v", "error", "-show_entries", "format_tags=creation_time", "-of", "csv=p=0", TMP1],
+            capture_output=True,
+            encoding="utf-8",
+            check=True,
+        )
+        assert specs.stdout.strip().startswith("2021-06-15T10:20:30")
+        assert video.get_creation_date(TMP1) == d
+    finally:
+        if tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = tz
+        time.tzset()
+        os.remove(TMP1)
+
+
+def test_lazy_probe():
+    v = video.VideoFile(FILE)
+    assert v.specs is None
+    assert v.extension() == "mp4"
+    assert v.specs is None
+
+
+def test_chunk_split_points():
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0, 12.0]
+    assert video.chunk_split_points(keyframes, 13.0, 1) == []
+    assert video.chunk_split_points(keyframes, 13.0, 2) == [6.0]
+    assert video.chunk_split_points(keyframes, 13.0, 4) == [4.0, 6.0, 10.0]
+    # Not more chunks than key frames
+    assert video.chunk_split_points([0.0, 5.0], 10.0, 4) == [5.0]
+    assert video.chunk_split_points([0.0], 10.0, 4) == []
+
+
+def test_encode_chunked():
+    outfile = video.VideoFile(FILE).encode(target_file=TMP1, vcodec="h264", chunked=3)
+    assert abs(video.VideoFile(outfile).duration - video.VideoFile(FILE).duration) < 0.5
+    os.remove(outfile)
+
+
+def test_encode_chunked_no_duration():
+    v = video.VideoFile(FILE)
+    v.get_specs()
+    v.duration = None
+    outfile = v.encode(target_file=TMP1, vcodec="h264", chunked=3)
+    assert abs(video.VideoFile(outfile).duration - video.VideoFile(FILE).duration) < 0.5
+    os.remove(outfile)
@@ -24,6 +24,12 @@ import time
 import stat
 import platform
 import hashlib
+import mmap
+import zlib
+import itertools
+import concurrent.futures
+from collections import deque
+from collections.abc import Iterator
 from mediatools import log
 
 if platform.system() == "Windows":
@@ -42,6 +48,17 @@ class FileType:
     }
 
 
+SCAN_WORKERS_KEY: str = "scan.workers"
+DEFAULT_SCAN_WORKERS: int = 8
+
+HASH_ALGORITHMS: tuple[str, ...] = ("md5", "sha1", "sha256", "blake2b", "crc32")
+HASH_WORKERS_KEY: str = "hash.workers"
+HASH_MMAP_KEY: str = "hash.mmap"
+DEFAULT_HASH_WORKERS: int = 4
+# Read sizes when hashing, small files are read at once, big files by big blocks
+HASH_MIN_BLOCK_SIZE: int = 1024 * 1024
+HASH_MAX_BLOCK_SIZE: int = 16 * 1024 * 1024
+
 MEDIA_FILE_EXTENSIONS: tuple[str, ...] = (
     FileType.FILE_EXTENSIONS[FileType.AUDIO_FILE] + FileType.FILE_EXTENSIONS[FileType.VIDEO_FILE] + FileType.FILE_EXTENSIONS[FileType.IMAGE_FILE]
 )
@@ -49,6 +66,31 @@ MEDIA_FILE_EXTENSIONS: tuple[str, ...] = (
 IMAGE_AND_VIDEO_EXTENSIONS: tuple[str, ...] = FileType.FILE_EXTENSIONS[FileType.VIDEO_FILE] + FileType.FILE_EXTENSIONS[FileType.IMAGE_FILE]
 
 
+class _Crc32:
+    """Fast non cryptographic hash, with the hashlib objects interface"""
+
+    def __init__(self) -> None:
+        self.value: int = 0
+
+    def update(self, data: bytes) -> None:
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+
+def new_hasher(algo: str):
+    """Returns a new hash object for an algorithm of HASH_ALGORITHMS"""
+    if algo not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hash algorithm '{algo}', must be one of {', '.join(HASH_ALGORITHMS)}")
+    return _Crc32() if algo == "crc32" else hashlib.new(algo)
+
+
+def hash_block_size(file_size: int) -> int:
+    """Returns the read size to hash a file of a given size, about 1/16th of the file within bounds"""
+    return min(max(file_size // 16, HASH_MIN_BLOCK_SIZE), HASH_MAX_BLOCK_SIZE)
+
+
 class File:
     """File abstraction"""
 
@@ -110,7 +152,11 @@ class File:
         else:
             return os.readlink(self.filename)
 
-    def create_link(self, link: str, dir: str = None, icon: str = None) -> str:
+    def create_link(self, link: str, dir: str = None, icon: str = None, hard: bool = False) -> str:
+        if hard:
+            log.logger.debug("Create hard link: %s --> %s", link, self.filename)
+            os.link(self.filename, link)
+            return link
         if platform.system() == "Windows":
             shell = win32com.client.Dispatch("WScript.Shell")
             if not link.endswith(".lnk"):
@@ -142,22 +188,57 @@ class File:
     def strip_extension(self) -> str:
         return self.basename(strip_dir=False, strip_ext=True)
 
-    def hash(self, algo: str = "md5", force: bool = False) -> str | None:
+    def hash(self, algo: str = "md5", force: bool = False, use_mmap: bool | None = None) -> str | None:
+        """Returns the hex digest of the file content, None if the file does not exist or can't be read
+
+        :param algo: One of HASH_ALGORITHMS
+        :param use_mmap: Whether to map the file in memory rather than reading it, defaults to the hash.mmap property
+        """
         if self._hash is not None and self.algo is not None and self.algo == algo and not force:
             return self._hash
-        BLOCK_SIZE = 65536  # The size of each read from the file
+        file_hash = new_hasher(algo)
+        if use_mmap is None:
+            use_mmap = _hash_mmap_default()
         try:
-            file_hash = hashlib.md5()
             with open(self.filename, "rb") as f:
-                fb = f.read(BLOCK_SIZE)
-                while len(fb) > 0:
-                    file_hash.update(fb)
-                    fb = f.read(BLOCK_SIZE)
-            self._hash = file_hash.hexdigest()  # Get the hexadecimal digest of the hash
-            self.algo = algo
-            return self._hash
+                file_size = os.fstat(f.fileno()).st_size
+                if use_mmap and file_size > 0:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        file_hash.update(mm)
+                else:
+                    block_size = hash_block_size(file_size)
+                    while fb := f.read(block_size):
+                        file_hash.update(fb)
         except FileNotFoundError:
             return None
+        except OSError as e:
+            log.logger.warning("Can't read %s: %s", self.filename, str(e))
+            return None
+        self._hash = file_hash.hexdigest()
+        self.algo = algo
+        return self._hash
+
+    def partial_hash(self, size: int, algo: str = "md5") -> str | None:
+        """Returns the hex digest of the first and last bytes of the file, None if the file does not exist or can't be read
+
+        Files of up to 2 x size bytes are fully hashed, so their partial hash is the same as their hash()
+        """
+        file_hash = new_hasher(algo)
+        try:
+            with open(self.filename, "rb") as f:
+                file_size = os.fstat(f.fileno()).st_size
+                if file_size <= 2 * size:
+                    file_hash.update(f.read())
+                else:
+                    file_hash.update(f.read(size))
+                    f.seek(-size, os.SEEK_END)
+                    file_hash.update(f.read(size))
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            log.logger.warning("Can't read %s: %s", self.filename, str(e))
+            return None
+        return file_hash.hexdigest()
 
     def rename(self, new_name: str, overwrite: bool = False) -> str:
         if os.path.isfile(new_name):
@@ -219,25 +300,40 @@ def read_link(f: str) -> str | None:
     return File(f).read_link()
 
 
-def create_link(f: str, link: str) -> str:
-    return File(f).create_link(link)
+def create_link(f: str, link: str, hard: bool = False) -> str:
+    return File(f).create_link(link, hard=hard)
+
+
+def _hash_mmap_default() -> bool:
+    import mediatools.media_config as conf
+
+    return conf.get_property(HASH_MMAP_KEY) is True
+
+
+def __file_hash(file: str, algo: str) -> str | None:
+    return File(file).hash(algo)
 
 
-def get_hash_list(filelist: list[str], algo: str = "md5") -> dict[str, list[str]]:
+def get_hash_list(filelist: list[str], algo: str = "md5", workers: int | None = None) -> dict[str, list[str]]:
+    """Hashes files concurrently, returns the list of files per hash, in the order of the input file list"""
+    import mediatools.media_config as conf
+
     log.logger.info("Getting hashes of %d files", len(filelist))
+    if workers is None:
+        workers = int(conf.get_property(HASH_WORKERS_KEY) or DEFAULT_HASH_WORKERS)
     hashes: dict[str, list[str]] = {}
     i = 0
-    for f in filelist:
-        h = File(f).hash(algo)
-        if h is None:
-            continue
-        if h in hashes:
-            hashes[h].append(f)
-        else:
-            hashes[h] = [f]
-        i += 1
-        if (i % 100) == 0:
-            log.logger.info("%d hashes computed", i)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="Hash") as executor:
+        for f, h in zip(filelist, executor.map(__file_hash, filelist, itertools.repeat(algo))):
+            if h is None:
+                continue
+            if h in hashes:
+                hashes[h].append(f)
+            else:
+                hashes[h] = [f]
+            i += 1
+            if (i % 100) == 0:
+                log.logger.info("%d hashes computed", i)
     return hashes
 
 
@@ -251,18 +347,90 @@ def __match_extension(file: str, extension_list: tuple[str, ...] | list[str]) ->
     return extension(file).lower() in extension_list
 
 
+def __type_extensions(file_type: str | None) -> frozenset[str] | None:
+    return None if file_type is None else frozenset(FileType.FILE_EXTENSIONS[file_type])
+
+
+def __scan_dir(directory: str, extensions: frozenset[str] | None, recurse: bool) -> tuple[list[str], list[str]]:
+    """Lists a directory, returns its matching files and its sub directories, both in listing order"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        # Like os.walk, don't follow symlinks to directories to avoid loops
+                        if recurse and not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif extensions is None or (entry.name.split(".")[-1].lower() in extensions and entry.is_file()):
+                        files.append(entry.path)
+                except OSError as e:
+                    log.logger.warning("Can't access %s: %s", entry.path, str(e))
+    except OSError as e:
+        log.logger.warning("Can't list directory %s: %s", directory, str(e))
+    return files, subdirs
+
+
+def iter_files(root_dir: str, recurse: bool = False, file_type: str | None = None) -> Iterator[str]:
+    """Yields files under a root directory, optionally going down into sub directories
+
+    Type and extension checks reuse the directory entries information, with no extra stat
+    per file, which matters on network shares
+    """
+    extensions = __type_extensions(file_type)
+    dirs = [root_dir]
+    while dirs:
+        files, subdirs = __scan_dir(dirs.pop(), extensions, recurse)
+        yield from files
+        # Walk sub directories in listing order
+        dirs.extend(reversed(subdirs))
+
+
+def scan_workers() -> int:
+    """Returns the number of directories listed concurrently by scan_files()"""
+    import mediatools.media_config as conf
+
+    value = conf.get_property(SCAN_WORKERS_KEY)
+    return int(value) if value else DEFAULT_SCAN_WORKERS
+
+
+def scan_files(*roots: str, file_type: str | None = None, workers: int | None = None) -> Iterator[str]:
+    """Recursively yields files under several root directories, listing directories concurrently
+
+    Files are yielded in the same order as iter_files(recurse=True) on each root in turn.
+    Listings of the next directories in that order are prefetched, at most 4 per worker
+    """
+    if workers is None:
+        workers = scan_workers()
+    if workers <= 1:
+        for root in roots:
+            yield from iter_files(root, recurse=True, file_type=file_type)
+        return
+    extensions = __type_extensions(file_type)
+    window = 4 * workers
+    pending = deque(roots)
+    listings: dict[str, concurrent.futures.Future] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="DirScan") as executor:
+        try:
+            while pending:
+                for directory in itertools.islice(pending, window):
+                    if directory not in listings:
+                        listings[directory] = executor.submit(__scan_dir, directory, extensions, True)
+                directory = pending.popleft()
+                future = listings.pop(directory, None) or executor.submit(__scan_dir, directory, extensions, True)
+                files, subdirs = future.result()
+                yield from files
+                pending.extendleft(reversed(subdirs))
+        finally:
+            for future in listings.values():
+                future.cancel()
+
+
 def dir_list(root_dir: str, recurse: bool = False, file_type: str | None = None) -> list[str]:
-    """Returns and array of all files under a given root directory
-    going down into sub directories"""
+    """Returns and array of all files under a given root directory,
+    going down into sub directories if recurse is True"""
     log.logger.info("Searching files in %s (recurse=%s)", root_dir, str(recurse))
-    files: list[str] = []
-    # 3 params are r=root, _=directories, f = files
-    for r, _, f in os.walk(root_dir):
-        for file in f:
-            if os.path.isdir(file) and recurse:
-                files.append(dir_list(file, recurse=recurse, file_type=file_type))
-            elif __is_type_file(os.path.join(r, file), file_type):
-                files.append(os.path.join(r, file))
+    files = list(iter_files(root_dir, recurse=recurse, file_type=file_type))
     log.logger.info("Found %d files in %s", len(files), root_dir)
     return files
 
@@ -273,7 +441,10 @@ def file_list(*args: str, file_type: str | None = None, recurse: bool = False) -
     for arg in args:
         log.logger.debug("Check file %s", str(arg))
         if os.path.isdir(arg):
-            files.extend(dir_list(arg, file_type=file_type, recurse=recurse))
+            if recurse:
+                files.extend(scan_files(arg, file_type=file_type))
+            else:
+                files.extend(iter_files(arg, file_type=file_type))
         elif file_type is None or __is_type_file(arg, file_type):
             files.append(arg)
     return files
@@ -0,0 +1,241 @@
+#
+# media-tools
+# Copyright (C) 2019-2021 Olivier Korach
+# mailto:olivier.korach AT gmail DOT com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+
+"""Persisted manifest of a directory tree, to rescan only directories whose mtime changed
+
+A directory mtime changes when entries are added, removed or renamed in it, not when a file
+is modified in place, so in place modifications are only detected in directories that changed,
+or with scan(verify_files=True) that stats all files but still does not list unchanged directories
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import hashlib
+import sqlite3
+from mediatools import log
+import utilities.file as fil
+
+SCHEMA_VERSION: int = 1
+# Directories modified less than that before a scan are listed again on next scan,
+# since another change within the mtime granularity of the file system would not change the mtime
+MTIME_GRANULARITY_NS: int = 2 * 1000000000
+_FORCE_RESCAN: int = -1
+
+
+class ChangeSet:
+    """Files added, removed and modified since the previous scan"""
+
+    def __init__(self) -> None:
+        self.added: list[str] = []
+        self.removed: list[str] = []
+        self.modified: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.modified)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.modified)} modified"
+
+    def changed(self) -> list[str]:
+        """Returns added and modified files"""
+        return self.added + self.modified
+
+
+def manifest_file(root_dir: str, name: str) -> str:
+    """Returns the file of the manifest of a directory tree for a given tool, in the cache directory"""
+    import mediatools.media_config as conf
+
+    manifest_dir = os.path.join(conf.get_cache_dir(), "manifests")
+    os.makedirs(manifest_dir, exist_ok=True)
+    root_id = hashlib.sha1(os.path.abspath(root_dir).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(manifest_dir, f"{name}-{root_id}.db")
+
+
+class Manifest:
+    """Manifest of the directories (mtime, number of entries) and files (size, mtime) of directory trees
+
+    Changes found by scan() are only persisted by commit(), so that a tool crashing while
+    processing a change set gets the same change set on next scan
+    """
+
+    def __init__(self, db_file: str, file_type: str | None = None) -> None:
+        """
+        :param file_type: Type of files recorded in the manifest, None for all files
+        """
+        self.db_file: str = db_file
+        self.file_type: str | None = file_type
+        self._db: sqlite3.Connection = sqlite3.connect(db_file)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS files")
+                self._db.execute("DROP TABLE IF EXISTS dirs")
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER NOT NULL, nb_entries INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS files_dir ON files (dir)")
+
+    def __enter__(self) -> Manifest:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def commit(self) -> None:
+        """Persists the state of the last scan"""
+        self._db.commit()
+
+    def rollback(self) -> None:
+        """Forgets the state of the last scan, the next scan returns the same changes"""
+        self._db.rollback()
+
+    def close(self) -> None:
+        """Closes the manifest, without persisting a scan that was not committed"""
+        self._db.close()
+
+    def files(self, root_dir: str) -> list[str]:
+        """Returns the files of a directory tree, as of the last scan"""
+        root_dir = os.path.abspath(root_dir)
+        prefix = os.path.join(root_dir, "")
+        rows = self._db.execute("SELECT path FROM files WHERE dir = ? OR substr(dir, 1, ?) = ? ORDER BY path", (root_dir, len(prefix), prefix))
+        return [row[0] for row in rows]
+
+    def scan(self, root_dir: str, verify_files: bool = False) -> ChangeSet:
+        """Scans a directory tree, only listing directories whose mtime changed since the previous scan
+
+        :param verify_files: Also stat files of unchanged directories, to detect files modified in place
+        :return: The files added, removed and modified since the previous scan
+        """
+        root_dir = os.path.abspath(root_dir)
+        scan_start = time.time_ns()
+        changes = ChangeSet()
+        nb_listed, nb_skipped = 0, 0
+        pending = [(root_dir, os.path.dirname(root_dir))]
+        while pending:
+            directory, parent = pending.pop()
+            try:
+                dir_stat = os.stat(directory)
+            except OSError:
+                self.__remove_dir(directory, changes)
+                continue
+            row = self._db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)).fetchone()
+            if row is not None and row[0] == dir_stat.st_mtime_ns:
+                nb_skipped += 1
+                subdirs = [r[0] for r in self._db.execute("SELECT path FROM dirs WHERE parent = ?", (directory,))]
+                if verify_files:
+                    self.__verify_files(directory, changes)
+            else:
+                nb_listed += 1
+                subdirs = self.__list_dir(directory, parent, dir_stat, scan_start, changes)
+            pending += [(d, directory) for d in sorted(subdirs, reverse=True)]
+        log.logger.info("Scanned %s: %d directories listed, %d unchanged, %s", root_dir, nb_listed, nb_skipped, str(changes))
+        return changes
+
+    def refresh(self, directories: list[str]) -> None:
+        """Records the current state of directories, without reporting changes,
+        typically after a tool processed the changes found in these directories"""
+        scan_start = time.time_ns()
+        pending = [os.path.abspath(d) for d in directories]
+        while pending:
+            directory = pending.pop()
+            try:
+                dir_stat = os.stat(directory)
+            except OSError:
+                self.__remove_dir(directory, ChangeSet())
+                continue
+            subdirs = self.__list_dir(directory, os.path.dirname(directory), dir_stat, scan_start, ChangeSet())
+            # New sub directories must be recorded too, they would be skipped by next scan otherwise
+            pending += [d for d in subdirs if self._db.execute("SELECT 1 FROM dirs WHERE path = ?", (d,)).fetchone() is None]
+
+    def __list_dir(self, directory: str, parent: str, dir_stat: os.stat_result, scan_start: int, changes: ChangeSet) -> list[str]:
+        """Lists a directory, records its files and returns its sub directories"""
+        known = {r[0]: (r[1], r[2]) for r in self._db.execute("SELECT path, size, mtime_ns FROM files WHERE dir = ?", (directory,))}
+        extensions = None if self.file_type is None else fil.FileType.FILE_EXTENSIONS[self.file_type]
+        subdirs, nb_entries, seen = [], 0, set()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    nb_entries += 1
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        if extensions is not None and entry.name.split(".")[-1].lower() not in extensions:
+                            continue
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError as e:
+                        log.logger.warning("Can't access %s: %s", entry.path, str(e))
+                        continue
+                    seen.add(entry.path)
+                    if entry.path not in known:
+                        changes.added.append(entry.path)
+                    elif known[entry.path] != (st.st_size, st.st_mtime_ns):
+                        changes.modified.append(entry.path)
+                    else:
+                        continue
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO files (path, dir, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                        (entry.path, directory, st.st_size, st.st_mtime_ns),
+                    )
+        except OSError as e:
+            log.logger.warning("Can't list directory %s: %s", directory, str(e))
+            return []
+        for f in known:
+            if f not in seen:
+                changes.removed.append(f)
+                self._db.execute("DELETE FROM files WHERE path = ?", (f,))
+        for d in [r[0] for r in self._db.execute("SELECT path FROM dirs WHERE parent = ?", (directory,))]:
+            if d not in subdirs:
+                self.__remove_dir(d, changes)
+        mtime_ns = dir_stat.st_mtime_ns if dir_stat.st_mtime_ns < scan_start - MTIME_GRANULARITY_NS else _FORCE_RESCAN
+        self._db.execute(
+            "INSERT OR REPLACE INTO dirs (path, parent, mtime_ns, nb_entries) VALUES (?, ?, ?, ?)", (directory, parent, mtime_ns, nb_entries)
+        )
+        return subdirs
+
+    def __verify_files(self, directory: str, changes: ChangeSet) -> None:
+        for path, size, mtime_ns in self._db.execute("SELECT path, size, mtime_ns FROM files WHERE dir = ?", (directory,)).fetchall():
+            try:
+                st = os.stat(path)
+            except OSError:
+                changes.removed.append(path)
+                self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                changes.modified.append(path)
+                self._db.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?", (st.st_size, st.st_mtime_ns, path))
+
+    def __remove_dir(self, directory: str, changes: ChangeSet) -> None:
+        """Removes a directory tree that no longer exists from the manifest"""
+        prefix = os.path.join(directory, "")
+        where = "dir = ? OR substr(dir, 1, ?) = ?"
+        params = (directory, len(prefix), prefix)
+        changes.removed += [r[0] for r in self._db.execute(f"SELECT path FROM files WHERE {where}", params)]
+        self._db.execute(f"DELETE FROM files WHERE {where}", params)
+        self._db.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", params)